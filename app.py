@@ -1,16 +1,77 @@
+import asyncio
 import os
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
+from features import metrics, profiler
 
-from features.study import register_study_handlers
+# ASYNC_MODE=1 runs AsyncApp + the async Socket Mode adapter instead of the threaded App
+ASYNC_MODE = os.environ.get("ASYNC_MODE", "").lower() in ("1", "true", "yes")
+
+# Web API base URL; override to point the bot at a local stand-in (see benchmarks/fake_slack.py)
+SLACK_API_URL = os.environ.get("SLACK_API_URL", "https://slack.com/api/")
+
+# WARM_START=1 checks the token and opens the Web API connection pool before connecting to Socket Mode
+WARM_START = os.environ.get("WARM_START", "").lower() in ("1", "true", "yes")
+
+if ASYNC_MODE:
+    from slack_bolt.async_app import AsyncApp
+    from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+    from features.capture import CAPTURE_PATH, capture_requests
+    from features.dedupe import dedupe_requests
+    from features.pool import HTTP_POOL_SIZE, pooled_session, warm_up_async
+    from features.ratelimit import AsyncRateLimitedWebClient, share_app_client
+    from features.study_async import register_async_study_handlers, start_expiry_task
+
+    # The same per-method rate budgets as the threaded App's client, awaited on the loop
+    app = AsyncApp(client=AsyncRateLimitedWebClient(token=os.environ.get("SLACK_BOT_TOKEN"), base_url=SLACK_API_URL))
+    share_app_client(app)
+    if CAPTURE_PATH:
+        capture_requests(app)
+    dedupe_requests(app)
+    register_async_study_handlers(app)
+else:
+    from slack_bolt import App
+    from slack_bolt.adapter.socket_mode import SocketModeHandler
+
+    from features.capture import CAPTURE_PATH, capture_requests
+    from features.dedupe import dedupe_requests
+    from features.pool import warm_up
+    from features.ratelimit import RateLimitedWebClient, share_app_client
+    from features.study import register_study_handlers
+
+    # One rate-limited, connection-pooled client for listeners and every background worker,
+    # so they share per-method rate budgets and keep-alive connections
+    app = App(client=RateLimitedWebClient(token=os.environ.get("SLACK_BOT_TOKEN"), base_url=SLACK_API_URL))
+    share_app_client(app)
+    # Record sanitized traffic for benchmarks/replay.py, duplicates included
+    if CAPTURE_PATH:
+        capture_requests(app)
+    # Slack redelivers slow-acked envelopes, and users double-click; handle each request once
+    dedupe_requests(app)
+    register_study_handlers(app)
+
+
+async def main_async():
+    # The session (and its keep-alive connections) must be created on the running loop
+    if HTTP_POOL_SIZE > 0:
+        app.client.session = pooled_session()
+    if WARM_START:
+        await warm_up_async(app.client)
+    start_expiry_task(app.client)
+    await AsyncSocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start_async()
 
-app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
-register_study_handlers(app)
 
 if __name__ == "__main__":
-    SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start()
+    metrics.serve()
+    # PROFILE_DIR=... samples stacks for flamegraphs; TRACE_PATH=... (read at import) traces each request
+    profiler.start()
+    if ASYNC_MODE:
+        asyncio.run(main_async())
+    else:
+        if WARM_START:
+            warm_up(app.client)
+        SocketModeHandler(app, os.environ["SLACK_APP_TOKEN"]).start()
@@ -0,0 +1,65 @@
+"""Benchmark: a quiet channel's /study work next to a busy one, one shared store vs. a StudyChannel each.
+
+Run from the repo root:  python -m benchmarks.bench_channel_shards [busy_sessions]
+"""
+import sys
+import time
+
+import pytz
+
+from features.channels import ChannelConfig, StudyChannel
+from features.study import UCI_LOCATIONS, _board_line
+
+QUIET_SESSIONS = 50
+# Busy-channel sessions that end between two quiet-channel requests
+DUE_PER_REQUEST = 200
+
+
+def _session(user_id, location, channel_id, end_ts):
+    return {"user_id": user_id, "user_name": user_id, "location": location, "base_location": location,
+            "channel_id": channel_id, "end_ts": end_ts, "start_ts": end_ts - 3600}
+
+
+def _fill(busy, quiet, count, now):
+    for i in range(count):
+        # Ends staggered 1 ms apart from now on, so every request finds DUE_PER_REQUEST due
+        busy.store.add(f"b{i}", _session(f"UB{i}", UCI_LOCATIONS[i % 8], "CBUSY", now + i * 0.001))
+    for i in range(QUIET_SESSIONS):
+        quiet.store.add(f"q{i}", _session(f"UQ{i}", UCI_LOCATIONS[i % 8], "CQUIET", now + 7200))
+
+
+def _quiet_requests(busy, quiet, count, now):
+    """What /study and /study list cost in the quiet channel while the busy one churns; returns (s/request, busy sessions expired)."""
+    expired = 0
+    start = time.perf_counter()
+    requests = count // DUE_PER_REQUEST
+    for r in range(requests):
+        clock = now + (r + 1) * DUE_PER_REQUEST * 0.001
+        # A new busy-channel session invalidates its location's cached list section
+        busy.store.add(f"n{r}", _session(f"UN{r}", UCI_LOCATIONS[r % 8], "CBUSY", now + 7200))
+        # /study: expire what's due, look up the user's session; /study list: render the channel's sessions
+        expired += len(quiet.expiry_scheduler.expire_due(now=clock))
+        quiet.get_user_session("UQ1")
+        if quiet is busy:
+            # One store for both channels: the list has to be filtered down to this channel's sessions
+            sum(1 for loc in UCI_LOCATIONS for _, s in quiet.store.in_location(loc) if s["channel_id"] == "CQUIET")
+        else:
+            quiet.session_list.response("")
+    return (time.perf_counter() - start) / requests, expired
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    tz = pytz.timezone("America/Los_Angeles")
+    print(f"busy channel: {count} sessions, {DUE_PER_REQUEST} ending between requests; quiet channel: {QUIET_SESSIONS}")
+    for name, shared in (("one store for both channels", True), ("a StudyChannel per channel", False)):
+        busy = StudyChannel(ChannelConfig("CBUSY", UCI_LOCATIONS), _board_line, tz)
+        quiet = busy if shared else StudyChannel(ChannelConfig("CQUIET", UCI_LOCATIONS), _board_line, tz)
+        now = time.time()
+        _fill(busy, quiet, count, now)
+        per_request, expired = _quiet_requests(busy, quiet, count, now)
+        print(f"{name:<30} quiet-channel request {per_request * 1e6:9.1f} µs, expiring {expired} busy-channel sessions on the way")
+
+
+if __name__ == "__main__":
+    main()
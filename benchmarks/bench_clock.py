@@ -0,0 +1,68 @@
+"""Benchmark: study windows and time labels from features.clock vs. strptime/strftime round trips.
+
+Times the submission path (two picked times -> timestamps and a label), a
+board/list label, and the modal's `now`. tests/test_clock.py checks that
+both paths agree, DST changes and midnight included.
+
+Run from the repo root:  python -m benchmarks.bench_clock
+"""
+import os
+import time
+import timeit
+from datetime import datetime, timedelta
+
+from features.clock import LABELS, TIMEZONE, clock_for, clock_minute
+
+N = 50000
+
+
+def _format_time(dt):
+    return dt.strftime("%-I:%M %p") if os.name != "nt" else dt.strftime("%I:%M %p")
+
+
+def _legacy_window(start_h, start_m, start_ampm, end_h, end_m, end_ampm):
+    """The submission path before features.clock, as it was (naive server-local time)."""
+
+    def _to_24(h, ampm):
+        if ampm == "AM":
+            return 0 if h == 12 else h
+        return 12 if h == 12 else h + 12
+
+    today = datetime.now().date()
+    start_dt = datetime.combine(today, datetime.strptime(f"{_to_24(start_h, start_ampm):02d}:{start_m:02d}", "%H:%M").time())
+    end_dt = datetime.combine(today, datetime.strptime(f"{_to_24(end_h, end_ampm):02d}:{end_m:02d}", "%H:%M").time())
+    if end_dt <= start_dt:
+        end_dt += timedelta(days=1)
+    if end_dt <= datetime.now():
+        start_dt += timedelta(days=1)
+        end_dt += timedelta(days=1)
+    return start_dt.timestamp(), end_dt.timestamp(), f"{_format_time(start_dt)} – {_format_time(end_dt)}"
+
+
+def _window(clock, start_h, start_m, start_ampm, end_h, end_m, end_ampm):
+    start, end = clock_minute(start_h, start_m, start_ampm), clock_minute(end_h, end_m, end_ampm)
+    start_ts, end_ts = clock.window(start, end)
+    return start_ts, end_ts, f"{LABELS[start]} – {LABELS[end]}"
+
+
+def _time(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main():
+    clock = clock_for(TIMEZONE)
+    picked = (2, 15, "PM", 5, 0, "PM")
+    ts = time.time() + 3600
+    rows = (
+        ("submission window + label", lambda: _legacy_window(*picked), lambda: _window(clock, *picked)),
+        ("board/list label", lambda: _format_time(datetime.fromtimestamp(ts)), lambda: clock.label(ts)),
+        ("modal now", lambda: datetime.now(TIMEZONE), clock.now),
+    )
+    print(f"{'':<28}{'strptime/strftime':>18}{'features.clock':>16}{'speedup':>9}")
+    for name, legacy, fast in rows:
+        before, after = _time(legacy, N), _time(fast, N)
+        print(f"{name:<28}{before * 1e6:>16.2f}µs{after * 1e6:>14.2f}µs{before / after:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
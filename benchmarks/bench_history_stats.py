@@ -0,0 +1,76 @@
+"""Benchmark: /study stats over a year of archived sessions, cold vs. cached per-week aggregates.
+
+Run from the repo root:  python -m benchmarks.bench_history_stats [sessions]
+"""
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import pytz
+
+from features.history import CANCELLED, EXPIRED, HistoryArchive, HistoryStats
+from features.study import UCI_LOCATIONS
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = random.Random(1)
+    tz = pytz.timezone("America/Los_Angeles")
+    now = time.time()
+    path = tempfile.mkdtemp(prefix="history-bench-")
+    try:
+        archive = HistoryArchive(path)
+        sessions = []
+        start = time.perf_counter()
+        for i in range(count):
+            begin = now - rng.uniform(0, 365 * 86400)
+            session = {
+                "user_id": f"U{rng.randrange(2000)}",
+                "location": UCI_LOCATIONS[min(int(rng.expovariate(0.5)), len(UCI_LOCATIONS) - 1)],
+                "start_ts": begin,
+                "end_ts": begin + rng.uniform(1800, 4 * 3600),
+            }
+            archive.append(session, CANCELLED if i % 10 == 0 else EXPIRED, ended_at=session["end_ts"])
+            sessions.append(session)
+        archive.flush()
+        write_s = time.perf_counter() - start
+
+        # Reopen, as the bot would after a restart: columns come back through mmap
+        archive = HistoryArchive(path)
+        assert len(archive) == count
+        stats = HistoryStats(archive, tz)
+        start = time.perf_counter()
+        result = stats.compute(until=now)
+        cold_s = time.perf_counter() - start
+
+        expected = Counter(s["location"] for s in sessions)
+        assert {location: n for location, n, _ in result["busiest"]} == dict(expected.most_common(5))
+        assert result["sessions"] == count
+
+        repeat = 50
+        start = time.perf_counter()
+        for _ in range(repeat):
+            stats.response("year", "U1", now=now)
+        cached_s = (time.perf_counter() - start) / repeat
+
+        # A few new sessions only fold into the current week's aggregate
+        for i in range(100):
+            archive.append({"user_id": "U1", "location": UCI_LOCATIONS[0], "start_ts": now - 3600, "end_ts": now}, EXPIRED, now)
+        archive.flush()
+        start = time.perf_counter()
+        stats.response("year", "U1", now=now)
+        incremental_s = time.perf_counter() - start
+
+        print(f"{count} archived sessions over a year, written in {write_s * 1000:.0f} ms")
+        print(f"stats, first query (aggregate every row):  {cold_s * 1000:8.1f} ms")
+        print(f"stats, year from cached weekly buckets:     {cached_s * 1000:8.2f} ms")
+        print(f"stats, after 100 new sessions:              {incremental_s * 1000:8.2f} ms")
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark: range and overlap queries on scheduled sessions, interval index vs. a full scan.
+
+Run from the repo root:  python -m benchmarks.bench_intervals [sessions]
+"""
+import random
+import sys
+import time
+
+from features.schedule import SessionSchedule
+from features.sessions import SessionStore
+from features.study import UCI_LOCATIONS
+
+
+def _time(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    rng = random.Random(1)
+    now = time.time()
+    store = SessionStore()
+    schedule = SessionSchedule(store)
+    sessions = {}
+    # Spread over the next week so any 2-hour window holds a realistic handful per location
+    for i in range(count):
+        start = now + 3600 + rng.uniform(0, 7 * 86400)
+        session = {
+            "user_id": f"U{i}",
+            "location": UCI_LOCATIONS[i % len(UCI_LOCATIONS)],
+            "start_ts": start,
+            "end_ts": start + rng.uniform(1800, 4 * 3600),
+        }
+        sessions[f"s{i}"] = session
+    start = time.perf_counter()
+    for sid, session in sessions.items():
+        schedule.reserve(sid, session, now=now)
+    load_s = time.perf_counter() - start
+
+    location = "Langson Library"
+    q_start = now + 2 * 86400
+    q_end = q_start + 2 * 3600
+
+    def scan():
+        return [
+            (sid, s) for sid, s in sessions.items()
+            if s["location"] == location and s["start_ts"] < q_end and s["end_ts"] > q_start
+        ]
+
+    def indexed():
+        return schedule.overlapping(q_start, q_end, location)
+
+    assert sorted(sid for sid, _ in scan()) == sorted(sid for sid, _ in indexed())
+    matches = len(indexed())
+    repeat = 200
+    scan_s = _time(scan, repeat)
+    indexed_s = _time(indexed, repeat * 10)
+    probe = {"user_id": "U7", "location": location, "start_ts": q_start, "end_ts": q_end}
+    overlap_s = _time(lambda: schedule.reserve("probe", dict(probe), now=now) and schedule.cancel("probe"), repeat * 10)
+
+    print(f"{count} scheduled sessions, reserved in {load_s * 1000:.0f} ms; {matches} at {location} in a 2h window")
+    print(f"range query, full scan:       {scan_s * 1e6:9.1f} µs")
+    print(f"range query, interval index:  {indexed_s * 1e6:9.1f} µs")
+    print(f"reserve with overlap check:   {overlap_s * 1e6:9.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Microbenchmark: precompiled study modal template vs. rebuilding every block per call.
+
+Run from the repo root:  python -m benchmarks.bench_modal_blocks
+"""
+import json
+import timeit
+import tracemalloc
+from datetime import datetime
+
+from features.study import TIMEZONE, UCI_LOCATIONS, _build_study_modal_blocks
+
+N = 20000
+
+
+def _legacy_build_study_modal_blocks(other_location_value=None):
+    location_options = [
+        {"text": {"type": "plain_text", "text": loc}, "value": loc}
+        for loc in UCI_LOCATIONS
+    ]
+    hour_options = [{"text": {"type": "plain_text", "text": str(h)}, "value": str(h)} for h in range(1, 13)]
+    minute_options = [
+        {"text": {"type": "plain_text", "text": f"{m:02d}"}, "value": str(m)}
+        for m in range(60)
+    ]
+    ampm_options = [
+        {"text": {"type": "plain_text", "text": "AM"}, "value": "AM"},
+        {"text": {"type": "plain_text", "text": "PM"}, "value": "PM"},
+    ]
+    # Prefill start time with current time; end time with next full hour
+    now = datetime.now(TIMEZONE)
+    start_hour_12 = now.hour % 12 or 12
+    start_minute = now.minute
+    start_ampm = "AM" if now.hour < 12 else "PM"
+    start_hour_initial = {"text": {"type": "plain_text", "text": str(start_hour_12)}, "value": str(start_hour_12)}
+    start_minute_initial = {"text": {"type": "plain_text", "text": f"{start_minute:02d}"}, "value": str(start_minute)}
+    start_ampm_initial = {"text": {"type": "plain_text", "text": start_ampm}, "value": start_ampm}
+    next_hour_24 = (now.hour + 1) % 24
+    end_hour_12 = next_hour_24 % 12 or 12
+    end_ampm = "AM" if next_hour_24 < 12 else "PM"
+    end_hour_initial = {"text": {"type": "plain_text", "text": str(end_hour_12)}, "value": str(end_hour_12)}
+    end_minute_initial = {"text": {"type": "plain_text", "text": "00"}, "value": "0"}
+    end_ampm_initial = {"text": {"type": "plain_text", "text": end_ampm}, "value": end_ampm}
+    blocks = [
+        {
+            "type": "input",
+            "block_id": "location_block",
+            "element": {
+                "type": "static_select",
+                "action_id": "location_select",
+                "placeholder": {"type": "plain_text", "text": "Where are you studying?"},
+                "options": location_options,
+            },
+            "label": {"type": "plain_text", "text": "Location"},
+        },
+        {
+            "type": "input",
+            "block_id": "other_location_block",
+            "optional": True,
+            "element": {
+                "type": "plain_text_input",
+                "action_id": "other_location_input",
+                "placeholder": {"type": "plain_text", "text": "e.g. 4th floor Langson"},
+                "initial_value": other_location_value or "",
+            },
+            "label": {"type": "plain_text", "text": "Specific spot"},
+        },
+        {
+            "type": "input",
+            "block_id": "studying_with_block",
+            "optional": True,
+            "element": {
+                "type": "multi_users_select",
+                "action_id": "studying_with_input",
+                "placeholder": {"type": "plain_text", "text": "Tag people studying with you"},
+            },
+            "label": {"type": "plain_text", "text": "Studying with"},
+        },
+        {
+            "type": "input",
+            "block_id": "description_block",
+            "optional": True,
+            "element": {
+                "type": "plain_text_input",
+                "action_id": "description_input",
+                "placeholder": {"type": "plain_text", "text": "e.g. Studying for CS161, feel free to join!"},
+                "multiline": True,
+            },
+            "label": {"type": "plain_text", "text": "Description"},
+        },
+        {
+            "type": "input",
+            "block_id": "image_block",
+            "optional": True,
+            "element": {
+                "type": "file_input",
+                "action_id": "image_input",
+                "filetypes": ["png", "jpg", "jpeg", "gif", "webp"],
+            },
+            "label": {"type": "plain_text", "text": "Share a photo to show your study spot"},
+        },
+        {"type": "header", "block_id": "start_time_header", "text": {"type": "plain_text", "text": "Start time", "emoji": True}},
+        {
+            "type": "actions",
+            "block_id": "start_time_actions",
+            "elements": [
+                {
+                    "type": "static_select",
+                    "action_id": "start_hour_input",
+                    "placeholder": {"type": "plain_text", "text": "Hour"},
+                    "options": hour_options,
+                    "initial_option": start_hour_initial,
+                },
+                {
+                    "type": "static_select",
+                    "action_id": "start_minute_input",
+                    "placeholder": {"type": "plain_text", "text": "Min"},
+                    "options": minute_options,
+                    "initial_option": start_minute_initial,
+                },
+                {
+                    "type": "static_select",
+                    "action_id": "start_ampm_input",
+                    "placeholder": {"type": "plain_text", "text": "AM/PM"},
+                    "options": ampm_options,
+                    "initial_option": start_ampm_initial,
+                },
+            ],
+        },
+        {"type": "header", "block_id": "end_time_header", "text": {"type": "plain_text", "text": "End time", "emoji": True}},
+        {
+            "type": "actions",
+            "block_id": "end_time_actions",
+            "elements": [
+                {
+                    "type": "static_select",
+                    "action_id": "end_hour_input",
+                    "placeholder": {"type": "plain_text", "text": "Hour"},
+                    "options": hour_options,
+                    "initial_option": end_hour_initial,
+                },
+                {
+                    "type": "static_select",
+                    "action_id": "end_minute_input",
+                    "placeholder": {"type": "plain_text", "text": "Min"},
+                    "options": minute_options,
+                    "initial_option": end_minute_initial,
+                },
+                {
+                    "type": "static_select",
+                    "action_id": "end_ampm_input",
+                    "placeholder": {"type": "plain_text", "text": "AM/PM"},
+                    "options": ampm_options,
+                    "initial_option": end_ampm_initial,
+                },
+            ],
+        },
+    ]
+    return blocks
+
+
+def _allocated_per_call(fn):
+    fn()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [fn() for _ in range(100)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del kept
+    return size / 100
+
+
+def main():
+    # Same payload on the wire (tuples serialize as JSON arrays).
+    assert json.dumps(_build_study_modal_blocks("x")) == json.dumps(_legacy_build_study_modal_blocks("x"))
+    results = {}
+    for name, fn in (("legacy", _legacy_build_study_modal_blocks), ("template", _build_study_modal_blocks)):
+        best = min(timeit.repeat(fn, number=N, repeat=5)) / N
+        results[name] = (best, _allocated_per_call(fn))
+        print(f"{name:>8}: {best * 1e6:8.2f} us/call  {results[name][1] / 1024:8.1f} KiB retained/call")
+    legacy, template = results["legacy"], results["template"]
+    print(f" speedup: {legacy[0] / template[0]:.1f}x time, {legacy[1] / max(template[1], 1):.1f}x memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark: startup reconciliation of a channel with hundreds of orphaned pins.
+
+Seeds the fake Web API (benchmarks/fake_slack.py) with ended announcements
+still pinned, live ones, and a day of unrelated chatter, then times the scan
+(pins.list + paginated conversations.history + rebuilding live sessions) at
+a realistic API latency, and the cleanup with rate limits scaled up.
+
+Run from the repo root:  python -m benchmarks.bench_reconcile [ended_pins] [--latency 0.05]
+"""
+import argparse
+import os
+import time
+
+os.environ["SESSION_DB_PATH"] = ""
+os.environ["HISTORY_DIR"] = ""
+
+from benchmarks.fake_slack import FakeSlackServer
+from features.channels import ChannelConfig, StudyChannel
+from features.ratelimit import TIER_LIMITS, RateLimitedWebClient
+from features.reconcile import _batch_pause, clean_up, scan
+from features.study import TIMEZONE, UCI_LOCATIONS, _announcement_message, _board_line, _ended_message, clock
+
+CHANNEL = "CRECONCILE"
+LIVE = 40
+CHATTER = 1000
+
+
+def _announcement(user_id, start_ts, end_ts, location):
+    text, _ = _announcement_message({
+        "user_id": user_id, "user_name": user_id, "location": location, "with_suffix": "",
+        "description": "Bench", "image_url": None, "time_range": f"{clock.label(start_ts)} – {clock.label(end_ts)}",
+    })
+    return {"ts": f"{start_ts:.6f}", "text": text, "user": "U0BOT", "bot_id": "B0BOT"}
+
+
+def _seed(server, ended, now):
+    messages = []
+    for i in range(ended):
+        start = now - 2 * 86400 - i * 900
+        messages.append(dict(_announcement(f"UOLD{i}", start, start + 3600, UCI_LOCATIONS[i % 8]), pinned=True))
+    for i in range(LIVE):
+        start = now - 3600 - i * 30
+        messages.append(dict(_announcement(f"ULIVE{i}", start, start + 4 * 3600, UCI_LOCATIONS[i % 8]), pinned=True))
+    for i in range(CHATTER):
+        messages.append({"ts": f"{now - 3000.5 - i * 80:.6f}", "text": "anyone at langson?", "user": f"UHUMAN{i % 50}"})
+    server.seed_messages(CHANNEL, messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("ended", type=int, nargs="?", default=500, help="ended announcements still pinned")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake API latency per call in seconds")
+    args = parser.parse_args()
+
+    server = FakeSlackServer(latency=args.latency).start()
+    now = time.time()
+    _seed(server, args.ended, now)
+    scale = 1000
+    client = RateLimitedWebClient(token="xoxb-bench", base_url=server.url, tier_limits={k: v * scale for k, v in TIER_LIMITS.items()})
+    channel = StudyChannel(ChannelConfig(CHANNEL, UCI_LOCATIONS), _board_line, TIMEZONE)
+
+    start = time.perf_counter()
+    restored, ended = scan(client, channel, TIMEZONE, now)
+    scan_s = time.perf_counter() - start
+    calls = sum(server.snapshot()[0].values())
+    assert len(restored) == LIVE and len(ended) == args.ended and len(channel.store) == LIVE
+
+    start = time.perf_counter()
+    clean_up(client, CHANNEL, ended, _ended_message)
+    cleanup_s = time.perf_counter() - start
+    still_pinned = sum(1 for ts, _ in ended if server.message(CHANNEL, ts).get("pinned"))
+    assert still_pinned == 0
+
+    real_pause = _batch_pause(RateLimitedWebClient(token="xoxb-bench", base_url=server.url))
+    batches = -(-args.ended // 5)
+    print(f"{args.ended} ended pins, {LIVE} live announcements, {CHATTER} other messages; API latency {args.latency * 1000:.0f} ms")
+    print(f"scan + rebuild:  {scan_s * 1000:8.0f} ms  ({calls} API calls, {len(restored)} sessions restored)")
+    print(f"cleanup:         {cleanup_s:8.1f} s   (rate limits x{scale}; at Slack's pins tier about {(batches - 1) * real_pause / 60:.0f} min in the background)")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Benchmark: app.py startup time and first-request latency, per-call connections vs. a warm pool.
+
+Each configuration boots app.py in a fresh process against the fake Web API
+(benchmarks/fake_slack.py), whose connect_latency stands in for the TCP + TLS
+handshake to slack.com. It then times one /study (views.open) and a burst of
+concurrent ones. A second table compares AsyncWebClient with and without a
+pooled aiohttp session.
+
+Run from the repo root:  python -m benchmarks.bench_startup [--handshake 0.05] [--latency 0.02] [--burst 16]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_slack import FakeSlackServer
+from benchmarks.load_test import percentile, study_command
+
+CONFIGS = (
+    ("per-call connections", {"HTTP_POOL_SIZE": "0", "WARM_START": ""}),
+    ("pooled", {"HTTP_POOL_SIZE": "8", "WARM_START": ""}),
+    ("pooled + WARM_START", {"HTTP_POOL_SIZE": "8", "WARM_START": "1"}),
+)
+
+
+def _child(args):
+    """Runs in the subprocess: boot app.py the way `python app.py` does, then time requests."""
+    server = FakeSlackServer(latency=args.latency, connect_latency=args.handshake).start()
+    from benchmarks.load_test import Recorder, boot_app
+
+    os.environ["HISTORY_DIR"] = ""
+    start = time.perf_counter()
+    app = boot_app(server, rate_limit_scale=100.0)
+    import app as app_module
+
+    if app_module.WARM_START:
+        app_module.warm_up(app.client)
+    startup = time.perf_counter() - start
+
+    recorder = Recorder(app)
+    recorder.dispatch(app, "first", study_command("U0"))
+    recorder.wait_idle(timeout=30)
+    with ThreadPoolExecutor(max_workers=args.burst) as pool:
+        for i in range(args.burst):
+            pool.submit(recorder.dispatch, app, "burst", study_command(f"U{i + 1}"))
+    recorder.wait_idle(timeout=30)
+    print(json.dumps({
+        "startup": startup,
+        "first": recorder.done["first"][0],
+        "burst_p50": percentile(recorder.done["burst"], 50),
+        "burst_max": max(recorder.done["burst"]),
+        "connections": server.connections,
+    }))
+
+
+async def _async_calls(server, pooled, count):
+    from slack_sdk.web.async_client import AsyncWebClient
+
+    from features.pool import pooled_session
+
+    client = AsyncWebClient(token="xoxb-bench", base_url=server.url)
+    if pooled:
+        client.session = pooled_session()
+    before = server.connections
+    start = time.perf_counter()
+    await client.auth_test()
+    first = time.perf_counter() - start
+    for _ in range(count - 1):
+        await client.auth_test()
+    total = time.perf_counter() - start
+    if pooled:
+        await client.session.close()
+    return first, total, server.connections - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--handshake", type=float, default=0.05, help="seconds per new connection (TCP + TLS stand-in)")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake API latency per call in seconds")
+    parser.add_argument("--burst", type=int, default=16, help="concurrent /study commands after the first")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args)
+        return
+
+    print(f"handshake={args.handshake * 1000:.0f}ms latency={args.latency * 1000:.0f}ms burst={args.burst}")
+    print(f"{'sync app.py':<24}{'startup':>10}{'first /study':>14}{'burst p50':>11}{'burst max':>11}{'conns':>7}")
+    for name, env in CONFIGS:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--child",
+             "--handshake", str(args.handshake), "--latency", str(args.latency), "--burst", str(args.burst)],
+            env=dict(os.environ, **env), capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        print(
+            f"{name:<24}{r['startup'] * 1000:>8.0f}ms{r['first'] * 1000:>12.1f}ms"
+            f"{r['burst_p50'] * 1000:>9.1f}ms{r['burst_max'] * 1000:>9.1f}ms{r['connections']:>7}"
+        )
+
+    server = FakeSlackServer(latency=args.latency, connect_latency=args.handshake).start()
+    print(f"\n{'AsyncWebClient, 20 calls':<24}{'first':>10}{'total':>14}{'conns':>7}")
+    for name, pooled in (("session per call", False), ("pooled_session()", True)):
+        first, total, conns = asyncio.run(_async_calls(server, pooled, 20))
+        print(f"{name:<24}{first * 1000:>8.1f}ms{total * 1000:>12.1f}ms{conns:>7}")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark: `/study list [location]` at 10k active sessions, cached vs. scan-and-render.
+
+Run from the repo root:  python -m benchmarks.bench_study_list [sessions]
+"""
+import sys
+import time
+
+from features.board import location_section
+from features.listing import SessionListCache
+from features.sessions import SessionStore
+from features.study import UCI_LOCATIONS, _board_line
+
+
+def _scan_and_render(store, location):
+    # What a list query costs without the index or the cache: walk every session, then build blocks
+    sessions = [
+        s for shard in store._shards for s in list(shard.sessions.values())
+        if (s.get("base_location") or s["location"]) == location
+    ]
+    return location_section(location, sessions, _board_line, 40)
+
+
+def _time(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    now = time.time()
+    store = SessionStore()
+    listing = SessionListCache(store, UCI_LOCATIONS, _board_line)
+    store.change_listeners.append(listing.on_change)
+    for i in range(count):
+        location = UCI_LOCATIONS[i % len(UCI_LOCATIONS)]
+        store.add(f"s{i}", {
+            "user_id": f"U{i}",
+            "user_name": f"user{i}",
+            "location": f"{location} — table {i % 50}",
+            "base_location": location,
+            "end_ts": now + 3600 + i,
+        })
+
+    target = "Langson Library"
+    other = "Science Library"
+    repeat = 200
+    scan = _time(lambda: _scan_and_render(store, target), repeat)
+    cold = _time(lambda: (listing.on_change(None, {"location": target}), listing.response(target)), repeat)
+    warm = _time(lambda: listing.response(target), repeat * 50)
+    all_warm = _time(lambda: listing.response(""), repeat * 50)
+
+    def churn_elsewhere():
+        listing.on_change(None, {"location": other})
+        listing.response(target)
+
+    elsewhere = _time(churn_elsewhere, repeat * 50)
+
+    print(f"{count} sessions, {len(store.in_location(target))} at {target}")
+    print(f"scan all sessions + render:             {scan * 1e6:9.1f} µs")
+    print(f"index lookup + render (after a change): {cold * 1e6:9.1f} µs")
+    print(f"cached, one location:                   {warm * 1e6:9.1f} µs")
+    print(f"cached, all locations:                  {all_warm * 1e6:9.1f} µs")
+    print(f"cached, another location churning:      {elsewhere * 1e6:9.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark: listener overhead of TRACE_PATH spans and the PROFILE_DIR sampling profiler.
+
+Each configuration boots app.py in a fresh process against the fake Web API
+with no added latency, so listener time is almost all bot code, then runs
+/study, submit and cancel for --users users one after another.
+
+Run from the repo root:  python -m benchmarks.bench_tracing [--users 300]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_slack import FakeSlackServer
+from benchmarks.load_test import percentile, study_cancel_action, study_command, study_modal_submission
+
+LISTENERS = ("cmd_study", "handle_study_modal_submit", "handle_study_cancel")
+
+
+def _configs(directory):
+    return (
+        ("off", {}),
+        ("TRACE_PATH", {"TRACE_PATH": os.path.join(directory, "trace.jsonl")}),
+        ("TRACE_PATH + PROFILE_DIR", {"TRACE_PATH": os.path.join(directory, "trace2.jsonl"), "PROFILE_DIR": os.path.join(directory, "stacks")}),
+    )
+
+
+def _child(args):
+    """Runs in the subprocess: boot app.py, time the listeners, report medians."""
+    os.environ.update(HISTORY_DIR="", RECONCILE_ON_START="", WELCOME_DB_PATH="")
+    server = FakeSlackServer(latency=0.0).start()
+    from benchmarks.load_test import Recorder, boot_app
+
+    app = boot_app(server, rate_limit_scale=1000.0)
+    from features import profiler, tracing
+    from features.outbox import outbox
+    from features.study import channels
+
+    sampler = profiler.start()
+    recorder = Recorder(app)
+    for i in range(args.users):
+        user_id = f"UTRACE{i:05d}"
+        for name, body in (("cmd_study", study_command(user_id)), ("handle_study_modal_submit", study_modal_submission(user_id))):
+            recorder.dispatch(app, name, body)
+            recorder.wait_idle(timeout=30)
+        session_id, _ = channels.default.get_user_session(user_id)
+        recorder.dispatch(app, "handle_study_cancel", study_cancel_action(user_id, session_id))
+        recorder.wait_idle(timeout=30)
+    outbox.join()
+    tracing.flush()
+    spans = 0
+    if tracing.enabled:
+        with open(os.environ["TRACE_PATH"], encoding="utf-8") as f:
+            spans = sum(1 for _ in f)
+    print(json.dumps({
+        "p50": {name: percentile(recorder.done[name], 50) for name in LISTENERS},
+        "spans": spans,
+        "samples": sampler.samples if sampler is not None else 0,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=300, help="users running /study, submit and cancel")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args)
+        return
+
+    print(f"{args.users} users, done p50 per listener (fake API without latency)")
+    print(f"{'config':<26}" + "".join(f"{name:>28}" for name in LISTENERS) + f"{'spans':>8}{'samples':>9}")
+    base = {k: v for k, v in os.environ.items() if k not in ("TRACE_PATH", "PROFILE_DIR")}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, env in _configs(directory):
+            start = time.perf_counter()
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_tracing", "--child", "--users", str(args.users)],
+                env=dict(base, SESSION_DB_PATH="", **env), capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            r = json.loads(out)
+            print(
+                f"{name:<26}" + "".join(f"{r['p50'][n] * 1e6:>26.0f}µs" for n in LISTENERS)
+                + f"{r['spans']:>8}{r['samples']:>9}   ({time.perf_counter() - start:.1f} s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
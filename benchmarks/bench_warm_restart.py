@@ -0,0 +1,60 @@
+"""Benchmark: warm restart from the SQLite session database at 100k stored rows.
+
+Run from the repo root:  python -m benchmarks.bench_warm_restart [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from features.persistence import SQLiteSessionBackend, WriteBehind
+from features.sessions import SessionStore
+from features.study import UCI_LOCATIONS
+
+
+def _populate(path, rows, now):
+    backend = SQLiteSessionBackend(path)
+    writer = WriteBehind(backend, interval=3600, batch_size=rows + 1)
+    for i in range(rows):
+        # Half the rows ended before "now", as after a long outage
+        writer.upsert(f"s{i}", {
+            "user_id": f"U{i}",
+            "user_name": f"user{i}",
+            "location": UCI_LOCATIONS[i % len(UCI_LOCATIONS)],
+            "base_location": UCI_LOCATIONS[i % len(UCI_LOCATIONS)],
+            "end_ts": now + (i - rows / 2),
+            "image_url": None,
+            "channel_id": "C0000000000",
+            "message_ts": f"{1700000000 + i}.000100",
+            "message_text": f"📍 <@U{i}> is studying at *somewhere* *2:00 PM – 4:00 PM*.",
+        })
+    start = time.perf_counter()
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    backend.close()
+    return elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        write_s = _populate(path, rows, now)
+        print(f"write-behind flush of {rows} rows: {write_s * 1000:8.1f} ms")
+
+        start = time.perf_counter()
+        backend = SQLiteSessionBackend(path)
+        active, expired = backend.load(now)
+        loaded = time.perf_counter()
+        store = SessionStore()
+        store.restore(active)
+        done = time.perf_counter()
+        backend.close()
+        print(f"load {len(active)} active + {len(expired)} expired:   {(loaded - start) * 1000:8.1f} ms")
+        print(f"index into SessionStore:             {(done - loaded) * 1000:8.1f} ms")
+        print(f"warm restart total:                  {(done - start) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark: /study latency during an onboarding wave, welcoming inline vs. through the welcome queue.
+
+Each mode boots app.py in a fresh process against the fake Web API with
+Slack's rate limits scaled by --scale (the welcome pace follows), fires a
+wave of member_joined_channel events (a fifth of them rejoins), and
+meanwhile runs /study twice a second. "inline" is the old handler: one
+chat.postEphemeral per event on the listener thread, each queued for that
+method's budget while /study waits for a free listener thread.
+
+Run from the repo root:  python -m benchmarks.bench_welcome [--joins 600] [--scale 4]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_slack import FakeSlackServer
+from benchmarks.load_test import TEAM_ID, percentile, study_command
+
+MODES = ("inline", "welcome queue")
+STUDY_COMMANDS = 20
+
+
+def member_joined_event(user_id, channel_id, n):
+    return {
+        "type": "event_callback",
+        "team_id": TEAM_ID,
+        "event_id": f"EvJOIN{n:06d}",
+        "event": {"type": "member_joined_channel", "user": user_id, "channel": channel_id, "event_ts": f"{time.time():.6f}"},
+    }
+
+
+def _child(args):
+    """Runs in the subprocess: boot app.py, send the wave and the /study commands, report."""
+    os.environ.update(HISTORY_DIR="", WELCOME_DB_PATH="", RECONCILE_ON_START="", WELCOME_RATE="")
+    server = FakeSlackServer(latency=args.latency).start()
+    from benchmarks.load_test import Recorder, boot_app
+
+    app = boot_app(server, rate_limit_scale=args.scale)
+    from features.study import channels, welcomer
+
+    if args.mode == "inline":
+        welcomer.enqueue = lambda channel_id, user_id: app.client.chat_postEphemeral(
+            channel=channel_id, user=user_id, text=welcomer.text
+        )
+    recorder = Recorder(app)
+    channel_id = channels.default.channel_id
+    users = [f"UJOIN{i % (args.joins * 4 // 5):05d}" for i in range(args.joins)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        for n, user_id in enumerate(users):
+            pool.submit(recorder.dispatch, app, "join", member_joined_event(user_id, channel_id, n))
+        for i in range(STUDY_COMMANDS):
+            time.sleep(max(0.0, start + 1.0 + i * 0.5 - time.perf_counter()))
+            pool.submit(recorder.dispatch, app, "study", study_command(f"USTUDY{i}"))
+    recorder.wait_idle(timeout=600)
+    calls, _ = server.snapshot()
+    print(json.dumps({
+        "study_p50": percentile(recorder.done["study"], 50),
+        "study_p99": percentile(recorder.done["study"], 99),
+        "joins_handled": time.perf_counter() - start,
+        "welcomes_sent": calls.get("chat.postEphemeral", 0),
+        "welcome": welcomer.stats(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--joins", type=int, default=600, help="member_joined_channel events in the wave")
+    parser.add_argument("--scale", type=float, default=4.0, help="multiplier on Slack's rate limits (keeps the run short)")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake API latency per call in seconds")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        _child(args)
+        return
+
+    print(f"{args.joins} joins at once, {STUDY_COMMANDS} /study over 10 s; rate limits x{args.scale:g}, latency {args.latency * 1000:.0f} ms")
+    print(f"{'mode':<16}{'/study p50':>12}{'/study p99':>12}{'listeners idle':>16}{'sent':>7}{'backlog':>9}{'skipped':>9}")
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_welcome", "--mode", mode,
+             "--joins", str(args.joins), "--scale", str(args.scale), "--latency", str(args.latency)],
+            env=dict(os.environ, SESSION_DB_PATH=""), capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        stats = r["welcome"] if mode != "inline" else {"backlog": 0, "skipped": 0}
+        print(
+            f"{mode:<16}{r['study_p50'] * 1000:>10.0f}ms{r['study_p99'] * 1000:>10.0f}ms{r['joins_handled']:>14.1f} s"
+            f"{r['welcomes_sent']:>7}{stats['backlog']:>9}{stats['skipped']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
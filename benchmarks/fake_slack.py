@@ -0,0 +1,183 @@
+"""Local stand-in for the Slack Web API methods the bot uses, for load tests and benchmarks.
+
+Point a client at it with base_url=server.url (or SLACK_API_URL=server.url for app.py).
+"""
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def _ok(method, params, ts_counter):
+    body = {"ok": True}
+    if method == "auth.test":
+        body.update(url="https://fake.slack.com/", team="fake", user="ctc-bot", team_id="T0FAKE", user_id="U0BOT", bot_id="B0BOT")
+    elif method == "chat.postMessage":
+        body.update(channel=params.get("channel"), ts=f"{int(time.time())}.{next(ts_counter):06d}")
+    elif method == "chat.update":
+        body.update(channel=params.get("channel"), ts=params.get("ts"))
+    elif method == "chat.postEphemeral":
+        body.update(message_ts=f"{int(time.time())}.{next(ts_counter):06d}")
+    elif method == "conversations.open":
+        body.update(channel={"id": "D0FAKE"})
+    elif method == "views.open":
+        body.update(view={"id": f"V{next(ts_counter)}"})
+    elif method in ("pins.list", "conversations.history"):
+        body.update(items=[], messages=[], has_more=False)
+    elif method not in ("pins.add", "pins.remove"):
+        body = {"ok": False, "error": "unknown_method"}
+    return body
+
+
+def _public(message):
+    """A seeded message as the Web API returns it."""
+    return dict({k: v for k, v in message.items() if k != "pinned"}, type="message")
+
+
+class FakeSlackServer:
+    """Threaded HTTP server answering views.open, chat.*, pins.*, conversations.open/history and auth.test.
+
+    latency: seconds added to every response (plus up to `jitter` extra).
+    rate_limit_rate: fraction of calls answered with 429 + Retry-After.
+    connect_latency: seconds added once per new connection, standing in for the TCP + TLS handshake.
+    Messages added with seed_messages() are served by conversations.history
+    (paginated) and, if pinned, pins.list; pins.remove and chat.update apply to them.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit_rate=0.0, retry_after=1, seed=None, connect_latency=0.0):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.connections = 0
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._ts_counter = itertools.count(1)
+        # channel -> {ts: message}, for seed_messages()
+        self._messages = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/api/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-slack", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def snapshot(self):
+        with self._lock:
+            return Counter(self.calls), Counter(self.rate_limited)
+
+    def seed_messages(self, channel, messages):
+        """Add existing messages ({"ts", "text", "user", "bot_id", "pinned"}) to a channel's history."""
+        with self._lock:
+            self._messages.setdefault(channel, {}).update((m["ts"], dict(m)) for m in messages)
+
+    def message(self, channel, ts):
+        with self._lock:
+            return dict(self._messages.get(channel, {}).get(ts) or {})
+
+    def _stored(self, method, params):
+        """Answer for methods backed by seeded messages, or None to fall back to _ok()."""
+        channel = params.get("channel")
+        with self._lock:
+            stored = self._messages.get(channel)
+            if stored is None:
+                return None
+            if method == "pins.list":
+                pinned = sorted((m for m in stored.values() if m.get("pinned")), key=lambda m: float(m["ts"]), reverse=True)
+                return {"ok": True, "items": [{"type": "message", "channel": channel, "message": _public(m)} for m in pinned]}
+            if method == "conversations.history":
+                oldest = float(params.get("oldest") or 0)
+                newest = sorted((m for m in stored.values() if float(m["ts"]) > oldest), key=lambda m: float(m["ts"]), reverse=True)
+                start = int(params.get("cursor") or 0)
+                limit = int(params.get("limit") or 100)
+                page = newest[start:start + limit]
+                more = start + limit < len(newest)
+                return {
+                    "ok": True,
+                    "messages": [_public(m) for m in page],
+                    "has_more": more,
+                    "response_metadata": {"next_cursor": str(start + limit) if more else ""},
+                }
+            message = stored.get(params.get("timestamp") or params.get("ts"))
+            if message is None:
+                return None
+            if method == "pins.remove":
+                if not message.get("pinned"):
+                    return {"ok": False, "error": "no_pin"}
+                message["pinned"] = False
+            elif method == "chat.update":
+                message["text"] = params.get("text")
+        return None
+
+    def _respond(self, method, params):
+        with self._lock:
+            self.calls[method] += 1
+            limited = self._rng.random() < self.rate_limit_rate
+            if limited:
+                self.rate_limited[method] += 1
+            delay = self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if limited:
+            return 429, {"Retry-After": str(self.retry_after)}, {"ok": False, "error": "ratelimited"}
+        return 200, {}, self._stored(method, params) or _ok(method, params, self._ts_counter)
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, keep-alive
+            # connections stall on Nagle + delayed ACK (~40ms per response)
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+                if fake.connect_latency:
+                    time.sleep(fake.connect_latency)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length).decode("utf-8") if length else ""
+                path, _, query = self.path.partition("?")
+                params = {k: v[0] for k, v in parse_qs(query).items()}
+                if raw:
+                    if "json" in (self.headers.get("Content-Type") or ""):
+                        params.update(json.loads(raw))
+                    else:
+                        params.update({k: v[0] for k, v in parse_qs(raw).items()})
+                status, headers, body = fake._respond(path.rsplit("/", 1)[-1], params)
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,264 @@
+"""Load test: drive /study traffic through app.py's listeners against a local fake Slack API.
+
+Run from the repo root, e.g.:
+
+    python -m benchmarks.load_test --users 500 --rate 100 --latency 0.05 --rate-limit-rate 0.01
+
+Each simulated user runs /study, submits the study_modal, then presses
+study_cancel. Reports p50/p99 ack and completion latency per listener,
+throughput, and Web API calls per submission.
+"""
+import argparse
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_slack import FakeSlackServer
+from features.clock import TIMEZONE, clock_for
+
+TEAM_ID = "T0FAKE"
+
+
+def study_command(user_id):
+    return {
+        "command": "/study",
+        "text": "",
+        "user_id": user_id,
+        "user_name": user_id.lower(),
+        "team_id": TEAM_ID,
+        "channel_id": "C0FAKE",
+        "trigger_id": f"trigger-{user_id}-{time.monotonic_ns()}",
+    }
+
+
+def _clock_fields(ts):
+    minute = clock_for(TIMEZONE).minute_of_day(ts)
+    return (minute // 60 % 12 or 12, minute % 60, "AM" if minute < 720 else "PM")
+
+
+def study_modal_submission(user_id, location="Langson Library", spot="4th floor", start=None, end=None):
+    """Modal submission payload; start/end are (hour, minute, "AM"/"PM") in TIMEZONE, defaulting to now until 3 hours from now."""
+    now = time.time()
+    start = start or _clock_fields(now)
+    end = end or _clock_fields(now + 3 * 3600)
+
+    def select(value):
+        return {"selected_option": {"value": value}}
+
+    return {
+        "type": "view_submission",
+        "team": {"id": TEAM_ID},
+        "user": {"id": user_id, "name": user_id.lower()},
+        "view": {
+            # Slack gives every opened modal its own id (features/dedupe.py keys on it)
+            "id": f"V{user_id}-{time.monotonic_ns()}",
+            "type": "modal",
+            "callback_id": "study_modal",
+            "private_metadata": "",
+            "state": {"values": {
+                "location_block": {"location_select": select(location)},
+                "other_location_block": {"other_location_input": {"value": spot}},
+                "studying_with_block": {"studying_with_input": {"selected_users": []}},
+                "description_block": {"description_input": {"value": "Load test"}},
+                "image_block": {"image_input": {"files": []}},
+                "start_time_actions": {
+                    "start_hour_input": select(str(start[0])),
+                    "start_minute_input": select(str(start[1])),
+                    "start_ampm_input": select(start[2]),
+                },
+                "end_time_actions": {
+                    "end_hour_input": select(str(end[0])),
+                    "end_minute_input": select(str(end[1])),
+                    "end_ampm_input": select(end[2]),
+                },
+            }},
+        },
+    }
+
+
+def study_cancel_action(user_id, session_id):
+    return {
+        "type": "block_actions",
+        "team": {"id": TEAM_ID},
+        "user": {"id": user_id},
+        "channel": {"id": "C0FAKE"},
+        "container": {"type": "message", "is_ephemeral": True},
+        "actions": [{
+            "type": "button",
+            "action_id": "study_cancel",
+            "block_id": "study_cancel_ephemeral_actions",
+            "value": session_id,
+            "action_ts": f"{time.time():.6f}",
+        }],
+    }
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def boot_app(server, rate_limit_scale):
+    """Import app.py against the fake server and hook listener completion for timing."""
+    os.environ["SLACK_BOT_TOKEN"] = "xoxb-load-test"
+    os.environ["SLACK_API_URL"] = server.url
+    os.environ["SESSION_DB_PATH"] = ""
+    os.environ.pop("ASYNC_MODE", None)
+    import app as app_module
+
+    app = app_module.app
+    client = app.client
+    if hasattr(client, "tier_limits"):
+        client.tier_limits = {tier: limit * rate_limit_scale for tier, limit in client.tier_limits.items()}
+        client._buckets.clear()
+    return app
+
+
+class Recorder:
+    """Times each dispatched request from dispatch() to ack and to listener completion.
+
+    Requests no listener runs for (duplicates dropped by middleware, events
+    nobody subscribes to) count towards ack latency only.
+    """
+
+    def __init__(self, app):
+        self.ack = defaultdict(list)
+        self.done = defaultdict(list)
+        self._pending = {}
+        self._started = set()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        runner = app.listener_runner
+        original = runner.listener_completion_handler
+        original_run = runner.run
+
+        recorder = self
+
+        class _Completion:
+            def handle(self, request, response):
+                original.handle(request=request, response=response)
+                recorder._complete(request)
+
+        def _run(request, **kwargs):
+            with recorder._lock:
+                recorder._started.add(id(request))
+            return original_run(request=request, **kwargs)
+
+        runner.listener_completion_handler = _Completion()
+        runner.run = _run
+
+    def dispatch(self, app, name, body, done=None):
+        """Dispatch one request; `done` (a threading.Event) is set once its listener has finished."""
+        from slack_bolt import BoltRequest
+
+        request = BoltRequest(body=body, mode="socket_mode")
+        start = time.perf_counter()
+        with self._lock:
+            self._pending[id(request)] = (name, start, request, done)
+        app.dispatch(request)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.ack[name].append(elapsed)
+            if id(request) not in self._started and self._pending.pop(id(request), None) is not None:
+                if done is not None:
+                    done.set()
+                if not self._pending:
+                    self._idle.notify_all()
+
+    def _complete(self, request):
+        with self._lock:
+            self._started.discard(id(request))
+            entry = self._pending.pop(id(request), None)
+            if entry is not None:
+                name, start, _, done = entry
+                self.done[name].append(time.perf_counter() - start)
+                if done is not None:
+                    done.set()
+            if not self._pending:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout):
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+
+def run_phase(recorder, app, name, bodies, rate, concurrency):
+    """Dispatch bodies at `rate` per second; return wall time until every listener finished."""
+    interval = 1.0 / rate if rate else 0.0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, body in enumerate(bodies):
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(recorder.dispatch, app, name, body)
+    recorder.wait_idle(timeout=120)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200, help="simulated users (one session each)")
+    parser.add_argument("--rate", type=float, default=50.0, help="requests per second per phase (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent dispatcher threads")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake API latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="extra random API latency in seconds")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of API calls answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--rate-limit-scale", type=float, default=100.0, help="multiplier on the client's tier budgets (1 = Slack's real limits)")
+    args = parser.parse_args()
+
+    server = FakeSlackServer(args.latency, args.jitter, args.rate_limit_rate, args.retry_after, seed=1).start()
+    app = boot_app(server, args.rate_limit_scale)
+    from features.outbox import outbox
+    from features.study import channels
+
+    recorder = Recorder(app)
+    users = [f"ULOAD{i:05d}" for i in range(args.users)]
+    phases = {}
+
+    phases["cmd_study"] = run_phase(recorder, app, "cmd_study", [study_command(u) for u in users], args.rate, args.concurrency)
+
+    before, _ = server.snapshot()
+    phases["handle_study_modal_submit"] = run_phase(
+        recorder, app, "handle_study_modal_submit", [study_modal_submission(u) for u in users], args.rate, args.concurrency
+    )
+    outbox.join()
+    after, _ = server.snapshot()
+    submit_calls = sum((after - before).values())
+
+    cancels = []
+    for u in users:
+        session_id, _ = channels.default.get_user_session(u)
+        if session_id:
+            cancels.append(study_cancel_action(u, session_id))
+    phases["handle_study_cancel"] = run_phase(recorder, app, "handle_study_cancel", cancels, args.rate, args.concurrency)
+    outbox.join()
+
+    calls, limited = server.snapshot()
+    server.stop()
+
+    print(f"users={args.users} rate={args.rate}/s latency={args.latency}s+{args.jitter}s 429-rate={args.rate_limit_rate}")
+    print(f"{'listener':<28}{'n':>6}{'ack p50':>10}{'ack p99':>10}{'done p50':>10}{'done p99':>10}{'req/s':>9}")
+    for name, wall in phases.items():
+        acks, done = recorder.ack[name], recorder.done[name]
+        print(
+            f"{name:<28}{len(done):>6}"
+            f"{percentile(acks, 50) * 1000:>8.1f}ms{percentile(acks, 99) * 1000:>8.1f}ms"
+            f"{percentile(done, 50) * 1000:>8.1f}ms{percentile(done, 99) * 1000:>8.1f}ms"
+            f"{len(done) / wall if wall else 0:>9.1f}"
+        )
+    print(f"API calls per submission: {submit_calls / max(1, args.users):.2f}")
+    print("API calls by method: " + ", ".join(f"{m}={n}" for m, n in sorted(calls.items())))
+    if limited:
+        print("429s injected: " + ", ".join(f"{m}={n}" for m, n in sorted(limited.items())))
+    if hasattr(app.client, "rate_limit_stats"):
+        print(f"client rate-limit stats: {app.client.rate_limit_stats()}")
+
+
+if __name__ == "__main__":
+    main()
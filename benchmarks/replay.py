@@ -0,0 +1,230 @@
+"""Replay a CAPTURE_PATH traffic capture through app.py's listeners at 1x–100x speed.
+
+Run from the repo root, e.g.:
+
+    python -m benchmarks.replay capture.jsonl --speed 20 --max-gap 60
+
+Requests are dispatched at their captured offsets divided by --speed against
+the fake Web API (benchmarks/fake_slack.py; --latency 0 makes it a stub).
+Study windows are rebased to the replay clock with their offsets and lengths
+divided by --speed too (at least a minute, the modal's resolution), so
+sessions overlap as they did when captured. Each user's requests run in
+order, and cancels act on the user's replayed session. Reports ack and
+completion percentiles per listener, peak sessions and peak memory. Run it
+with the STUDY_CHANNELS the capture was taken with, or requests from
+unconfigured channels go to the default one.
+
+A capture to try it on:  CAPTURE_PATH=capture.jsonl python -m benchmarks.load_test --users 300
+"""
+import argparse
+import json
+import os
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_slack import FakeSlackServer
+from benchmarks.load_test import Recorder, boot_app, percentile
+from features.clock import TIMEZONE, clock_for, clock_minute
+
+def load_capture(path, max_gap=None):
+    """[(offset seconds, captured epoch, body)] in capture order, idle gaps longer than max_gap shortened to it."""
+    with open(path, encoding="utf-8") as f:
+        records = sorted((json.loads(line) for line in f if line.strip()), key=lambda r: r["t"])
+    requests = []
+    offset = 0.0
+    previous = records[0]["t"] if records else 0.0
+    for record in records:
+        gap = record["t"] - previous
+        offset += min(gap, max_gap) if max_gap is not None else gap
+        previous = record["t"]
+        requests.append((offset, record["t"], record["body"]))
+    return requests
+
+
+def listener_name(body):
+    """The listener a payload goes to, for the report."""
+    if body.get("command"):
+        return "cmd_study"
+    if body.get("type") == "view_submission":
+        callback_id = (body.get("view") or {}).get("callback_id")
+        return "handle_study_already_submit" if callback_id == "study_already_modal" else "handle_study_modal_submit"
+    if body.get("type") == "block_actions":
+        action_id = (body.get("actions") or [{}])[0].get("action_id")
+        return "handle_study_cancel" if action_id == "study_cancel" else "modal_select"
+    return "handle_" + (body.get("event") or {}).get("type", "event")
+
+
+def _user_id(body):
+    return (body.get("user") or {}).get("id") or body.get("user_id") or (body.get("event") or {}).get("user")
+
+
+def _select(values, block_id, action_id, default):
+    option = ((values.get(block_id) or {}).get(action_id) or {}).get("selected_option")
+    return option["value"] if option else default
+
+
+def _clock(values, block_id, prefix, default_hour, default_ampm):
+    return clock_minute(
+        int(_select(values, block_id, f"{prefix}_hour_input", default_hour)),
+        int(_select(values, block_id, f"{prefix}_minute_input", 0)),
+        _select(values, block_id, f"{prefix}_ampm_input", default_ampm),
+    )
+
+
+def study_window(values, at):
+    """(start, end) seconds after timestamp `at` the modal's selects meant in TIMEZONE, as _parse_study_submission reads them."""
+    start, end = clock_for(TIMEZONE).window(
+        _clock(values, "start_time_actions", "start", 9, "AM"),
+        _clock(values, "end_time_actions", "end", 5, "PM"),
+        at,
+    )
+    return start - at, end - at
+
+
+def _set_clock(values, block_id, prefix, ts):
+    minute = clock_for(TIMEZONE).minute_of_day(ts)
+    values[block_id] = {
+        f"{prefix}_hour_input": {"selected_option": {"value": str(minute // 60 % 12 or 12)}},
+        f"{prefix}_minute_input": {"selected_option": {"value": str(minute % 60)}},
+        f"{prefix}_ampm_input": {"selected_option": {"value": "PM" if minute >= 720 else "AM"}},
+    }
+
+
+def rebase(body, captured_at, speed, sessions_for):
+    """Copy of a captured body ready to dispatch now: fresh one-time ids, compressed study window, replayed session ids."""
+    body = json.loads(json.dumps(body))
+    if body.get("command"):
+        body["trigger_id"] = f"trigger-replay-{time.monotonic_ns()}"
+    view = body.get("view") or {}
+    if view.get("callback_id") == "study_modal":
+        values = view["state"]["values"]
+        start, end = study_window(values, captured_at)
+        now = time.time()
+        start_ts = now + start / speed
+        end_ts = max(now + end / speed, start_ts + 60)
+        # The selects have minute resolution: start on the minute, end on the next one
+        _set_clock(values, "start_time_actions", "start", start_ts - start_ts % 60)
+        _set_clock(values, "end_time_actions", "end", end_ts - end_ts % 60 + 60)
+    elif view.get("callback_id") == "study_already_modal":
+        view["private_metadata"] = sessions_for(body, (body.get("user") or {}).get("id")) or view.get("private_metadata")
+    if body.get("type") == "block_actions":
+        action = (body.get("actions") or [{}])[0]
+        if action.get("action_id") == "study_cancel":
+            action["value"] = sessions_for(body, (body.get("user") or {}).get("id")) or action.get("value")
+    return body
+
+
+class Sampler:
+    """Polls the session count and resident memory while the replay runs, keeping the peaks."""
+
+    def __init__(self, channels, interval=0.05):
+        self.channels = channels
+        self.interval = interval
+        self.peak_sessions = 0
+        self.peak_rss = _rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="replay-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _sample(self):
+        sessions = self.channels.count("store") + self.channels.count("schedule")
+        self.peak_sessions = max(self.peak_sessions, sessions)
+        self.peak_rss = max(self.peak_rss, _rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+
+def _rss():
+    """Resident set size in bytes: current where /proc has it, else the process's peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="JSONL file written with CAPTURE_PATH")
+    parser.add_argument("--speed", type=float, default=10.0, help="replay speed-up, 1 to 100")
+    parser.add_argument("--max-gap", type=float, default=None, help="shorten captured idle gaps to this many seconds")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent dispatcher threads")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake API latency in seconds (0 = stub)")
+    parser.add_argument("--rate-limit-scale", type=float, default=100.0, help="multiplier on the client's tier budgets (1 = Slack's real limits)")
+    args = parser.parse_args()
+    if not 1 <= args.speed <= 100:
+        parser.error("--speed must be between 1 and 100")
+
+    requests = load_capture(args.capture, args.max_gap)
+    if not requests:
+        parser.error(f"{args.capture} has no captured requests")
+    os.environ.pop("CAPTURE_PATH", None)
+    os.environ["HISTORY_DIR"] = ""
+    server = FakeSlackServer(latency=args.latency, seed=1).start()
+    app = boot_app(server, args.rate_limit_scale)
+    from features.outbox import outbox
+    from features.study import channels
+
+    def sessions_for(body, user_id):
+        channel_id = (body.get("channel") or {}).get("id") or body.get("channel_id")
+        channel = channels.route(channel_id, (body.get("team") or {}).get("id") or body.get("team_id"))
+        session_id, _ = channel.get_user_session(user_id)
+        return session_id
+
+    recorder = Recorder(app)
+
+    def replay_one(body, captured_at, previous, done):
+        # A user's requests stay in order: a Cancel can't be clicked before the submit that posted it finished
+        if previous is not None:
+            previous.wait(30)
+        recorder.dispatch(app, listener_name(body), rebase(body, captured_at, args.speed, sessions_for), done)
+
+    baseline_rss = _rss()
+    sampler = Sampler(channels).start()
+    last_by_user = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for offset, captured_at, body in requests:
+            delay = start + offset / args.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            done = threading.Event()
+            previous = last_by_user.get(_user_id(body))
+            last_by_user[_user_id(body)] = done
+            pool.submit(replay_one, body, captured_at, previous, done)
+    recorder.wait_idle(timeout=120)
+    outbox.join()
+    wall = time.perf_counter() - start
+    sampler.stop()
+    calls, _ = server.snapshot()
+    server.stop()
+
+    span = requests[-1][0]
+    print(f"{len(requests)} requests over {span / 60:.1f} captured min, replayed in {wall:.1f} s ({span / wall if wall else 0:.1f}x); API latency {args.latency * 1000:.0f} ms")
+    print(f"{'listener':<28}{'n':>6}{'ack p50':>10}{'ack p99':>10}{'done p50':>10}{'done p95':>10}{'done p99':>10}")
+    for name in sorted(recorder.ack):
+        acks, done = recorder.ack[name], recorder.done[name]
+        print(
+            f"{name:<28}{len(acks):>6}"
+            f"{percentile(acks, 50) * 1000:>8.1f}ms{percentile(acks, 99) * 1000:>8.1f}ms"
+            f"{percentile(done, 50) * 1000:>8.1f}ms{percentile(done, 95) * 1000:>8.1f}ms{percentile(done, 99) * 1000:>8.1f}ms"
+        )
+    print(f"peak sessions: {sampler.peak_sessions}")
+    print(f"peak RSS: {sampler.peak_rss / 2**20:.1f} MiB ({(sampler.peak_rss - baseline_rss) / 2**20:+.1f} MiB during replay)")
+    print("API calls by method: " + ", ".join(f"{m}={n}" for m, n in sorted(calls.items())))
+
+
+if __name__ == "__main__":
+    main()
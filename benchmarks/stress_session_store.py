@@ -0,0 +1,76 @@
+"""Stress benchmark: hammer one SessionStore from many threads and report throughput.
+
+Run from the repo root:  python -m benchmarks.stress_session_store [threads] [ops_per_thread]
+
+tests/test_session_store.py runs the same mix at a smaller size and checks
+that no session is popped twice or lost and that the indexes agree.
+"""
+import random
+import sys
+import threading
+import time
+import uuid
+
+from features.sessions import SessionStore
+from features.study import UCI_LOCATIONS
+
+USERS = 200
+
+
+def _worker(store, ops, popped, created, errors, seed):
+    rng = random.Random(seed)
+    try:
+        for _ in range(ops):
+            user_id = f"U{rng.randrange(USERS)}"
+            roll = rng.random()
+            if roll < 0.35:
+                sid = str(uuid.uuid4())
+                session = {
+                    "user_id": user_id,
+                    "location": rng.choice(UCI_LOCATIONS),
+                    # Some sessions expire mid-run so pop_expired races the others
+                    "end_ts": time.time() + rng.choice((0.001, 0.05, 60)),
+                }
+                if store.add_unless_active(sid, session):
+                    created.append(sid)
+            elif roll < 0.65:
+                # Two cancel paths racing on the same session
+                sid, _ = store.get_user_session(user_id)
+                if sid is not None and store.pop(sid) is not None:
+                    popped.append(sid)
+            elif roll < 0.8:
+                for sid, _ in store.pop_expired():
+                    popped.append(sid)
+            elif roll < 0.95:
+                store.in_location(rng.choice(UCI_LOCATIONS))
+            else:
+                store.next_expiry()
+    except Exception as e:  # noqa: BLE001 - any exception is a failure here
+        errors.append(repr(e))
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    ops = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    store = SessionStore()
+    popped, created, errors = [], [], []
+    workers = [
+        threading.Thread(target=_worker, args=(store, ops, popped, created, errors, i))
+        for i in range(threads)
+    ]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    total = threads * ops
+    print(f"{threads} threads x {ops} ops in {elapsed:.2f}s ({total / elapsed:,.0f} ops/s); "
+          f"created {len(created)}, popped {len(popped)}, remaining {len(store)}")
+    for error in errors[:5]:
+        print("worker error:", error)
+
+
+if __name__ == "__main__":
+    main()
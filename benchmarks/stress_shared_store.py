@@ -0,0 +1,112 @@
+"""Stress benchmark: several processes share one SharedSessionStore, as app.py replicas would.
+
+Run from the repo root:  python -m benchmarks.stress_shared_store [processes] [seconds]
+
+Each process creates short sessions (which expire) and long ones (which
+other processes cancel), and runs an ExpiryScheduler behind the shared
+leader lease. Halfway through, whichever process holds the lease exits
+without releasing it, so another takes over expiry. Reports store
+operations per second and how the work split between processes;
+tests/test_shared_store.py checks that no session is lost or handled twice
+and that only one process holds the lease at a time.
+"""
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+from features.expiry import ExpiryScheduler
+from features.shared import Lease, SharedSessionStore
+
+LEASE_TTL = 1.0
+LONG_USERS = 50
+MAX_SHORT_SECONDS = 0.5
+
+
+def _worker(index, path, out_dir, seconds, crashed):
+    rng = random.Random(index)
+    store = SharedSessionStore(path, poll_interval=0.2)
+    lease = Lease(path, "leader", ttl=LEASE_TTL)
+    unpinned, batches = [], []
+
+    def on_expired(expired):
+        unpinned.extend(sid for sid, _ in expired)
+        batches.append(time.time())
+
+    scheduler = ExpiryScheduler(store, on_expired, lease=lease)
+    scheduler.start()
+    store.start_change_feed()
+    created, cancelled, missed = [], [], []
+    ops = 0
+
+    def dump(status):
+        with open(os.path.join(out_dir, f"{index}.json"), "w") as f:
+            json.dump({"status": status, "ops": ops, "created": len(created), "cancelled": len(cancelled),
+                       "missed": len(missed), "unpinned": len(unpinned), "batches": len(batches)}, f)
+
+    deadline = time.time() + seconds
+    crash_at = time.time() + seconds / 2
+    while time.time() < deadline:
+        if time.time() > crash_at and lease.held() and not crashed.is_set():
+            crashed.set()
+            dump("crashed while leader")
+            os._exit(0)  # no atexit: the lease is left to expire
+        ops += 1
+        roll = rng.random()
+        if roll < 0.4:
+            sid = str(uuid.uuid4())
+            session = {"user_id": f"S{index}-{sid[:8]}", "location": "Langson Library",
+                       "end_ts": time.time() + rng.uniform(0.01, MAX_SHORT_SECONDS)}
+            if store.add_unless_active(sid, session):
+                created.append(sid)
+        elif roll < 0.7:
+            sid = str(uuid.uuid4())
+            session = {"user_id": f"L{rng.randrange(LONG_USERS)}", "location": "Science Library", "end_ts": time.time() + 600}
+            if store.add_unless_active(sid, session):
+                created.append(sid)
+        else:
+            # A cancel for a session that may well have been created by another process
+            sid, _ = store.get_user_session(f"L{rng.randrange(LONG_USERS)}")
+            if sid is not None:
+                (cancelled if store.pop(sid) is not None else missed).append(sid)
+    # Stop creating and give the leader (or its successor) time to expire what's left
+    time.sleep(LEASE_TTL * 2 + MAX_SHORT_SECONDS + 0.5)
+    dump("ok")
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 6.0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shared.db")
+        SharedSessionStore(path)  # create the schema before the workers race to
+        crashed = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(target=_worker, args=(i, path, tmp, seconds, crashed))
+            for i in range(processes)
+        ]
+        for p in workers:
+            p.start()
+        for p in workers:
+            p.join()
+        results = []
+        for i in range(processes):
+            with open(os.path.join(tmp, f"{i}.json")) as f:
+                results.append(json.load(f))
+        remaining = len(SharedSessionStore(path))
+
+    total = {key: sum(r[key] for r in results) for key in ("ops", "created", "cancelled", "missed", "unpinned")}
+    print(f"{processes} processes x {seconds:.0f}s: {total['ops'] / seconds:,.0f} store ops/s; created {total['created']}, "
+          f"cancelled {total['cancelled']} ({total['missed']} lost the race to another replica), "
+          f"unpinned {total['unpinned']}, remaining {remaining}")
+    print("expiry batches per process: " + ", ".join(
+        f"{i}={r['batches']}{' (crashed as leader)' if r['status'] != 'ok' else ''}" for i, r in enumerate(results)
+    ))
+
+
+if __name__ == "__main__":
+    main()
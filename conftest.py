@@ -0,0 +1 @@
+"""Lets pytest import features/ and benchmarks/ from the repo root without installing anything."""
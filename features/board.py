@@ -0,0 +1,225 @@
+"""One pinned "who's studying now" message, kept current with coalesced chat_update calls."""
+import asyncio
+import heapq
+import logging
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError
+
+logger = logging.getLogger(__name__)
+
+# Slack rejects section text over 3000 characters; leave room for the header and "…and N more"
+_SECTION_TEXT_LIMIT = 2800
+# Errors meaning the stored board message is gone and a new one should be posted
+_MISSING_MESSAGE_ERRORS = ("message_not_found", "cant_update_message", "channel_not_found", "is_archived")
+_META_KEY = "board_message_ts"
+
+
+def location_section(location, sessions, render_line, max_lines):
+    """Return (count, section block) listing sessions soonest-ending first, or None if there are none."""
+    if not sessions:
+        return None
+    lines = []
+    length = 0
+    for session in heapq.nsmallest(max_lines, sessions, key=lambda s: s["end_ts"]):
+        line = render_line(session)
+        if length + len(line) > _SECTION_TEXT_LIMIT:
+            break
+        lines.append(line)
+        length += len(line) + 1
+    if len(lines) < len(sessions):
+        lines.append(f"…and {len(sessions) - len(lines)} more")
+    text = f"*{location}* ({len(sessions)})\n" + "\n".join(lines)
+    return len(sessions), {"type": "section", "text": {"type": "mrkdwn", "text": text}}
+
+
+class StudyBoard:
+    """Single summary message listing active sessions grouped by location.
+
+    Register on_change with SessionStore.change_listeners; each change only
+    marks the session's location dirty. The updater (start() for a thread,
+    start_async() for a task) then publishes at most once per `interval`
+    seconds, re-rendering just the dirty locations' sections and reusing the
+    cached blocks for the rest. The first publish posts and pins the message;
+    later ones are a single chat_update. If `meta` (a SessionBackend) is set,
+    the message ts is saved there so a restart keeps editing the same message.
+    With a `lease` (features.shared.Lease) only the replica holding it publishes.
+    Boards sharing one `meta` need their own `meta_key`.
+    """
+
+    def __init__(
+        self, store, locations, render_line, channel_id, interval=3.0, max_lines=20, meta=None, lease=None, meta_key=_META_KEY
+    ):
+        self.store = store
+        self.locations = list(locations)
+        self.render_line = render_line
+        self.channel_id = channel_id
+        self.interval = interval
+        self.max_lines = max_lines
+        self.meta = meta
+        self.lease = lease
+        self.meta_key = meta_key
+        self._leading = lease is None
+        self.message_ts = meta.get_meta(meta_key) if meta is not None else None
+        self._sections = {}
+        self._dirty = set(self.locations)
+        self._cond = threading.Condition()
+        self._wake = None
+        self._loop = None
+        self._thread = None
+        self._fallback = self.locations[-1] if self.locations else None
+
+    def on_change(self, session_id, session):
+        """SessionStore change listener: mark the session's location for re-render."""
+        location = session.get("base_location") or session["location"]
+        self.mark_dirty(location if location in self.locations else self._fallback)
+
+    def mark_dirty(self, location):
+        with self._cond:
+            self._dirty.add(location)
+            self._cond.notify()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def render(self, dirty=()):
+        """Return (text, blocks) for the board, rebuilding only the `dirty` location sections."""
+        for location in dirty:
+            self._sections[location] = self._render_section(location)
+        blocks = [{"type": "header", "text": {"type": "plain_text", "text": "📚 Who's studying now", "emoji": True}}]
+        total = 0
+        for location in self.locations:
+            section = self._sections.get(location)
+            if section is not None:
+                count, block = section
+                total += count
+                blocks.append(block)
+        if total == 0:
+            blocks.append({"type": "section", "text": {"type": "mrkdwn", "text": "Nobody is studying right now. Use `/study` to share where you are."}})
+        blocks.append({"type": "context", "elements": [{"type": "mrkdwn", "text": "Updated automatically. Use `/study` to add yourself."}]})
+        return f"Who's studying now: {total}", blocks
+
+    def _render_section(self, location):
+        sessions = [s for _, s in self.store.in_location(location)]
+        if location == self._fallback:
+            # Sessions whose location isn't on the list are shown under the last one ("Other")
+            known = set(self.locations)
+            for other in self.store.locations():
+                if other not in known:
+                    sessions.extend(s for _, s in self.store.in_location(other))
+        return location_section(location, sessions, self.render_line, self.max_lines)
+
+    def _should_publish(self):
+        """False unless this replica holds the lease; on taking over, reload the shared ts and redraw everything."""
+        if self.lease is None:
+            return True
+        if not self.lease.held():
+            self._leading = False
+            return False
+        if not self._leading:
+            self._leading = True
+            if self.meta is not None:
+                self.message_ts = self.meta.get_meta(self.meta_key)
+            self._restore_dirty(set(self.locations))
+        return True
+
+    def _take_dirty(self):
+        with self._cond:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def _restore_dirty(self, dirty):
+        with self._cond:
+            self._dirty |= dirty
+
+    def _save_ts(self, ts):
+        self.message_ts = ts
+        if self.meta is not None:
+            try:
+                self.meta.set_meta(self.meta_key, ts)
+            except Exception:
+                logger.exception("Failed to save the board message ts")
+
+    def publish(self, client):
+        """Render dirty sections and post or update the board message now."""
+        dirty = self._take_dirty()
+        if not dirty and self.message_ts:
+            return
+        text, blocks = self.render(dirty)
+        try:
+            if self.message_ts:
+                try:
+                    client.chat_update(channel=self.channel_id, ts=self.message_ts, text=text, blocks=blocks)
+                    return
+                except SlackApiError as e:
+                    if e.response.get("error") not in _MISSING_MESSAGE_ERRORS:
+                        raise
+            ts = client.chat_postMessage(channel=self.channel_id, text=text, blocks=blocks)["ts"]
+            self._save_ts(ts)
+            client.pins_add(channel=self.channel_id, timestamp=ts)
+        except Exception:
+            logger.exception("Failed to publish the study board; will retry")
+            self._restore_dirty(dirty)
+
+    async def publish_async(self, client):
+        """publish() for an AsyncWebClient."""
+        dirty = self._take_dirty()
+        if not dirty and self.message_ts:
+            return
+        text, blocks = self.render(dirty)
+        try:
+            if self.message_ts:
+                try:
+                    await client.chat_update(channel=self.channel_id, ts=self.message_ts, text=text, blocks=blocks)
+                    return
+                except SlackApiError as e:
+                    if e.response.get("error") not in _MISSING_MESSAGE_ERRORS:
+                        raise
+            ts = (await client.chat_postMessage(channel=self.channel_id, text=text, blocks=blocks))["ts"]
+            self._save_ts(ts)
+            await client.pins_add(channel=self.channel_id, timestamp=ts)
+        except Exception:
+            logger.exception("Failed to publish the study board; will retry")
+            self._restore_dirty(dirty)
+
+    def start(self, client):
+        """Run the coalescing updater on a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(client,), name="study-board", daemon=True)
+            self._thread.start()
+
+    def start_async(self, client):
+        """Schedule the coalescing updater on the running event loop and return its task."""
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._wake.set()
+        # Held here too: the loop only keeps weak references to tasks
+        self._task = self._loop.create_task(self._run_async(client))
+        return self._task
+
+    def _run(self, client):
+        last = 0.0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._dirty)
+            # Let changes pile up until a full interval has passed since the last publish
+            delay = last + self.interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if self._should_publish():
+                self.publish(client)
+            last = time.monotonic()
+
+    async def _run_async(self, client):
+        last = 0.0
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            delay = last + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self._should_publish():
+                await self.publish_async(client)
+            last = time.monotonic()
+            if self._dirty:
+                self._wake.set()
@@ -0,0 +1,161 @@
+"""Record sanitized incoming requests to a JSONL file, for replay by benchmarks/replay.py.
+
+With CAPTURE_PATH set, every slash command, view_submission, block_actions
+and member_joined_channel payload is appended as {"t": <epoch>, "body": {...}}
+before deduplication, so the file holds what Slack delivered, redeliveries
+included. Payloads keep their shape and sizes but not who sent them or what
+they wrote: user ids become per-capture pseudonyms, free text is masked to
+the same length, and tokens, response URLs and file links are dropped.
+"""
+import atexit
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Append captured requests to this JSONL file (off when unset)
+CAPTURE_PATH = os.environ.get("CAPTURE_PATH", "")
+
+# Removed outright: secrets, and one-time ids replay has to mint fresh anyway
+_DROP_KEYS = frozenset(("token", "response_url", "response_urls", "authorizations", "event_context", "trigger_id"))
+_USER_ID_RE = re.compile(r"^[UW][A-Z0-9]{6,}$")
+_NAME_KEYS = ("name", "username", "real_name", "user_name")
+# Stands in for an uploaded image, so the announcement still gets its image block
+_PLACEHOLDER_FILE = {
+    "id": "F0CAPTURE",
+    "url_private": "https://files.slack.com/files-pri/T0CAPTURE-F0CAPTURE/image.png",
+    "permalink_public": "https://slack-files.com/T0CAPTURE-F0CAPTURE-0capture",
+}
+
+
+def captured_kind(body):
+    """What a payload is for the capture file, or None if it isn't captured."""
+    if body.get("command"):
+        return "command"
+    kind = body.get("type")
+    if kind in ("view_submission", "block_actions"):
+        return kind
+    if (body.get("event") or {}).get("type") == "member_joined_channel":
+        return "member_joined_channel"
+    return None
+
+
+class Pseudonyms:
+    """Stable stand-ins for user ids within one capture; a fresh key per capture keeps captures unlinkable."""
+
+    def __init__(self, key=None):
+        self._key = key or secrets.token_bytes(16)
+
+    def user_id(self, user_id):
+        digest = hmac.new(self._key, user_id.encode("utf-8"), hashlib.sha256).hexdigest()
+        return user_id[0] + digest[:10].upper()
+
+    def name(self, user_id):
+        return "user-" + self.user_id(user_id)[1:].lower()
+
+
+def _mask(text):
+    return "x" * len(text) if isinstance(text, str) else text
+
+
+def _scrub(value, pseudonyms):
+    if isinstance(value, dict):
+        return {k: _scrub(v, pseudonyms) for k, v in value.items() if k not in _DROP_KEYS}
+    if isinstance(value, list):
+        return [_scrub(v, pseudonyms) for v in value]
+    if isinstance(value, str) and _USER_ID_RE.match(value):
+        return pseudonyms.user_id(value)
+    return value
+
+
+def sanitize(body, pseudonyms):
+    """Copy of a request payload with user ids pseudonymized, free text masked and secrets dropped.
+
+    Command text is kept: it's the subcommand (`list`, `stats`) replay needs.
+    """
+    clean = _scrub(body, pseudonyms)
+    user = clean.get("user")
+    if isinstance(user, dict) and user.get("id"):
+        for key in _NAME_KEYS:
+            if key in user:
+                user[key] = pseudonyms.name(user["id"])
+    if clean.get("user_name") and clean.get("user_id"):
+        clean["user_name"] = pseudonyms.name(clean["user_id"])
+    values = ((clean.get("view") or {}).get("state") or {}).get("values") or {}
+    for block in values.values():
+        for element in block.values():
+            if isinstance(element.get("value"), str):
+                element["value"] = _mask(element["value"])
+            if element.get("files"):
+                element["files"] = [dict(_PLACEHOLDER_FILE) for _ in element["files"]]
+    return clean
+
+
+class TrafficCapture:
+    """Appends sanitized requests to a JSONL file from a background thread, so listeners never wait on disk."""
+
+    def __init__(self, path, interval=1.0, pseudonyms=None):
+        self.path = path
+        self.interval = interval
+        self.pseudonyms = pseudonyms or Pseudonyms()
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def record(self, body, now=None):
+        """Queue a payload if it's one captured_kind() covers."""
+        if captured_kind(body) is None:
+            return
+        # Sanitized on the request thread: Bolt may mutate the body once listeners run
+        line = json.dumps({"t": time.time() if now is None else now, "body": sanitize(body, self.pseudonyms)})
+        with self._cond:
+            self._pending.append(line)
+
+    def flush(self):
+        """Write everything queued now, on the calling thread."""
+        with self._flush_lock:
+            with self._cond:
+                lines, self._pending = self._pending, []
+            if not lines:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+            except OSError:
+                logger.exception("Failed to write %d captured request(s) to %s", len(lines), self.path)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait(self.interval)
+            self.flush()
+
+
+def capture_requests(app, path=CAPTURE_PATH):
+    """Record every captured_kind() request the app receives to `path`; returns the TrafficCapture.
+
+    Register it before dedupe_requests so duplicates are captured too.
+    """
+    capture = TrafficCapture(path)
+    if hasattr(app, "async_dispatch"):
+        @app.middleware
+        async def _capture_async(body, next):
+            capture.record(body)
+            await next()
+    else:
+        @app.middleware
+        def _capture(body, next):
+            capture.record(body)
+            next()
+    logger.info("Capturing requests to %s", path)
+    return capture
@@ -0,0 +1,217 @@
+"""Per-channel study configuration, and the session shard each configured channel gets.
+
+One bot can serve several clubs or campuses, each with its own channel and
+location list (STUDY_CHANNELS in the README). Every channel owns a separate
+StudyChannel: its own session store, schedule, expiry and start timers,
+`/study list` cache, history archive and board, so a busy channel's locks,
+indexes and expiry scans never touch another channel's sessions.
+"""
+import json
+import os
+
+from features import tracing
+from features.board import _META_KEY, StudyBoard
+from features.clock import clock_for
+from features.expiry import ExpiryScheduler
+from features.history import HistoryStats, open_archive
+from features.listing import SessionListCache
+from features.schedule import STARTED, SessionSchedule
+from features.sessions import SessionStore
+from features.shared import Lease, SharedSessionStore
+
+# Free-text location; _parse_study_submission uses the specific spot as the whole location
+OTHER_LOCATION = "Other"
+
+
+class ChannelConfig:
+    """A channel the bot announces in: its id, workspace and the locations its modal offers."""
+
+    def __init__(self, channel_id, locations, team_id=None, name=None):
+        self.channel_id = channel_id
+        locations = [loc for loc in locations if loc != OTHER_LOCATION]
+        # "Other" is always offered, last, so the board and list have somewhere to file free-text spots
+        self.locations = tuple(locations) + (OTHER_LOCATION,)
+        self.team_id = team_id
+        self.name = name or channel_id
+
+
+def load_channel_configs(path, default_channel_id, default_locations):
+    """Read the STUDY_CHANNELS JSON file; without one, the bot serves just default_channel_id.
+
+    The file holds a list of {"channel_id", "locations", "team_id", "name"}
+    objects; only channel_id is required and locations default to
+    default_locations. The first entry is the default channel, which gets
+    commands from unconfigured channels and sessions saved without a channel.
+    """
+    if not path:
+        return [ChannelConfig(default_channel_id, default_locations)]
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: expected a non-empty JSON list of channels")
+    configs = []
+    seen = set()
+    for entry in entries:
+        channel_id = entry.get("channel_id")
+        if not channel_id:
+            raise ValueError(f"{path}: every channel needs a channel_id")
+        if channel_id in seen:
+            raise ValueError(f"{path}: channel {channel_id} is listed twice")
+        seen.add(channel_id)
+        configs.append(ChannelConfig(
+            channel_id,
+            entry.get("locations") or default_locations,
+            team_id=entry.get("team_id"),
+            name=entry.get("name"),
+        ))
+    return configs
+
+
+def channel_path(path, channel_id, sharded):
+    """Per-channel variant of a file or directory setting: "history" -> "history/C123", "s.db" -> "s.C123.db"."""
+    if not path or not sharded:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{channel_id}{ext}" if ext else os.path.join(path, channel_id)
+
+
+class StudyChannel:
+    """Sessions for one configured channel.
+
+    With `shared_db` the store lives in that SQLite file (one per channel, so
+    channels don't share its write lock) and a lease picks the replica that
+    expires sessions; otherwise sessions are in memory and upcoming ones wait
+    in a SessionSchedule. Timers are created here but started by the handlers,
+    and the history archive is opened by them too (open_history), so importing
+    the bot doesn't create HISTORY_DIR.
+    """
+
+    def __init__(self, config, render_line, tz, shared_db="", lease_ttl=10.0, history_dir=""):
+        self.config = config
+        self.channel_id = config.channel_id
+        self.locations = config.locations
+        self.render_line = render_line
+        self.store = SharedSessionStore(shared_db) if shared_db else SessionStore()
+        self.lease = Lease(shared_db, "leader", ttl=lease_ttl) if shared_db else None
+        self.expiry_scheduler = ExpiryScheduler(self.store, lease=self.lease)
+        # Kept per process, so with a shared store every session starts when it's submitted
+        self.schedule = None if shared_db else SessionSchedule(self.store)
+        self.start_scheduler = ExpiryScheduler(self.schedule, observe=None) if self.schedule is not None else None
+        self.tz = tz
+        self.history_dir = history_dir
+        self.history = None
+        self.history_stats = None
+        self.session_list = SessionListCache(self.store, self.locations, render_line, schedule=self.schedule, clock=clock_for(tz))
+        self.store.change_listeners.append(self.session_list.on_change)
+        self.board = None
+
+    def __contains__(self, session_id):
+        return session_id in self.store or (self.schedule is not None and session_id in self.schedule)
+
+    @tracing.traced("store.reserve")
+    def reserve(self, session_id, session):
+        """Store a new session unless it overlaps the user's others; return SCHEDULED, STARTED or None."""
+        if self.schedule is None:
+            return STARTED if self.store.add_unless_active(session_id, session) else None
+        return self.schedule.reserve(session_id, session)
+
+    @tracing.traced("store.pop_session")
+    def pop_session(self, session_id):
+        """Remove an active or upcoming session (for cancel); None if it's already gone."""
+        session = self.store.pop(session_id)
+        if session is None and self.schedule is not None:
+            session = self.schedule.cancel(session_id)
+        return session
+
+    @tracing.traced("store.get_user_session")
+    def get_user_session(self, user_id):
+        """Return (session_id, session) for the user's active session in this channel, or (None, None)."""
+        return self.store.get_user_session(user_id)
+
+    def restore(self, sessions, now):
+        """Reload saved [(session_id, session)]: started and ended ones into the store, the rest into the schedule.
+
+        A scheduled session whose start passed while the bot was down (it
+        still has its time_range but no message_ts) goes back into the
+        schedule as well, so the start timer announces it on its first run.
+        """
+        upcoming, started = [], []
+        for sid, s in sessions:
+            unannounced = "time_range" in s and not s.get("message_ts") and s["end_ts"] > now
+            (upcoming if (s.get("start_ts") or 0) > now or unannounced else started).append((sid, s))
+        self.store.restore(started)
+        if self.schedule is not None:
+            self.schedule.restore(upcoming)
+        else:
+            self.store.restore(upcoming)
+
+    def open_history(self):
+        """Open the history archive (unless history_dir is empty), archive removed sessions and start flushing.
+
+        Call before the store's sessions are restored and its timers start,
+        so no removal is missed.
+        """
+        if self.history is None and self.history_dir:
+            self.history = open_archive(self.history_dir)
+            self.history_stats = HistoryStats(self.history, self.tz)
+            self.history.follow(self.store)
+            self.history.start()
+        return self.history
+
+    def attach_board(self, interval, meta, default):
+        """Create this channel's live board and subscribe it to session changes.
+
+        Every channel's board message ts shares `meta`, so all but the
+        default channel key it by channel id.
+        """
+        if self.board is None:
+            self.board = StudyBoard(
+                self.store,
+                self.locations,
+                self.render_line,
+                self.channel_id,
+                interval=interval,
+                meta=meta,
+                lease=self.lease,
+                meta_key=_META_KEY if default else f"{_META_KEY}:{self.channel_id}",
+            )
+            self.store.change_listeners.append(self.board.on_change)
+        return self.board
+
+
+class ChannelDirectory:
+    """The configured StudyChannels, looked up by channel, workspace or session."""
+
+    def __init__(self, channels):
+        self.channels = list(channels)
+        self.default = self.channels[0]
+        self._by_id = {c.channel_id: c for c in self.channels}
+        self._by_team = {}
+        for c in self.channels:
+            if c.config.team_id:
+                self._by_team.setdefault(c.config.team_id, c)
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def get(self, channel_id):
+        """The StudyChannel configured for channel_id, or None."""
+        return self._by_id.get(channel_id)
+
+    def route(self, channel_id=None, team_id=None):
+        """Where a request belongs: its channel if configured, else its workspace's first channel, else the default."""
+        return self._by_id.get(channel_id) or self._by_team.get(team_id) or self.default
+
+    def for_session(self, session_id):
+        """The StudyChannel holding an active or upcoming session, or None."""
+        for channel in self.channels:
+            if session_id in channel:
+                return channel
+        return None
+
+    def count(self, attr):
+        """Total of len(channel.<attr>) over channels that have one, for gauges."""
+        return sum(len(getattr(c, attr)) for c in self.channels if getattr(c, attr) is not None)
@@ -0,0 +1,134 @@
+"""Wall-clock times in the bot's timezone: lookup tables, a cached `now`, and study windows.
+
+The modal and every message deal in clock minutes ("2:05 PM"), and there
+are only 1440 of them, so 12-hour to 24-hour conversion, labels and parsing
+labels back are table lookups instead of strptime/strftime round trips.
+A LocalClock caches `now` per minute and each local day's midnight, so a
+picked start and end become timestamps with arithmetic; the few days a year
+with a DST change go through pytz, where a time the clocks skip counts as
+if they hadn't changed yet (2:30 AM is 3:30 AM) and a repeated time means
+its first occurrence.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from datetime import time as clock_time
+from functools import lru_cache
+
+import pytz
+
+# Set your timezone here (e.g., 'America/Los_Angeles', 'America/New_York', 'America/Chicago')
+TIMEZONE = pytz.timezone(os.environ.get("TZ", "America/Los_Angeles"))
+
+MINUTES_PER_DAY = 24 * 60
+
+# (hour 1-12, "AM"/"PM") -> hour 0-23
+TO_24 = {(h, ampm): h % 12 + (12 if ampm == "PM" else 0) for h in range(1, 13) for ampm in ("AM", "PM")}
+# Minute of the day -> "2:05 PM", as every message shows it
+LABELS = tuple(f"{m // 60 % 12 or 12}:{m % 60:02d} {'AM' if m < 720 else 'PM'}" for m in range(MINUTES_PER_DAY))
+_MINUTES = {label: m for m, label in enumerate(LABELS)}
+_MINUTES.update({f"0{label}": m for label, m in list(_MINUTES.items()) if label[1] == ":"})
+# (hour 1-12, minute, "AM"/"PM") -> minute of the day, as the modal's selects give them
+_CLOCK_MINUTES = {(h, m, ampm): h24 * 60 + m for (h, ampm), h24 in TO_24.items() for m in range(60)}
+
+
+def clock_minute(hour, minute, ampm):
+    """Minute of the day for a 12-hour clock time; ValueError if it isn't one."""
+    try:
+        return _CLOCK_MINUTES[(hour, minute, ampm)]
+    except KeyError:
+        raise ValueError(f"not a clock time: {hour}:{minute} {ampm}") from None
+
+
+def parse_label(text):
+    """Minute of the day for a label like "2:05 PM" (or "02:05 PM"); ValueError if it isn't one."""
+    try:
+        return _MINUTES[text]
+    except KeyError:
+        raise ValueError(f"not a clock time: {text!r}") from None
+
+
+class LocalClock:
+    """`now`, labels and study windows in one pytz timezone.
+
+    Thread-safe: the caches are tuples and dict entries swapped in whole,
+    and a lost race only means computing one of them twice.
+    """
+
+    def __init__(self, tz):
+        self.tz = tz
+        # (epoch minute, aware datetime at its start); UTC offsets are whole minutes
+        self._minute = (None, None)
+        # local date -> (midnight ts, next midnight ts, whether the day is exactly 24 hours)
+        self._days = {}
+        # The day minute_of_day() last looked at
+        self._span = (0.0, 0.0, False)
+
+    def now(self, ts=None):
+        """Aware datetime for ts (default: now), from the per-minute cache."""
+        ts = time.time() if ts is None else ts
+        minute = int(ts // 60)
+        cached, start = self._minute
+        if cached != minute:
+            start = datetime.fromtimestamp(minute * 60, self.tz)
+            self._minute = (minute, start)
+        return start + timedelta(seconds=ts - minute * 60)
+
+    def at(self, day, minute):
+        """Timestamp of a minute of the day on a local date."""
+        start, _, uniform = self._day(day)
+        if uniform:
+            return start + minute * 60
+        naive = datetime.combine(day, clock_time(minute // 60, minute % 60))
+        try:
+            return self.tz.localize(naive, is_dst=None).timestamp()
+        except pytz.AmbiguousTimeError:
+            return self.tz.localize(naive, is_dst=True).timestamp()
+        except pytz.NonExistentTimeError:
+            return self.tz.localize(naive, is_dst=False).timestamp()
+
+    def window(self, start_minute, end_minute, now=None):
+        """(start_ts, end_ts) for clock minutes picked at timestamp `now`.
+
+        Both are today's, the end on the next day if it isn't after the
+        start, and both a day later if that window is already over (1–3 AM
+        picked at 11 PM means tonight).
+        """
+        now = time.time() if now is None else now
+        today = self.now(now).date()
+        end_day = today if end_minute > start_minute else today + timedelta(days=1)
+        start, end = self.at(today, start_minute), self.at(end_day, end_minute)
+        if end <= now:
+            start = self.at(today + timedelta(days=1), start_minute)
+            end = self.at(end_day + timedelta(days=1), end_minute)
+        return start, end
+
+    def minute_of_day(self, ts):
+        """Local minute of the day (0-1439) at timestamp ts."""
+        start, end, uniform = self._span
+        if not (uniform and start <= ts < end):
+            local = datetime.fromtimestamp(ts, self.tz)
+            start, end, uniform = self._span = self._day(local.date())
+            if not uniform:
+                return local.hour * 60 + local.minute
+        return int((ts - start) // 60)
+
+    def label(self, ts):
+        """The label ("2:05 PM") for timestamp ts."""
+        return LABELS[self.minute_of_day(ts)]
+
+    def _day(self, day):
+        info = self._days.get(day)
+        if info is None:
+            start = self.tz.localize(datetime.combine(day, clock_time())).timestamp()
+            end = self.tz.localize(datetime.combine(day + timedelta(days=1), clock_time())).timestamp()
+            if len(self._days) >= 64:
+                self._days = {}
+            info = self._days[day] = (start, end, end - start == 86400)
+        return info
+
+
+@lru_cache(maxsize=None)
+def clock_for(tz):
+    """The shared LocalClock for a pytz timezone."""
+    return LocalClock(tz)
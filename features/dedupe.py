@@ -0,0 +1,164 @@
+"""Drop redelivered and double-submitted requests before any listener (or Web API call) runs."""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from slack_bolt import BoltResponse
+from slack_bolt.context.ack import Ack
+from slack_bolt.context.ack.async_ack import AsyncAck
+
+from features import metrics
+
+DEDUPE_TTL = float(os.environ.get("DEDUPE_TTL", "300"))
+DEDUPE_MAX_KEYS = int(os.environ.get("DEDUPE_MAX_KEYS", "10000"))
+
+
+class TTLCache:
+    """Bounded set of recently seen keys: least recently added go first, and keys expire after `ttl` seconds."""
+
+    def __init__(self, max_keys=DEDUPE_MAX_KEYS, ttl=DEDUPE_TTL):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._expires = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._expires)
+
+    def seen(self, key, now=None):
+        """Record key; return True if it was already recorded and hasn't expired."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expires = self._expires.get(key)
+            if expires is not None and expires > now:
+                return True
+            self._expires[key] = now + self.ttl
+            self._expires.move_to_end(key)
+            # Insertion order is expiry order (one ttl), so expired keys are always at the front
+            while self._expires:
+                oldest, oldest_expires = next(iter(self._expires.items()))
+                if oldest_expires > now and len(self._expires) <= self.max_keys:
+                    break
+                del self._expires[oldest]
+            return False
+
+    def forget(self, key):
+        """Drop key, so the next seen(key) is a miss."""
+        with self._lock:
+            self._expires.pop(key, None)
+
+
+def request_key(body):
+    """Idempotency key for a request payload, or None if it has nothing stable to key on.
+
+    Redeliveries repeat the whole payload; double clicks repeat what the user
+    did but not the delivery ids, so each kind keys on what identifies the intent:
+    events on event_id, commands on trigger_id, modal submissions on the view
+    plus its input values, button clicks on the message, button and value.
+    """
+    if body.get("event_id"):
+        return "event:" + body["event_id"]
+    kind = body.get("type")
+    if kind == "view_submission":
+        view = body.get("view") or {}
+        values = json.dumps((view.get("state") or {}).get("values"), sort_keys=True)
+        return f"view:{view.get('id')}:{hashlib.sha1(values.encode('utf-8')).hexdigest()}"
+    if kind == "block_actions":
+        action = (body.get("actions") or [{}])[0]
+        container = body.get("container") or {}
+        value = action.get("value") or (action.get("selected_option") or {}).get("value")
+        where = container.get("message_ts") or container.get("view_id")
+        if value is None or where is None:
+            return "action:" + action["action_ts"] if action.get("action_ts") else None
+        return f"action:{(body.get('user') or {}).get('id')}:{where}:{action.get('action_id')}:{value}"
+    if body.get("command") and body.get("trigger_id"):
+        return "command:" + body["trigger_id"]
+    return None
+
+
+def _answered_with_errors(response):
+    """Whether an ack response keeps a modal open with validation errors."""
+    if response is None or not isinstance(response.body, str) or not response.body.startswith("{"):
+        return False
+    return json.loads(response.body).get("response_action") == "errors"
+
+
+class _ForgetOnErrorsAck(Ack):
+    """ack() for a view submission: answering with errors forgets its key, so the user can submit it again."""
+
+    def __init__(self, cache, key):
+        super().__init__()
+        self.cache = cache
+        self.key = key
+
+    def __call__(self, *args, **kwargs):
+        response = super().__call__(*args, **kwargs)
+        if _answered_with_errors(response):
+            self.cache.forget(self.key)
+        return response
+
+
+class _AsyncForgetOnErrorsAck(AsyncAck):
+    def __init__(self, cache, key):
+        super().__init__()
+        self.cache = cache
+        self.key = key
+
+    async def __call__(self, *args, **kwargs):
+        response = await super().__call__(*args, **kwargs)
+        if _answered_with_errors(response):
+            self.cache.forget(self.key)
+        return response
+
+
+def _kind(body):
+    if body.get("event_id"):
+        return "event"
+    return body.get("type") or ("command" if body.get("command") else "other")
+
+
+def dedupe_requests(app, cache=None):
+    """Acknowledge and drop any request whose request_key() was seen within the cache's TTL.
+
+    Runs as global middleware, so a duplicate gets an empty 200 (the ack
+    Slack is waiting for) without reaching a listener. A modal submission
+    the listener answers with response_action="errors" is forgotten again:
+    the modal stays open, and submitting it unchanged (say, after cancelling
+    the session it clashed with) is a new attempt, not a double click. The
+    cache is per process: with several replicas, Socket Mode may redeliver
+    to another one.
+    """
+    cache = cache or TTLCache()
+    metrics.gauge("ctc_dedupe_keys", "Idempotency keys currently remembered.", lambda: len(cache))
+
+    def _check(body):
+        """Return (key, duplicate)."""
+        key = request_key(body)
+        if key is None:
+            return None, False
+        duplicate = cache.seen(key)
+        metrics.observe_dedupe(_kind(body), duplicate)
+        return key, duplicate
+
+    if hasattr(app, "async_dispatch"):
+        @app.middleware
+        async def _drop_duplicates_async(body, context, next):
+            key, duplicate = _check(body)
+            if duplicate:
+                return BoltResponse(status=200, body="")
+            if body.get("type") == "view_submission":
+                context["ack"] = _AsyncForgetOnErrorsAck(cache, key)
+            await next()
+    else:
+        @app.middleware
+        def _drop_duplicates(body, context, next):
+            key, duplicate = _check(body)
+            if duplicate:
+                return BoltResponse(status=200, body="")
+            if body.get("type") == "view_submission":
+                context["ack"] = _ForgetOnErrorsAck(cache, key)
+            next()
+    return cache
@@ -0,0 +1,152 @@
+"""Timer-driven session expiry: sleep until the next end_ts instead of polling."""
+import asyncio
+import logging
+import threading
+import time
+
+from features import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+# Wake slightly after end_ts so pop_expired's strict `end_ts < now` check passes
+_WAKE_SLACK_SECONDS = 0.01
+
+
+def _next_wake(store, lease):
+    """When the timer should next run: the earliest end_ts, or sooner if the lease needs renewing."""
+    if lease is None:
+        return store.next_expiry()
+    renew_at = time.time() + lease.ttl / 3
+    if not lease.held():
+        return renew_at
+    end_ts = store.next_expiry()
+    return renew_at if end_ts is None else min(end_ts, renew_at)
+
+
+class ExpiryScheduler:
+    """Background thread that expires sessions exactly when they end.
+
+    Sleeps until the store's next end_ts; SessionStore.add/restore call
+    notify() so a session ending sooner than that wakes it early. Everything
+    due is popped in one batch and handed to on_expired([(session_id, session)]).
+    expire_due() is safe to call from request handlers as well.
+
+    With a `lease` (features.shared.Lease) several replicas can share one
+    store: the timer renews the lease every ttl/3 seconds and only the holder
+    expires sessions; on the others expire_due() does nothing.
+
+    `store` only needs next_expiry/pop_expired/expiry_listener, so the same
+    timer also starts scheduled sessions (features.schedule); pass
+    observe=None there so starts aren't recorded as expiry lag.
+    """
+
+    def __init__(self, store, on_expired=None, lease=None, observe=metrics.observe_expiry):
+        self.store = store
+        self.on_expired = on_expired
+        self.lease = lease
+        self.observe = observe
+        self._cond = threading.Condition()
+        self._expire_lock = threading.Lock()
+        self._wake_at = None
+        self._thread = None
+        store.expiry_listener = self.notify
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="session-expiry", daemon=True)
+            self._thread.start()
+
+    def notify(self, end_ts):
+        """Wake the timer if end_ts is earlier than what it's sleeping towards."""
+        with self._cond:
+            if self._wake_at is None or end_ts < self._wake_at:
+                self._cond.notify()
+
+    @tracing.traced("store.expire_due")
+    def expire_due(self, now=None):
+        """Pop every session that has ended and pass the batch to on_expired."""
+        if self.lease is not None and not self.lease.held():
+            return []
+        with self._expire_lock:
+            now = time.time() if now is None else now
+            expired = self.store.pop_expired(now)
+        if self.observe:
+            self.observe(expired, now)
+        if expired and self.on_expired:
+            try:
+                self.on_expired(expired)
+            except Exception:
+                logger.exception("Failed to clean up %d expired session(s)", len(expired))
+        return expired
+
+    def _run(self):
+        while True:
+            if self.lease is not None:
+                self.lease.acquire()
+            self.expire_due()
+            with self._cond:
+                self._wake_at = _next_wake(self.store, self.lease)
+                timeout = None if self._wake_at is None else max(0.0, self._wake_at - time.time()) + _WAKE_SLACK_SECONDS
+                self._cond.wait(timeout)
+                self._wake_at = None
+
+
+class AsyncExpiryScheduler:
+    """asyncio counterpart of ExpiryScheduler; on_expired is a coroutine function."""
+
+    def __init__(self, store, on_expired=None, lease=None, observe=metrics.observe_expiry):
+        self.store = store
+        self.on_expired = on_expired
+        self.lease = lease
+        self.observe = observe
+        self._loop = None
+        self._wake = None
+        self._wake_at = None
+        store.expiry_listener = self.notify
+
+    def start(self):
+        """Schedule the timer on the running event loop and return its task."""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        # Held here too: the loop only keeps weak references to tasks
+        self._task = self._loop.create_task(self._run())
+        return self._task
+
+    def notify(self, end_ts):
+        if self._loop is not None and (self._wake_at is None or end_ts < self._wake_at):
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def expire_due(self, now=None):
+        if self.lease is not None and not self.lease.held():
+            return []
+        now = time.time() if now is None else now
+        if self.lease is not None:
+            # A shared SQLite store: the DELETE may wait for another replica's write lock
+            expired = await asyncio.get_running_loop().run_in_executor(None, self.store.pop_expired, now)
+        else:
+            expired = self.store.pop_expired(now)
+        if self.observe:
+            self.observe(expired, now)
+        if expired and self.on_expired:
+            try:
+                await self.on_expired(expired)
+            except Exception:
+                logger.exception("Failed to clean up %d expired session(s)", len(expired))
+        return expired
+
+    async def _run(self):
+        while True:
+            if self.lease is not None:
+                await self._loop.run_in_executor(None, self.lease.acquire)
+            await self.expire_due()
+            self._wake.clear()
+            if self.lease is not None:
+                self._wake_at = await self._loop.run_in_executor(None, _next_wake, self.store, self.lease)
+            else:
+                self._wake_at = _next_wake(self.store, self.lease)
+            timeout = None if self._wake_at is None else max(0.0, self._wake_at - time.time()) + _WAKE_SLACK_SECONDS
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake_at = None
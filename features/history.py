@@ -0,0 +1,420 @@
+"""Append-only columnar archive of finished sessions, and the `/study stats` aggregations over it.
+
+Layout of HISTORY_DIR (one file per column, appended in lockstep):
+
+    user.u4      uint32  index into strings.txt (the user_id)
+    location.u4  uint32  index into strings.txt (the base location)
+    start.f8     float64 start_ts (NaN if unknown)
+    end.f8       float64 when it actually ended: end_ts, or the cancel time
+    outcome.u1   uint8   EXPIRED or CANCELLED
+    strings.txt  intern table, one string per line; line number = index
+
+Columns are read through read-only memory maps, re-mapped when the files grow.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EXPIRED = 0
+CANCELLED = 1
+
+_COLUMNS = (
+    ("user", "u4", np.uint32),
+    ("location", "u4", np.uint32),
+    ("start", "f8", np.float64),
+    ("end", "f8", np.float64),
+    ("outcome", "u1", np.uint8),
+)
+
+# Stats are aggregated per local week (Monday 00:00); 1970-01-01 was a Thursday
+_WEEK_SHIFT_DAYS = 3
+HOURS_PER_WEEK = 7 * 24
+# Sessions longer than this are clipped in the hour-of-week heatmap
+_MAX_SESSION_HOURS = 48
+
+
+class HistoryArchive:
+    """Writer and reader for the columnar history in `path`.
+
+    append() only buffers; a background thread writes the buffer every
+    `interval` seconds (and at exit), strings first so every index on disk
+    resolves. Columns are trimmed to a common length on open, so a crash
+    mid-write loses at most the last partial batch.
+    """
+
+    def __init__(self, path, interval=5.0):
+        self.path = path
+        self.interval = interval
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._strings = []
+        self._string_index = {}
+        self._pending = []
+        self._maps = None
+        self._mapped_rows = -1
+        self._load_strings()
+        self._trim_columns()
+        self._thread = None
+
+    def start(self):
+        """Flush on a daemon thread every `interval` seconds and at interpreter exit."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="history-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def append(self, session, outcome, ended_at=None):
+        """Buffer one finished session (a SessionStore session dict)."""
+        ended_at = time.time() if ended_at is None else ended_at
+        start = session.get("start_ts")
+        with self._lock:
+            self._pending.append((
+                self._intern(session["user_id"]),
+                self._intern(session.get("base_location") or session["location"]),
+                np.nan if start is None else start,
+                min(session["end_ts"], ended_at),
+                outcome,
+            ))
+
+    def follow(self, store):
+        """Archive every session as it leaves `store` (expired, or cancelled before its end_ts)."""
+
+        def on_change(session_id, session):
+            # Adds notify too; sessions replayed from other replicas (features.shared) carry
+            # no user_id, and the replica that removed them archives them
+            if "user_id" not in session or session_id in store:
+                return
+            ended_at = time.time()
+            self.append(session, EXPIRED if session["end_ts"] <= ended_at else CANCELLED, ended_at)
+
+        store.change_listeners.append(on_change)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                new_strings = self._strings[self._strings_written:]
+                self._strings_written = len(self._strings)
+            if new_strings:
+                with open(self._file("strings.txt"), "a", encoding="utf-8") as f:
+                    f.write("".join(s.replace("\n", " ") + "\n" for s in new_strings))
+            if not pending:
+                return
+            rows = list(zip(*pending))
+            for (name, suffix, dtype), values in zip(_COLUMNS, rows):
+                with open(self._file(f"{name}.{suffix}"), "ab") as f:
+                    np.asarray(values, dtype=dtype).tofile(f)
+
+    def __len__(self):
+        return self._rows_on_disk()
+
+    def columns(self):
+        """Return {name: read-only array} over everything flushed so far (memory-mapped)."""
+        rows = self._rows_on_disk()
+        if rows != self._mapped_rows:
+            self._maps = {
+                name: (np.memmap(self._file(f"{name}.{suffix}"), dtype=dtype, mode="r", shape=(rows,))
+                       if rows else np.empty(0, dtype=dtype))
+                for name, suffix, dtype in _COLUMNS
+            }
+            self._mapped_rows = rows
+        return self._maps
+
+    def strings(self):
+        with self._lock:
+            return list(self._strings)
+
+    def index_of(self, value):
+        """Interned index of a string, or None if it was never archived."""
+        with self._lock:
+            return self._string_index.get(value)
+
+    def _intern(self, value):
+        index = self._string_index.get(value)
+        if index is None:
+            index = self._string_index[value] = len(self._strings)
+            self._strings.append(value)
+        return index
+
+    def _load_strings(self):
+        try:
+            with open(self._file("strings.txt"), encoding="utf-8") as f:
+                self._strings = f.read().splitlines()
+        except FileNotFoundError:
+            self._strings = []
+        self._string_index = {s: i for i, s in enumerate(self._strings)}
+        self._strings_written = len(self._strings)
+
+    def _rows_on_disk(self):
+        return min(self._column_rows(name, suffix, dtype) for name, suffix, dtype in _COLUMNS)
+
+    def _column_rows(self, name, suffix, dtype):
+        try:
+            return os.path.getsize(self._file(f"{name}.{suffix}")) // np.dtype(dtype).itemsize
+        except FileNotFoundError:
+            return 0
+
+    def _trim_columns(self):
+        rows = self._rows_on_disk()
+        for name, suffix, dtype in _COLUMNS:
+            path = self._file(f"{name}.{suffix}")
+            if os.path.exists(path) and self._column_rows(name, suffix, dtype) != rows:
+                logger.warning("Trimming %s to %d rows after an interrupted write", path, rows)
+                os.truncate(path, rows * np.dtype(dtype).itemsize)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush session history")
+
+
+class HistoryStats:
+    """Vectorized /study stats over a HistoryArchive, cached per local week.
+
+    Rows are folded into per-week aggregates incrementally: each call only
+    processes rows appended since the last one, so a query over a year of
+    history sums ~52 cached weeks instead of rescanning the archive.
+    """
+
+    def __init__(self, archive, tz):
+        self.archive = archive
+        self.tz = tz
+        self._lock = threading.Lock()
+        self._weeks = {}
+        self._aggregated_rows = 0
+        self._offsets = {}
+
+    def compute(self, since=None, until=None, user_id=None, top=5):
+        """Return a dict of stats for sessions that ended in [since, until), widened to whole local weeks."""
+        until = time.time() if until is None else until
+        with self._lock:
+            self._aggregate_new_rows()
+            last = self._week_of(until)
+            first = min(self._weeks, default=last) if since is None else self._week_of(since)
+            weeks = [self._weeks.get(week) for week in range(first, last + 1)]
+        strings = self.archive.strings()
+        n_strings = len(strings)
+        sessions = np.zeros(n_strings, dtype=np.int64)
+        hours = np.zeros(n_strings)
+        heatmap = np.zeros(HOURS_PER_WEEK)
+        for agg in weeks:
+            if agg is not None:
+                sessions[: len(agg["sessions"])] += agg["sessions"]
+                hours[: len(agg["hours"])] += agg["hours"]
+                heatmap += agg["heatmap"]
+        today = int((self._local_day(np.array([until]))[0] + _WEEK_SHIFT_DAYS) % 7)
+        current, longest = _streaks(weeks, today, n_strings)
+        busiest = [(strings[i], int(sessions[i]), float(hours[i])) for i in np.argsort(-sessions, kind="stable")[:top] if sessions[i]]
+        user = self.archive.index_of(user_id)
+        return {
+            "sessions": int(sessions.sum()),
+            "hours": float(hours.sum()),
+            "busiest": busiest,
+            "heatmap": heatmap.reshape(7, 24),
+            "streaks": [(strings[i], int(longest[i])) for i in np.argsort(-longest, kind="stable")[:top] if longest[i]],
+            "user_streak": (0, 0) if user is None or user >= n_strings else (int(current[user]), int(longest[user])),
+        }
+
+    def response(self, query="", user_id=None, now=None):
+        """Return (text, blocks) answering `/study stats [week|month|year|all]` for user_id."""
+        period = (query or "").strip().lower() or "month"
+        if period not in PERIODS:
+            text = "Usage: `/study stats [" + "|".join(PERIODS) + "]`"
+            return text, [_section(text)]
+        now = time.time() if now is None else now
+        days_back, label = PERIODS[period]
+        stats = self.compute(since=None if days_back is None else now - days_back * 86400, until=now, user_id=user_id)
+        if not stats["sessions"]:
+            text = f"No finished study sessions {label} yet."
+            return text, [_section(text)]
+        summary = f"{stats['sessions']} sessions, {stats['hours']:.0f} hours"
+        busiest = "\n".join(
+            f"{i}. *{location}* — {count} sessions, {hours:.0f}h"
+            for i, (location, count, hours) in enumerate(stats["busiest"], 1)
+        )
+        streak_lines = "\n".join(f"<@{user}> — {days} days" for user, days in stats["streaks"][:3])
+        current, longest = stats["user_streak"]
+        blocks = [
+            _section(f"*Study stats {label}*: {summary}"),
+            _section(f"*Busiest locations*\n{busiest}"),
+            _section(f"*When people study* (sessions in progress, local time)\n```{_heatmap_text(stats['heatmap'])}```"),
+            _section(f"*Longest streaks*\n{streak_lines}\nYour streak: {current} days (best {longest})"),
+        ]
+        return f"{summary} {label}", blocks
+
+    def _aggregate_new_rows(self):
+        cols = self.archive.columns()
+        rows = len(cols["end"])
+        if rows <= self._aggregated_rows:
+            return
+        window = slice(self._aggregated_rows, rows)
+        user = cols["user"][window].astype(np.int64)
+        location = cols["location"][window].astype(np.int64)
+        end = np.asarray(cols["end"][window])
+        start = np.asarray(cols["start"][window])
+        start = np.where(np.isnan(start), end, start)
+        local_start = start + self._utc_offsets(start)
+        local_end = end + self._utc_offsets(end)
+        end_day = np.floor(local_end / 86400).astype(np.int64)
+        week = (end_day + _WEEK_SHIFT_DAYS) // 7
+        duration = np.clip(end - start, 0, None) / 3600
+        # One pass per week over that week's rows only
+        order = np.argsort(week, kind="stable")
+        weeks, first = np.unique(week[order], return_index=True)
+        for w, members in zip(weeks.tolist(), np.split(order, first[1:])):
+            agg = self._weeks.get(w)
+            if agg is None:
+                agg = self._weeks[w] = {
+                    "sessions": np.zeros(0, dtype=np.int64),
+                    "hours": np.zeros(0),
+                    "heatmap": np.zeros(HOURS_PER_WEEK),
+                    "days": np.zeros((7, 0), dtype=bool),
+                }
+            agg["sessions"] = _add_padded(agg["sessions"], np.bincount(location[members]))
+            agg["hours"] = _add_padded(agg["hours"], np.bincount(location[members], weights=duration[members]))
+            agg["heatmap"] += _hour_of_week_occupancy(local_start[members], local_end[members])
+            width = int(user[members].max()) + 1
+            if agg["days"].shape[1] < width:
+                agg["days"] = np.hstack([agg["days"], np.zeros((7, width - agg["days"].shape[1]), dtype=bool)])
+            agg["days"][(end_day[members] + _WEEK_SHIFT_DAYS) % 7, user[members]] = True
+            agg["runs"] = _week_runs(agg["days"])
+        self._aggregated_rows = rows
+
+    def _utc_offsets(self, ts):
+        """Per-timestamp UTC offset in seconds, looked up once per distinct UTC day.
+
+        A day whose offset changes (the two a year with a DST change) is
+        looked up per timestamp instead.
+        """
+        days = np.floor(ts / 86400).astype(np.int64)
+        unique_days, inverse = np.unique(days, return_inverse=True)
+        offsets = np.empty(len(unique_days))
+        for i, day in enumerate(unique_days.tolist()):
+            offset = self._offsets.get(day)
+            if offset is None:
+                first, last = self._offset_at(day * 86400), self._offset_at((day + 1) * 86400 - 1)
+                offset = self._offsets[day] = first if first == last else np.nan
+            offsets[i] = offset
+        offsets = offsets[inverse]
+        changing = np.isnan(offsets)
+        if changing.any():
+            offsets[changing] = [self._offset_at(t) for t in ts[changing].tolist()]
+        return offsets
+
+    def _offset_at(self, ts):
+        return datetime.fromtimestamp(ts, self.tz).utcoffset().total_seconds()
+
+    def _local_day(self, ts):
+        return np.floor((ts + self._utc_offsets(ts)) / 86400).astype(np.int64)
+
+    def _week_of(self, ts):
+        return int((self._local_day(np.array([ts]))[0] + _WEEK_SHIFT_DAYS) // 7)
+
+
+# /study stats period -> (days back, label); whole local weeks, so "week" is the week so far
+PERIODS = {
+    "week": (0, "this week"),
+    "month": (28, "in the last month"),
+    "year": (364, "in the last year"),
+    "all": (None, "all time"),
+}
+
+_SHADES = " ░▒▓█"
+_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def _section(text):
+    return {"type": "section", "text": {"type": "mrkdwn", "text": text}}
+
+
+def _heatmap_text(heatmap):
+    """7x24 occupancy as shaded characters, one row per weekday, hours 0-23 across."""
+    peak = heatmap.max() or 1
+    levels = np.ceil(heatmap / peak * (len(_SHADES) - 1)).astype(int)
+    lines = ["    0     6     12    18"]
+    for day, row in zip(_WEEKDAYS, levels):
+        lines.append(day + " " + "".join(_SHADES[level] for level in row))
+    return "\n".join(lines)
+
+
+def _add_padded(total, counts):
+    if len(counts) > len(total):
+        total = np.concatenate([total, np.zeros(len(counts) - len(total), dtype=total.dtype)])
+    total[: len(counts)] += counts
+    return total
+
+
+def _hour_of_week_occupancy(local_start, local_end):
+    """Count, for each of the 168 hours of the week, how many sessions were on during it."""
+    first_hour = np.floor(local_start / 3600).astype(np.int64)
+    last_hour = np.ceil(local_end / 3600).astype(np.int64)
+    last_hour = np.minimum(np.maximum(last_hour, first_hour + 1), first_hour + _MAX_SESSION_HOURS)
+    # Difference array over hours since the earliest start, then fold onto the week
+    base = first_hour.min()
+    span = int(last_hour.max() - base) + 1
+    diff = np.bincount(first_hour - base, minlength=span) - np.bincount(last_hour - base, minlength=span)
+    on = np.cumsum(diff)[:-1]
+    # Hour 0 of the week is Monday 00:00; epoch hour 0 was Thursday 00:00
+    hour_of_week = (np.arange(base, base + len(on)) + _WEEK_SHIFT_DAYS * 24) % HOURS_PER_WEEK
+    return np.bincount(hour_of_week, weights=on, minlength=HOURS_PER_WEEK)
+
+
+def _week_runs(days):
+    """Per column of a week's (7, users) bool grid: (days studied from Monday, days up to Sunday, longest run)."""
+    # Days studied so far, minus the count at the last day off: the length of the run ending each day
+    total = np.cumsum(days, axis=0, dtype=np.int32)
+    run = total - np.maximum.accumulate(np.where(days, 0, total), axis=0)
+    prefix = np.where(days.all(axis=0), 7, np.argmin(days, axis=0)).astype(np.int32)
+    return prefix, run[-1], run.max(axis=0)
+
+
+def _streaks(weeks, today, width):
+    """(current streak, longest streak) in days per interned string, over consecutive week aggregates.
+
+    Whole weeks are stitched together from their cached runs; only the last
+    one (the current week, up to `today`) is walked day by day. The current
+    streak still counts if the user hasn't studied yet today.
+    """
+    carry = np.zeros(width, dtype=np.int32)
+    longest = np.zeros(width, dtype=np.int32)
+    for agg in weeks[:-1]:
+        if agg is None:
+            carry[:] = 0
+            continue
+        prefix, suffix, best = (_pad(a, width) for a in agg["runs"])
+        longest = np.maximum(longest, np.maximum(best, carry + prefix))
+        carry = np.where(prefix == 7, carry + 7, suffix)
+    days = weeks[-1]["days"] if weeks and weeks[-1] is not None else np.zeros((7, 0), dtype=bool)
+    before_today = carry
+    for day in range(today + 1):
+        before_today = carry
+        carry = np.where(_pad(days[day], width), carry + 1, 0)
+        longest = np.maximum(longest, carry)
+    return np.where(carry > 0, carry, before_today), longest
+
+
+def _pad(values, width):
+    if len(values) >= width:
+        return values[:width]
+    return np.concatenate([values, np.zeros(width - len(values), dtype=values.dtype)])
+
+
+def open_archive(path):
+    """Archive for HISTORY_DIR; an empty path disables history."""
+    if not path:
+        return None
+    return HistoryArchive(path)
@@ -0,0 +1,157 @@
+"""Interval index: which [start, end) intervals overlap a given range, without a full scan."""
+import random
+
+_NEG_INF = float("-inf")
+
+
+class _Node:
+    __slots__ = ("key", "start", "end", "value", "priority", "left", "right", "max_end")
+
+    def __init__(self, key, start, end, value):
+        self.key = key
+        self.start = start
+        self.end = end
+        self.value = value
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+
+class IntervalTree:
+    """Half-open intervals [start, end), each under a unique key, with an optional value.
+
+    A treap ordered by (start, key) where every node also records the largest
+    end in its subtree, so a query skips any subtree that ends before the
+    range starts and stops descending right once starts pass the range's end.
+    add/remove are O(log n) expected; overlapping() costs O(log n) plus the
+    matches it returns. Keys must be mutually comparable (e.g. all str).
+    """
+
+    def __init__(self):
+        self._root = None
+        self._nodes = {}
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, key):
+        return key in self._nodes
+
+    def add(self, key, start, end, value=None):
+        """Insert or replace the interval stored under key."""
+        if key in self._nodes:
+            self.remove(key)
+        node = _Node(key, start, end, value)
+        self._nodes[key] = node
+        self._root = _insert(self._root, node)
+
+    def remove(self, key):
+        """Remove key's interval and return its value (None if absent)."""
+        node = self._nodes.pop(key, None)
+        if node is None:
+            return None
+        self._root = _delete(self._root, node.start, key)
+        return node.value
+
+    def overlapping(self, start, end):
+        """Return [(key, start, end, value)] for intervals overlapping [start, end), ordered by start."""
+        found = []
+        _collect(self._root, start, end, found)
+        return found
+
+    def overlaps(self, start, end):
+        """True if any stored interval overlaps [start, end)."""
+        node = self._root
+        while node is not None:
+            if node.max_end <= start:
+                return False
+            if node.left is not None and node.left.max_end > start:
+                # Everything in the left subtree starts no later than node; if one overlaps we're done,
+                # and if none can (they all end too early) only node and the right subtree remain.
+                node = node.left
+                continue
+            if node.start >= end:
+                return False
+            if node.end > start:
+                return True
+            node = node.right
+        return False
+
+
+def _update(node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+
+def _rotate_right(node):
+    left = node.left
+    node.left = left.right
+    _update(node)
+    left.right = node
+    _update(left)
+    return left
+
+
+def _rotate_left(node):
+    right = node.right
+    node.right = right.left
+    _update(node)
+    right.left = node
+    _update(right)
+    return right
+
+
+def _insert(node, new):
+    if node is None:
+        return new
+    if (new.start, new.key) < (node.start, node.key):
+        node.left = _insert(node.left, new)
+        if node.left.priority > node.priority:
+            return _rotate_right(node)
+    else:
+        node.right = _insert(node.right, new)
+        if node.right.priority > node.priority:
+            return _rotate_left(node)
+    _update(node)
+    return node
+
+
+def _delete(node, start, key):
+    if node is None:
+        return None
+    if (start, key) < (node.start, node.key):
+        node.left = _delete(node.left, start, key)
+    elif (start, key) > (node.start, node.key):
+        node.right = _delete(node.right, start, key)
+    else:
+        return _merge(node.left, node.right)
+    _update(node)
+    return node
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _collect(node, start, end, found):
+    if node is None or node.max_end <= start:
+        return
+    _collect(node.left, start, end, found)
+    if node.start < end:
+        if node.end > start:
+            found.append((node.key, node.start, node.end, node.value))
+        _collect(node.right, start, end, found)
@@ -0,0 +1,174 @@
+"""`/study list`: who is studying where, rendered from per-location cached sections."""
+import re
+import threading
+
+from features import tracing
+from features.board import location_section
+from features.clock import LABELS, TIMEZONE, TO_24, clock_for
+
+# "2-4pm", "2pm to 4pm", "between 14:00 and 16:00", at the end of the query
+_TIME_RANGE_RE = re.compile(
+    r"(?:\bbetween\s+)?(\d{1,2})(?::(\d{2}))?\s*([ap])?\.?m?\.?\s*(?:-|–|\bto\b|\band\b)\s*"
+    r"(\d{1,2})(?::(\d{2}))?\s*([ap])?\.?m?\.?\s*$",
+    re.IGNORECASE,
+)
+
+
+class SessionListCache:
+    """Block Kit sections per location, rebuilt only after that location changes.
+
+    Register on_change with SessionStore.change_listeners. A lookup reads the
+    store's location index (O(results)) only when the location was invalidated
+    since it was last rendered; otherwise the cached section is returned as is.
+    """
+
+    def __init__(self, store, locations, render_line, max_lines=40, schedule=None, clock=None):
+        self.store = store
+        self.schedule = schedule
+        self.clock = clock or clock_for(TIMEZONE)
+        self.locations = list(locations)
+        self.render_line = render_line
+        self.max_lines = max_lines
+        self._lock = threading.Lock()
+        self._sections = {}
+        # Bumped on every change, so a render that raced with a change isn't cached
+        self._generation = {}
+
+    def on_change(self, session_id, session):
+        """SessionStore change listener: drop the cached section for the session's location."""
+        location = session.get("base_location") or session["location"]
+        with self._lock:
+            self._sections.pop(location, None)
+            self._generation[location] = self._generation.get(location, 0) + 1
+
+    def section(self, location):
+        """Return (count, block) for a location, or None if nobody is studying there."""
+        with self._lock:
+            if location in self._sections:
+                return self._sections[location]
+            generation = self._generation.get(location, 0)
+        section = location_section(location, [s for _, s in self.store.in_location(location)], self.render_line, self.max_lines)
+        with self._lock:
+            if self._generation.get(location, 0) == generation:
+                self._sections[location] = section
+        return section
+
+    def match_location(self, query):
+        """Resolve free text like "langson" to a location name, or None."""
+        query = query.strip().lower()
+        if not query:
+            return None
+        for location in self.locations:
+            if location.lower() == query:
+                return location
+        for location in self.locations:
+            if location.lower().startswith(query):
+                return location
+        for location in self.locations:
+            if query in location.lower():
+                return location
+        return None
+
+    @tracing.traced("store.list")
+    def response(self, query="", now=None):
+        """Return (text, blocks) answering `/study list [location] [time range]`.
+
+        A time range (e.g. "langson 2-4pm", in the clock's timezone) lists
+        upcoming and active sessions overlapping it, straight from the
+        schedule's interval index (uncached), or from a scan of the store's
+        location index when there is no schedule (a shared store, where every
+        session is in the store from submit). `now` is a timestamp.
+        """
+        query, time_range = parse_time_range(query, self.clock, now)
+        if time_range is not None:
+            return self._range_response(query, time_range)
+        if query.strip():
+            location = self.match_location(query)
+            if location is None:
+                text = f"I don't know a location called \"{query.strip()}\". Try one of: " + ", ".join(self.locations)
+                return text, [{"type": "section", "text": {"type": "mrkdwn", "text": text}}]
+            sections = [self.section(location)]
+            empty_text = f"Nobody is studying at *{location}* right now."
+        else:
+            sections = [self.section(location) for location in self.locations]
+            empty_text = "Nobody is studying right now. Use `/study` to share where you are."
+        blocks = [block for _, block in filter(None, sections)]
+        total = sum(count for count, _ in filter(None, sections))
+        if not blocks:
+            return empty_text, [{"type": "section", "text": {"type": "mrkdwn", "text": empty_text}}]
+        return f"{total} studying now", blocks
+
+    def _range_response(self, query, time_range):
+        start, end, label = time_range
+        location = self.match_location(query) if query.strip() else None
+        if query.strip() and location is None:
+            return self.response(query)
+        if self.schedule is not None:
+            matches = self.schedule.overlapping(start, end, location)
+        else:
+            matches = self._store_overlapping(start, end, location)
+        by_location = {}
+        for _, session in matches:
+            key = session.get("base_location") or session["location"]
+            by_location.setdefault(key if key in self.locations else self.locations[-1], []).append(session)
+        sections = [
+            location_section(loc, by_location[loc], self.render_line, self.max_lines)
+            for loc in self.locations
+            if loc in by_location
+        ]
+        where = f" at *{location}*" if location else ""
+        if not sections:
+            text = f"Nobody is studying{where} {label}."
+            return text, [{"type": "section", "text": {"type": "mrkdwn", "text": text}}]
+        total = sum(count for count, _ in sections)
+        return f"{total} studying{where} {label}", [block for _, block in sections]
+
+    def _store_overlapping(self, start, end, location):
+        """Like SessionSchedule.overlapping, from the store alone: O(sessions at the location(s))."""
+        locations = [location] if location is not None else self.store.locations()
+        found = [
+            (sid, session)
+            for loc in locations
+            for sid, session in self.store.in_location(loc)
+            if (session.get("start_ts") or 0) < end and session["end_ts"] > start
+        ]
+        return sorted(found, key=lambda match: match[1].get("start_ts") or 0)
+
+
+def parse_time_range(query, clock, now=None):
+    """Split a trailing time range off a list query: (rest, (start_ts, end_ts, label)) or (query, None).
+
+    Hours without am/pm are 24-hour, unless only the end has one ("2-4pm"),
+    in which case the start shares it (or takes the other half, as in "11-1pm").
+    The range is today on `clock` (a features.clock.LocalClock; tomorrow if
+    it's already over at timestamp `now`), ending the next day if it wraps
+    past midnight.
+    """
+    match = _TIME_RANGE_RE.search(query or "")
+    if match is None:
+        return query, None
+    start_h, start_m, start_ap, end_h, end_m, end_ap = match.groups()
+    start_h, end_h = int(start_h), int(end_h)
+    start_m, end_m = int(start_m or 0), int(end_m or 0)
+    if start_m > 59 or end_m > 59:
+        return query, None
+    end_24 = _to_24(end_h, end_ap)
+    if end_24 is None:
+        return query, None
+    if start_ap is None and end_ap is not None:
+        start_24 = _to_24(start_h, end_ap)
+        if start_24 is not None and (start_24, start_m) >= (end_24, end_m):
+            start_24 = _to_24(start_h, "p" if end_ap.lower() == "a" else "a")
+    else:
+        start_24 = _to_24(start_h, start_ap)
+    if start_24 is None:
+        return query, None
+    start, end = start_24 * 60 + start_m, end_24 * 60 + end_m
+    label = f"between {LABELS[start]} and {LABELS[end]}"
+    return query[: match.start()].strip(), clock.window(start, end, now) + (label,)
+
+
+def _to_24(hour, ampm):
+    if ampm is None:
+        return hour if 0 <= hour <= 23 else None
+    return TO_24.get((hour, "AM" if ampm.lower() == "a" else "PM"))
@@ -0,0 +1,261 @@
+"""Prometheus-style metrics: listener latency, Web API call timings, session gauges.
+
+Enabled by setting METRICS_PORT; metrics are then served in Prometheus text
+format on http://127.0.0.1:<port>/metrics. When disabled, timed() returns the
+listener unchanged and the other recorders return after one flag check.
+"""
+import asyncio
+import bisect
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+enabled = bool(os.environ.get("METRICS_PORT"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a single label value."""
+
+    def __init__(self, name, help, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for label_value, (counts, total, count) in sorted(snapshot.items()):
+            label = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for label_values, value in snapshot:
+            label = ",".join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{label}}} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time, or set explicitly.
+
+    With a label, `read()` returns {label value: value}, one series each.
+    """
+
+    def __init__(self, name, help, read=None, label=None):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label = label
+        self.value = {} if label else 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        value = self.value
+        if self.read is not None:
+            try:
+                value = self.read()
+            except Exception:
+                logger.exception("Failed to read gauge %s", self.name)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if self.label is None:
+            return lines + [f"{self.name} {value}"]
+        return lines + [f'{self.name}{{{self.label}="{k}"}} {v}' for k, v in sorted(value.items())]
+
+
+listener_duration = Histogram(
+    "ctc_listener_duration_seconds", "Time spent in each Bolt listener, including Web API calls.", "listener"
+)
+api_duration = Histogram("ctc_slack_api_duration_seconds", "Slack Web API call latency by method.", "method")
+api_errors = Counter("ctc_slack_api_errors_total", "Failed Slack Web API calls by method and error.", ("method", "error"))
+dedupe_checks = Counter(
+    "ctc_dedupe_requests_total", "Requests checked for redelivery; result is hit (dropped) or miss.", ("kind", "result")
+)
+welcomes = Counter(
+    "ctc_welcomes_total", "member_joined_channel welcomes: sent, failed, skipped (already welcomed) or dropped (queue full).", ("result",)
+)
+outbox_dropped = Counter(
+    "ctc_outbox_dropped_total", "Side-effect Web API calls dropped because their outbox queue stayed full.", ("call",)
+)
+expiry_lag = Gauge("ctc_expiry_lag_seconds", "How long after end_ts the most recent expiry batch ran.")
+_gauges = {"ctc_expiry_lag_seconds": expiry_lag}
+
+
+def gauge(name, help, read, label=None):
+    """Register a gauge whose value is read from `read()` at scrape time (a dict by label value, with a label)."""
+    _gauges[name] = Gauge(name, help, read, label)
+
+
+def watch_rate_limits(client):
+    """Export a rate-limited client's rate_limit_stats(): per bucket, calls waiting now and throttled or timed out so far."""
+
+    def per_bucket(field):
+        return lambda: {name: counts[field] for name, counts in client.rate_limit_stats()["buckets"].items()}
+
+    gauge("ctc_rate_limit_waiting", "Web API calls waiting for their method's rate-limit budget.", per_bucket("waiting"), "bucket")
+    gauge("ctc_rate_limit_throttled", "Web API calls that had to wait for their budget, since start.", per_bucket("throttled"), "bucket")
+    gauge(
+        "ctc_rate_limit_timed_out",
+        "Web API calls that gave up waiting for their budget (MAX_WAIT_SECONDS), since start.",
+        per_bucket("timed_out"),
+        "bucket",
+    )
+    gauge("ctc_rate_limited", "429 responses from Slack, since start.", lambda: client.rate_limit_stats()["rate_limited"])
+
+
+def timed(listener_name):
+    """Decorator recording a listener's run time; a no-op when metrics are disabled."""
+
+    def decorator(fn):
+        if not enabled:
+            return fn
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    listener_duration.observe(listener_name, time.perf_counter() - start)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                listener_duration.observe(listener_name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def error_label(error):
+    """Short label for a failed Web API call: the Slack error code, or the exception type."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return response.get("error") or str(response.status_code)
+        except Exception:
+            pass
+    return type(error).__name__
+
+
+def observe_api_call(method, seconds, error=None):
+    if not enabled:
+        return
+    api_duration.observe(method, seconds)
+    if error is not None:
+        api_errors.inc(method, error)
+
+
+def observe_dedupe(kind, duplicate):
+    if enabled:
+        dedupe_checks.inc(kind, "hit" if duplicate else "miss")
+
+
+def observe_welcome(result):
+    if enabled:
+        welcomes.inc(result)
+
+
+def observe_outbox_drop(call):
+    if enabled:
+        outbox_dropped.inc(call)
+
+
+def observe_expiry(expired, now):
+    """Record how late a batch of [(session_id, session)] was expired."""
+    if enabled and expired:
+        expiry_lag.set(max(now - s["end_ts"] for _, s in expired))
+
+
+def render():
+    lines = listener_duration.render() + api_duration.render() + api_errors.render() + dedupe_checks.render() + welcomes.render()
+    lines += outbox_dropped.render()
+    for g in list(_gauges.values()):
+        lines.extend(g.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def serve():
+    """Start the /metrics endpoint on METRICS_PORT (localhost) if metrics are enabled."""
+    global _server
+    if not enabled or _server is not None:
+        return None
+    port = int(os.environ["METRICS_PORT"])
+    host = os.environ.get("METRICS_HOST", "127.0.0.1")
+    _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%d/metrics", host, port)
+    return _server
@@ -0,0 +1,207 @@
+"""Background dispatcher for side-effect Slack Web API calls (pins, ephemerals, message edits)."""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+
+from slack_sdk.errors import SlackApiError
+
+from features import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+# Slack error codes that will never succeed on retry
+_PERMANENT_ERRORS = {
+    "already_pinned",
+    "no_pin",
+    "message_not_found",
+    "channel_not_found",
+    "not_in_channel",
+    "is_archived",
+    "user_not_in_channel",
+    "cant_update_message",
+    "invalid_auth",
+    "not_authed",
+    "missing_scope",
+}
+
+
+def _retry_delay(error, attempt, base_delay, max_delay, repeatable=True):
+    """Seconds to wait before retrying, or None if the error is permanent.
+
+    A call that isn't `repeatable` (a post that may have gone through before
+    a timeout or 5xx) is only retried on 429, which Slack answers without
+    doing anything.
+    """
+    if isinstance(error, SlackApiError):
+        response = error.response
+        if response.status_code == 429:
+            return float(response.headers.get("Retry-After", base_delay))
+        if response.status_code < 500 and response.get("error") in _PERMANENT_ERRORS:
+            return None
+    if not repeatable:
+        return None
+    return min(max_delay, base_delay * (2 ** attempt))
+
+
+class Outbox:
+    """Bounded worker pool for Web API calls that handlers don't need to wait on.
+
+    Calls with the same key (e.g. a message ts) always land on the same worker,
+    so they run in submission order. Failed calls are retried with exponential
+    backoff (or Retry-After on 429) and logged once retries run out. Calls
+    submitted before start() wait in the queue. submit() never runs a call
+    itself: when a worker's queue stays full for `put_timeout` seconds the
+    call is dropped, logged and counted, so a listener never sleeps through
+    another call's backoff.
+    """
+
+    def __init__(self, workers=4, max_pending=1000, max_retries=5, base_delay=0.5, max_delay=30.0, put_timeout=0.1):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.put_timeout = put_timeout
+        self.dropped = 0
+        per_worker = max(1, max_pending // workers)
+        self._queues = [queue.Queue(maxsize=per_worker) for _ in range(workers)]
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for i, q in enumerate(self._queues):
+                t = threading.Thread(target=self._worker, args=(q,), name=f"outbox-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def pending(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) behind any earlier calls with the same key.
+
+        Inside a trace, the call runs in the submitter's context so its spans join that trace.
+        """
+        self._put(key, (fn, args, kwargs, tracing.current_context(), True))
+
+    def submit_once(self, key, fn, *args, **kwargs):
+        """Like submit(), for calls that mustn't run twice (chat.postMessage): retried only on 429."""
+        self._put(key, (fn, args, kwargs, tracing.current_context(), False))
+
+    def _put(self, key, job):
+        fn = job[0]
+        q = self._queues[zlib.crc32(str(key).encode()) % self.workers]
+        try:
+            q.put(job, timeout=self.put_timeout)
+        except queue.Full:
+            name = getattr(fn, "__name__", str(fn))
+            self.dropped += 1
+            metrics.observe_outbox_drop(name)
+            logger.error("Outbox queue full for %.1fs; dropped %s", self.put_timeout, name)
+
+    def join(self):
+        """Block until every queued call has finished (used by tests and shutdown); needs start()."""
+        for q in self._queues:
+            q.join()
+
+    def _worker(self, q):
+        while True:
+            job = q.get()
+            try:
+                self._run(job)
+            finally:
+                q.task_done()
+
+    def _run(self, job):
+        fn, args, kwargs, context, repeatable = job
+        attempt = 0
+        while True:
+            try:
+                if context is not None:
+                    return context.run(fn, *args, **kwargs)
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = _retry_delay(e, attempt, self.base_delay, self.max_delay, repeatable)
+                if delay is None or attempt >= self.max_retries:
+                    logger.error("Slack call %s failed after %d attempt(s): %s", getattr(fn, "__name__", fn), attempt + 1, e)
+                    return None
+                attempt += 1
+                time.sleep(delay)
+
+
+class AsyncOutbox:
+    """asyncio counterpart of Outbox for AsyncWebClient calls.
+
+    Each submitted coroutine function runs as a task on the running loop
+    (in the submitter's context, so traces carry over), after the earlier
+    calls with the same key, retried with the same backoff and logged once
+    retries run out.
+    """
+
+    def __init__(self, max_retries=5, base_delay=0.5, max_delay=30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # key -> the last task submitted with it; also keeps every task referenced until it's done
+        self._tails = {}
+        self._tasks = set()
+
+    def pending(self):
+        return len(self._tasks)
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Schedule `await fn(*args, **kwargs)` behind any earlier calls with the same key; return its task."""
+        return self._schedule(key, fn, args, kwargs, True)
+
+    def submit_once(self, key, fn, *args, **kwargs):
+        """Like submit(), for calls that mustn't run twice (chat.postMessage): retried only on 429."""
+        return self._schedule(key, fn, args, kwargs, False)
+
+    def _schedule(self, key, fn, args, kwargs, repeatable):
+        task = asyncio.get_running_loop().create_task(self._run(self._tails.get(key), fn, args, kwargs, repeatable))
+        self._tails[key] = task
+        self._tasks.add(task)
+
+        def done(task):
+            self._tasks.discard(task)
+            if self._tails.get(key) is task:
+                del self._tails[key]
+
+        task.add_done_callback(done)
+        return task
+
+    async def join(self):
+        """Wait until every submitted call has finished (used by tests and shutdown)."""
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    async def _run(self, previous, fn, args, kwargs, repeatable):
+        if previous is not None:
+            # Its own failure has been logged already; only the order matters here
+            await asyncio.wait([previous])
+        attempt = 0
+        while True:
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                delay = _retry_delay(e, attempt, self.base_delay, self.max_delay, repeatable)
+                if delay is None or attempt >= self.max_retries:
+                    logger.error("Slack call %s failed after %d attempt(s): %s", getattr(fn, "__name__", fn), attempt + 1, e)
+                    return None
+                attempt += 1
+                await asyncio.sleep(delay)
+
+
+outbox = Outbox(
+    workers=int(os.environ.get("OUTBOX_WORKERS", "4")),
+    max_pending=int(os.environ.get("OUTBOX_MAX_PENDING", "1000")),
+    max_retries=int(os.environ.get("OUTBOX_MAX_RETRIES", "5")),
+)
+# ASYNC_MODE's outbox (features.study_async)
+async_outbox = AsyncOutbox(max_retries=int(os.environ.get("OUTBOX_MAX_RETRIES", "5")))
@@ -0,0 +1,226 @@
+"""Durable session storage: a pluggable backend plus a write-behind batching worker."""
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class SessionBackend:
+    """Interface for durable session storage. Sessions are JSON-serializable dicts."""
+
+    def load(self, now):
+        """Return (active, expired): lists of (session_id, session) split at `now`.
+
+        Expired rows stay stored until the caller deletes them with write_batch,
+        e.g. once their announcements have been unpinned.
+        """
+        raise NotImplementedError
+
+    def write_batch(self, upserts, deletes):
+        """Apply {session_id: session} upserts and a set of session_id deletes atomically."""
+        raise NotImplementedError
+
+    def get_meta(self, key):
+        """Return a small string value saved with set_meta, or None."""
+        return None
+
+    def set_meta(self, key, value):
+        pass
+
+    def close(self):
+        pass
+
+
+# Session fields stored as columns; anything else goes into the `extra` JSON column
+SESSION_COLUMNS = (
+    "user_id",
+    "user_name",
+    "location",
+    "base_location",
+    "end_ts",
+    "image_url",
+    "channel_id",
+    "message_ts",
+    "message_text",
+    "start_ts",
+)
+
+# Columns added after the first release, with their types, for databases created before them
+_ADDED_COLUMNS = {"start_ts": "REAL"}
+
+
+_UPSERT_SQL = (
+    f"INSERT OR REPLACE INTO sessions (session_id, {', '.join(SESSION_COLUMNS)}, extra)"
+    f" VALUES ({', '.join('?' * (len(SESSION_COLUMNS) + 2))})"
+)
+
+
+def connect(path):
+    """Open the session database in WAL mode, creating the schema if needed.
+
+    Safe for several processes at once: writers wait up to 5s for the file lock.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        " session_id TEXT PRIMARY KEY,"
+        " user_id TEXT NOT NULL,"
+        " user_name TEXT,"
+        " location TEXT NOT NULL,"
+        " base_location TEXT,"
+        " end_ts REAL NOT NULL,"
+        " image_url TEXT,"
+        " channel_id TEXT,"
+        " message_ts TEXT,"
+        " message_text TEXT,"
+        " start_ts REAL,"
+        " extra TEXT)"
+    )
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+    for column, column_type in _ADDED_COLUMNS.items():
+        if column not in existing:
+            try:
+                conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} {column_type}")
+            except sqlite3.OperationalError:
+                pass  # another process sharing the file added it first
+    conn.execute("CREATE INDEX IF NOT EXISTS sessions_end_ts ON sessions (end_ts)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """SQLite in WAL mode, one row per session, indexed on end_ts."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        columns = ", ".join(SESSION_COLUMNS)
+        self._select_sql = f"SELECT session_id, {columns}, extra FROM sessions WHERE end_ts {{}} ?"
+
+    def load(self, now):
+        with self._lock:
+            active = [_row_to_session(row) for row in self._conn.execute(self._select_sql.format(">="), (now,))]
+            expired = [_row_to_session(row) for row in self._conn.execute(self._select_sql.format("<"), (now,))]
+        return active, expired
+
+    def write_batch(self, upserts, deletes):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if deletes:
+                    self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(sid,) for sid in deletes])
+                if upserts:
+                    self._conn.executemany(_UPSERT_SQL, [_session_to_row(sid, s) for sid, s in upserts.items()])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _session_to_row(session_id, session):
+    extra = {k: v for k, v in session.items() if k not in SESSION_COLUMNS}
+    return (session_id, *(session.get(k) for k in SESSION_COLUMNS), json.dumps(extra) if extra else None)
+
+
+def _row_to_session(row):
+    session = dict(zip(SESSION_COLUMNS, row[1:-1]))
+    if row[-1]:
+        session.update(json.loads(row[-1]))
+    return row[0], session
+
+
+class WriteBehind:
+    """Coalesces session mutations in memory and flushes them to a backend in batches.
+
+    A background thread flushes every `interval` seconds, or sooner once
+    `batch_size` changes are pending. Repeated writes to one session collapse
+    into its latest state. Pending changes are flushed at interpreter exit.
+    """
+
+    def __init__(self, backend, interval=1.0, batch_size=500):
+        self.backend = backend
+        self.interval = interval
+        self.batch_size = batch_size
+        self._upserts = {}
+        self._deletes = set()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="session-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def upsert(self, session_id, session):
+        with self._cond:
+            self._deletes.discard(session_id)
+            self._upserts[session_id] = dict(session)
+            self._maybe_wake()
+
+    def delete(self, session_id):
+        with self._cond:
+            self._upserts.pop(session_id, None)
+            self._deletes.add(session_id)
+            self._maybe_wake()
+
+    def pending(self):
+        with self._cond:
+            return len(self._upserts) + len(self._deletes)
+
+    def flush(self):
+        """Write everything pending now, on the calling thread."""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._cond:
+            upserts, self._upserts = self._upserts, {}
+            deletes, self._deletes = self._deletes, set()
+        if not upserts and not deletes:
+            return
+        try:
+            self.backend.write_batch(upserts, deletes)
+        except Exception:
+            logger.exception("Session flush failed; will retry %d change(s)", len(upserts) + len(deletes))
+            with self._cond:
+                # Anything written since the swap is newer, so only restore what's still untouched
+                for sid, s in upserts.items():
+                    if sid not in self._upserts and sid not in self._deletes:
+                        self._upserts[sid] = s
+                for sid in deletes:
+                    if sid not in self._upserts:
+                        self._deletes.add(sid)
+
+    def _maybe_wake(self):
+        if len(self._upserts) + len(self._deletes) >= self.batch_size:
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait(self.interval)
+            self.flush()
+
+
+def open_backend(path):
+    """Backend for SESSION_DB_PATH; an empty path disables persistence."""
+    if not path:
+        return None
+    return SQLiteSessionBackend(path)
@@ -0,0 +1,162 @@
+"""Keep-alive connection pooling for the Web API client, and warm startup.
+
+slack_sdk's WebClient opens a new connection (and TLS handshake) per call
+through urllib, and AsyncWebClient opens a new aiohttp session per call
+unless it's given one. PooledWebClient keeps idle HTTP/1.1 connections to
+the API host for reuse; pooled_session() is the aiohttp equivalent.
+warm_up()/warm_up_async() validate the token with auth.test and open the
+pool's connections before the Socket Mode connection starts taking events.
+"""
+import asyncio
+import http.client
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+import aiohttp
+from slack_sdk import WebClient
+
+logger = logging.getLogger(__name__)
+
+# Idle connections kept per client (0 disables pooling: one connection per call, as slack_sdk does)
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "8"))
+# Drop connections idle longer than this rather than risk the server having closed them
+IDLE_TIMEOUT = 50.0
+
+# Errors that mean a reused keep-alive connection was closed under us; retried once on a fresh one
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class ConnectionPool:
+    """Idle keep-alive connections to one scheme://host:port, most recently used first."""
+
+    def __init__(self, url, max_idle=HTTP_POOL_SIZE, timeout=30, ssl_context=None):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def matches(self, url):
+        parts = urlsplit(url)
+        return (parts.scheme, parts.hostname, parts.port) == (self.scheme, self.host, self.port)
+
+    def idle(self):
+        with self._lock:
+            return len(self._idle)
+
+    def request(self, method, path, body, headers):
+        """Send one request; return (status, reason, headers, body bytes)."""
+        conn, reused = self._acquire()
+        try:
+            response = self._send(conn, method, path, body, headers)
+        except _STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            conn, reused = self._new_connection(), False
+            response = self._send(conn, method, path, body, headers)
+        except Exception:
+            conn.close()
+            raise
+        status, reason, response_headers, data, will_close = response
+        if will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return status, reason, response_headers, data
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _, conn in idle:
+            conn.close()
+
+    def _send(self, conn, method, path, body, headers):
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, response.reason, response.msg, data, response.will_close
+
+    def _acquire(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                last_used, conn = self._idle.pop()
+                if now - last_used < IDLE_TIMEOUT:
+                    return conn, True
+                conn.close()
+        return self._new_connection(), False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((time.monotonic(), conn))
+                return
+        conn.close()
+
+    def _new_connection(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+
+class PooledWebClient(WebClient):
+    """WebClient sending every call over a shared pool of keep-alive connections.
+
+    Only the transport changes: requests are built, retried and parsed by
+    slack_sdk as usual. With a proxy, or pool_size=0, it falls back to urllib.
+    """
+
+    def __init__(self, *args, pool_size=HTTP_POOL_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = ConnectionPool(self.base_url, pool_size, self.timeout, self.ssl) if pool_size > 0 else None
+
+    def _perform_urllib_http_request_internal(self, url, req):
+        if self.pool is None or self.proxy is not None or not self.pool.matches(url):
+            return super()._perform_urllib_http_request_internal(url, req)
+        status, reason, headers, data = self.pool.request(req.get_method(), req.selector, req.data, dict(req.header_items()))
+        if status >= 400:
+            # slack_sdk turns HTTPError into its response (and 429 retries), exactly as with urllib
+            raise HTTPError(url, status, reason, headers, io.BytesIO(data))
+        if headers.get_content_type() == "application/gzip":
+            return {"status": status, "headers": headers, "body": data}
+        return {"status": status, "headers": headers, "body": data.decode(headers.get_content_charset() or "utf-8")}
+
+
+def warm_up(client, connections=HTTP_POOL_SIZE):
+    """Check the bot token and fill the client's pool: `connections` concurrent auth.test calls.
+
+    Each call holds its own connection, so they all end up idle in the pool
+    with their handshakes done (tier 4, so a handful is well within budget).
+    Raises SlackApiError on a bad token.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(connections, 1)) as executor:
+        results = list(executor.map(lambda _: client.auth_test(), range(max(connections, 1))))
+    logger.info("Authenticated as %s on %s", results[0].get("user"), results[0].get("team"))
+    logger.info("Warmed %d connections in %.0f ms", len(results), (time.perf_counter() - start) * 1000)
+    return results[0]
+
+
+def pooled_session():
+    """aiohttp session reusing keep-alive connections, for AsyncWebClient.session; create it on the running loop."""
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(keepalive_timeout=IDLE_TIMEOUT))
+
+
+async def warm_up_async(client, connections=HTTP_POOL_SIZE):
+    """warm_up for an AsyncWebClient whose session is a pooled_session()."""
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client.auth_test() for _ in range(max(connections, 1))))
+    logger.info("Authenticated as %s on %s", results[0].get("user"), results[0].get("team"))
+    logger.info("Warmed %d connections in %.0f ms", len(results), (time.perf_counter() - start) * 1000)
+    return results[0]
@@ -0,0 +1,121 @@
+"""Low-overhead sampling profiler writing collapsed stacks for flamegraphs.
+
+Enabled by setting PROFILE_DIR. A daemon thread snapshots every thread's
+Python stack (sys._current_frames) each PROFILE_INTERVAL seconds and counts
+identical stacks; every PROFILE_DUMP_INTERVAL seconds the counts are
+written to PROFILE_DIR/stacks-<time>.folded, one "thread;outer;...;inner count"
+line per stack, ready for flamegraph.pl or speedscope. Threads parked in a
+queue, condition or selector wait (idle workers, an idle event loop) are
+left out, so the graph shows where listener and worker time actually goes.
+"""
+import atexit
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.01"))
+PROFILE_DUMP_INTERVAL = float(os.environ.get("PROFILE_DUMP_INTERVAL", "60"))
+
+# Innermost frames that mean the thread is waiting for work, not doing it
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("socketserver.py", "serve_forever"),
+}
+_THREAD_NUMBER_RE = re.compile(r"\d+")
+
+
+class SamplingProfiler:
+    """Counts sampled stacks per thread-name family; dump() writes and resets them."""
+
+    def __init__(self, directory, interval=PROFILE_INTERVAL, dump_interval=PROFILE_DUMP_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.dump_interval = dump_interval
+        self.samples = 0
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._labels = {}
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            logger.info("Sampling stacks every %.0f ms into %s", self.interval * 1000, self.directory)
+
+    def sample(self):
+        """Record the current stack of every busy thread but this one."""
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(self._label(frame.f_code))
+                frame = frame.f_back
+            # ThreadPoolExecutor-0_3 and outbox-2 fold into one root each
+            frames.append(_THREAD_NUMBER_RE.sub("N", names.get(ident, "thread")))
+            stacks.append(";".join(reversed(frames)))
+        with self._lock:
+            self._stacks.update(stacks)
+            self.samples += 1
+
+    def dump(self, now=None):
+        """Write the stacks counted since the last dump; return the file path, or None if there were none."""
+        with self._lock:
+            stacks, self._stacks = self._stacks, Counter()
+        if not stacks:
+            return None
+        now = time.time() if now is None else now
+        path = os.path.join(self.directory, time.strftime("stacks-%Y%m%d-%H%M%S.folded", time.localtime(now)))
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        return path
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _run(self):
+        next_dump = time.monotonic() + self.dump_interval
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sample()
+                if time.monotonic() >= next_dump:
+                    next_dump = time.monotonic() + self.dump_interval
+                    self.dump()
+            except Exception:
+                logger.exception("Profiler sample failed")
+
+
+_profiler = None
+
+
+def start():
+    """Start sampling into PROFILE_DIR if it's set; returns the profiler, or None."""
+    global _profiler
+    if not PROFILE_DIR:
+        return None
+    if _profiler is None:
+        _profiler = SamplingProfiler(PROFILE_DIR)
+        _profiler.start()
+        atexit.register(_profiler.dump)
+    return _profiler
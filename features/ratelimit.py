@@ -0,0 +1,272 @@
+"""Web API clients (sync and async) that pace each method at its Slack rate-limit tier and honor Retry-After on 429."""
+import asyncio
+import logging
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError, SlackClientError
+from slack_sdk.web.async_client import AsyncWebClient
+
+from features import metrics, tracing
+from features.pool import PooledWebClient
+
+logger = logging.getLogger(__name__)
+
+# Requests per minute for each tier (https://api.slack.com/apis/rate-limits)
+TIER_LIMITS = {
+    "tier1": 1,
+    "tier2": 20,
+    "tier3": 50,
+    "tier4": 100,
+    # chat.postMessage is "1 per second per channel" with short bursts allowed
+    "post": 60,
+}
+
+METHOD_TIERS = {
+    "auth.test": "tier4",
+    "views.open": "tier4",
+    "chat.postEphemeral": "tier4",
+    "chat.postMessage": "post",
+    "chat.update": "tier3",
+    "conversations.open": "tier3",
+    "conversations.history": "tier3",
+    "pins.add": "tier2",
+    "pins.remove": "tier2",
+    "pins.list": "tier2",
+}
+DEFAULT_TIER = "tier3"
+
+# Longest a method may wait for its budget before failing instead; views.open's trigger_id expires after 3 seconds
+MAX_WAIT_SECONDS = {
+    "views.open": 2.0,
+}
+
+
+class RateLimitWaitTimeout(SlackClientError):
+    """A call would have waited longer than MAX_WAIT_SECONDS for its method's budget."""
+
+
+class TokenBucket:
+    """Token bucket refilled at rate_per_minute, holding up to one minute's budget.
+
+    acquire() sleeps the calling thread for a token; acquire_async() awaits one on the event loop.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiting = 0
+        self.throttled = 0
+        self.timed_out = 0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (from a Retry-After header), then allow one probe."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.updated = self.paused_until
+            self.tokens = 1.0
+
+    def acquire(self, timeout=None):
+        """Take a token, sleeping until one is free; with a timeout, return False at once if none will be in time."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = False
+        while True:
+            delay = self._take(deadline, waited)
+            if delay is None:
+                return False
+            if delay == 0:
+                return True
+            waited = True
+            time.sleep(delay)
+
+    async def acquire_async(self, timeout=None):
+        """acquire() for the event loop: awaits the token without blocking other tasks."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        waited = False
+        while True:
+            delay = self._take(deadline, waited)
+            if delay is None:
+                return False
+            if delay == 0:
+                return True
+            waited = True
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                with self._lock:
+                    self.waiting -= 1
+                raise
+
+    def _take(self, deadline, waited):
+        """Take a token if one is free: 0 if taken, None if none will be free by `deadline`, else seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now >= self.paused_until:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    if waited:
+                        self.waiting -= 1
+                    return 0
+                delay = (1 - self.tokens) / self.rate
+            else:
+                delay = self.paused_until - now
+            if deadline is not None and now + delay > deadline:
+                if waited:
+                    self.waiting -= 1
+                self.timed_out += 1
+                return None
+            if not waited:
+                self.waiting += 1
+                self.throttled += 1
+            return delay
+
+
+class _RateLimits:
+    """Per-method token buckets and 429 handling shared by the sync and async clients."""
+
+    def __init__(self, *args, max_rate_limit_retries=3, tier_limits=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.tier_limits = dict(TIER_LIMITS, **(tier_limits or {}))
+        self.rate_limited = 0
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+    def _bucket(self, api_method, *payloads):
+        """The bucket for a call: one per method, chat.postMessage's one per channel (from the first payload naming one)."""
+        tier = METHOD_TIERS.get(api_method, DEFAULT_TIER)
+        channel = None
+        if tier == "post":
+            channel = next((payload["channel"] for payload in payloads if payload and payload.get("channel")), None)
+        key = (api_method, channel)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._buckets_lock:
+                bucket = self._buckets.setdefault(key, TokenBucket(self.tier_limits[tier]))
+        return bucket
+
+    def _wait_timeout(self, api_method, span, waited, attempt):
+        metrics.observe_api_call(api_method, 0.0, "rate_limit_wait")
+        span.set(rate_limit_wait_ms=round(waited * 1000, 3), retries=attempt)
+        return RateLimitWaitTimeout(f"{api_method} would wait more than {MAX_WAIT_SECONDS[api_method]:g}s for its rate limit")
+
+    def _retry_after(self, api_method, error, attempt):
+        """Seconds to pause the bucket before retrying a failed call, or None to raise `error`."""
+        if not isinstance(error, SlackApiError):
+            return None
+        if error.response.status_code != 429 or attempt >= self.max_rate_limit_retries:
+            return None
+        retry_after = float(error.response.headers.get("Retry-After", 1))
+        self.rate_limited += 1
+        logger.warning("Rate limited on %s; retrying in %.1fs", api_method, retry_after)
+        return retry_after
+
+    def rate_limit_stats(self):
+        """Per-bucket queue depth and throttle counts, plus total 429s seen."""
+        buckets = {}
+        for (method, channel), bucket in list(self._buckets.items()):
+            name = f"{method}:{channel}" if channel else method
+            buckets[name] = {"waiting": bucket.waiting, "throttled": bucket.throttled, "timed_out": bucket.timed_out}
+        return {"rate_limited": self.rate_limited, "buckets": buckets}
+
+
+class RateLimitedWebClient(_RateLimits, PooledWebClient):
+    """Pooled WebClient sharing per-method token buckets across every thread that uses it.
+
+    Slack enforces its limits per method and workspace, so every method gets
+    its own bucket at its tier's rate (chat.postMessage one per channel), and
+    a burst of one method never delays another. A 429 pauses the bucket for
+    Retry-After seconds and the call is retried up to max_rate_limit_retries
+    times before SlackApiError is raised. Methods in MAX_WAIT_SECONDS raise
+    RateLimitWaitTimeout rather than wait longer than that for their budget.
+    """
+
+    def api_call(self, api_method, *, params=None, json=None, data=None, **kwargs):
+        bucket = self._bucket(api_method, json, data, params)
+        max_wait = MAX_WAIT_SECONDS.get(api_method)
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        with tracing.span("slack." + api_method) as span:
+            attempt = 0
+            waited = 0.0
+            while True:
+                wait_start = time.perf_counter()
+                if not bucket.acquire(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                    raise self._wait_timeout(api_method, span, waited + time.perf_counter() - wait_start, attempt)
+                start = time.perf_counter()
+                waited += start - wait_start
+                try:
+                    response = super().api_call(api_method, params=params, json=json, data=data, **kwargs)
+                    metrics.observe_api_call(api_method, time.perf_counter() - start)
+                    # How much of the span was spent queued for the method's budget
+                    span.set(rate_limit_wait_ms=round(waited * 1000, 3), retries=attempt)
+                    return response
+                except Exception as e:
+                    metrics.observe_api_call(api_method, time.perf_counter() - start, metrics.error_label(e))
+                    retry_after = self._retry_after(api_method, e, attempt)
+                    if retry_after is None:
+                        raise
+                    attempt += 1
+                    bucket.pause(retry_after)
+
+
+class AsyncRateLimitedWebClient(_RateLimits, AsyncWebClient):
+    """RateLimitedWebClient for AsyncApp: the same buckets and 429 retries, awaited instead of slept.
+
+    Waiting for a budget suspends only the calling task, so a throttled
+    pins.add never holds up a views.open on the same loop.
+    """
+
+    async def api_call(self, api_method, *, params=None, json=None, data=None, **kwargs):
+        bucket = self._bucket(api_method, json, data, params)
+        max_wait = MAX_WAIT_SECONDS.get(api_method)
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        with tracing.span("slack." + api_method) as span:
+            attempt = 0
+            waited = 0.0
+            while True:
+                wait_start = time.perf_counter()
+                if not await bucket.acquire_async(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                    raise self._wait_timeout(api_method, span, waited + time.perf_counter() - wait_start, attempt)
+                start = time.perf_counter()
+                waited += start - wait_start
+                try:
+                    response = await super().api_call(api_method, params=params, json=json, data=data, **kwargs)
+                    metrics.observe_api_call(api_method, time.perf_counter() - start)
+                    span.set(rate_limit_wait_ms=round(waited * 1000, 3), retries=attempt)
+                    return response
+                except Exception as e:
+                    metrics.observe_api_call(api_method, time.perf_counter() - start, metrics.error_label(e))
+                    retry_after = self._retry_after(api_method, e, attempt)
+                    if retry_after is None:
+                        raise
+                    attempt += 1
+                    bucket.pause(retry_after)
+
+
+def share_app_client(app):
+    """Hand app.client to every listener instead of Bolt's fresh per-request WebClient.
+
+    Works for App and AsyncApp, so a client subclass (rate limiting, metrics)
+    applies to listener calls too. A rate-limited client's bucket counts are
+    exported as gauges (metrics.watch_rate_limits).
+    """
+    shared = app.client
+    if hasattr(shared, "rate_limit_stats"):
+        metrics.watch_rate_limits(shared)
+
+    if hasattr(app, "async_dispatch"):
+        @app.middleware
+        async def _use_shared_async_client(context, next):
+            context["client"] = shared
+            await next()
+    else:
+        @app.middleware
+        def _use_shared_client(context, next):
+            context["client"] = shared
+            next()
@@ -0,0 +1,226 @@
+"""Startup reconciliation: rebuild sessions from the bot's own announcements and clean up orphaned pins.
+
+Sessions that never reached SESSION_DB_PATH (persistence off, a lost database,
+a crash before the write-behind flush) leave their announcements pinned with
+nothing left to unpin them. reconcile() reads the channel's pins and recent
+history page by page, parses each announcement the bot posted back into a
+session, restores the ones still running (with their message_ts, so cancel
+and expiry work as usual), then strikes through and unpins the pinned ones
+that have ended. The scan is a handful of calls; the cleanup trickles out
+at a share of pins.remove's budget (20/minute), so it can't starve the
+unpins of live sessions.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from slack_sdk.errors import SlackApiError
+
+from features.channels import OTHER_LOCATION
+from features.clock import clock_for, parse_label
+from features.ratelimit import TIER_LIMITS
+
+logger = logging.getLogger(__name__)
+
+# RECONCILE_ON_START="" skips the startup pass
+RECONCILE_ON_START = os.environ.get("RECONCILE_ON_START", "1").lower() in ("1", "true", "yes")
+# How far back conversations.history is read for announcements; pins are always read in full
+RECONCILE_LOOKBACK_HOURS = float(os.environ.get("RECONCILE_LOOKBACK_HOURS", "24"))
+_HISTORY_PAGE_SIZE = 200
+# Ended pins cleaned up per batch, and the share of pins.remove's budget the cleanup may use
+_CLEANUP_BATCH_SIZE = 5
+_CLEANUP_SHARE = 0.5
+
+# What _announcement_message posts: "📍 <@U1> is studying at *Spot*[ with <@U2> ] *2:00 PM – 5:00 PM*."
+_ANNOUNCEMENT_RE = re.compile(
+    r"📍 <@(?P<user_id>[A-Z0-9]+)> is studying at \*(?P<location>.+?)\*(?P<with_suffix>.*?) "
+    r"\*(?P<start>\d{1,2}:\d{2} [AP]M) – (?P<end>\d{1,2}:\d{2} [AP]M)\*\."
+)
+
+
+def parse_announcement(text, posted_ts, tz, locations):
+    """Session for an announcement's text, or None if it isn't one (a struck-through one isn't).
+
+    Only clock times are in the text, so the start is the occurrence of its
+    time (in `tz`) nearest to when the message was posted, and the end the
+    first occurrence of its time after that.
+    """
+    match = _ANNOUNCEMENT_RE.match(text or "")
+    if match is None:
+        return None
+    clock = clock_for(tz)
+    start_minute, end_minute = parse_label(match["start"]), parse_label(match["end"])
+    posted = datetime.fromtimestamp(posted_ts, tz).date()
+    day = min(
+        (posted + timedelta(days=d) for d in (-1, 0, 1)),
+        key=lambda day: abs(clock.at(day, start_minute) - posted_ts),
+    )
+    start = clock.at(day, start_minute)
+    end = clock.at(day if end_minute > start_minute else day + timedelta(days=1), end_minute)
+    location = match["location"]
+    base_location = next((loc for loc in locations if location == loc or location.startswith(loc + " — ")), OTHER_LOCATION)
+    return {
+        "user_id": match["user_id"],
+        "user_name": match["user_id"],
+        "location": location,
+        "base_location": base_location,
+        "start_ts": start,
+        "end_ts": end,
+    }
+
+
+def _pinned_messages(response):
+    return {item["message"]["ts"]: item["message"] for item in response.get("items") or [] if item.get("message")}
+
+
+def _posted_by(message, identity):
+    return message.get("bot_id") == identity.get("bot_id") or message.get("user") == identity.get("user_id")
+
+
+def _apply(channel, messages, pinned, identity, tz, now):
+    """Restore the live announcements among `messages`; return (restored, [(ts, text)] of pinned ones that ended)."""
+    store = channel.store
+    tracked = {s.get("message_ts") for loc in store.locations() for _, s in store.in_location(loc)}
+    restored = []
+    ended = []
+    for ts, message in messages.items():
+        if ts in tracked or not _posted_by(message, identity):
+            continue
+        session = parse_announcement(message.get("text"), float(ts), tz, channel.locations)
+        if session is None:
+            continue
+        if session["end_ts"] > now:
+            session.update(channel_id=channel.channel_id, message_ts=ts, message_text=message["text"])
+            # Derived from the message, so replicas reconciling the same channel restore one session
+            session_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{channel.channel_id}/{ts}"))
+            if store.add_unless_active(session_id, session, now):
+                restored.append((session_id, session))
+        elif ts in pinned:
+            ended.append((ts, message["text"]))
+    return restored, ended
+
+
+def _should_reconcile(channel):
+    # With a shared store only the leader cleans up, or every replica would unpin the same messages
+    return bool(channel.channel_id) and (channel.lease is None or channel.lease.acquire())
+
+
+def scan(client, channel, tz, now=None):
+    """Read a StudyChannel's pins and recent history and restore its live sessions; return (restored, ended pins)."""
+    start = time.perf_counter()
+    now = time.time() if now is None else now
+    identity = client.auth_test()
+    pinned = _pinned_messages(client.pins_list(channel=channel.channel_id))
+    messages = dict(pinned)
+    cursor = None
+    while True:
+        page = client.conversations_history(
+            channel=channel.channel_id,
+            oldest=str(now - RECONCILE_LOOKBACK_HOURS * 3600),
+            limit=_HISTORY_PAGE_SIZE,
+            cursor=cursor,
+        )
+        for message in page.get("messages") or []:
+            messages.setdefault(message["ts"], message)
+        cursor = (page.get("response_metadata") or {}).get("next_cursor")
+        if not page.get("has_more") or not cursor:
+            break
+    restored, ended = _apply(channel, messages, pinned, identity, tz, now)
+    _log(channel, messages, pinned, restored, ended, start)
+    return restored, ended
+
+
+def clean_up(client, channel_id, ended, retract):
+    """Strike through and unpin [(ts, text)] ended announcements, in batches paced by _batch_pause()."""
+    pause = _batch_pause(client)
+    for i in range(0, len(ended), _CLEANUP_BATCH_SIZE):
+        if i:
+            time.sleep(pause)
+        for ts, text in ended[i:i + _CLEANUP_BATCH_SIZE]:
+            new_text, blocks = retract(text)
+            try:
+                client.chat_update(channel=channel_id, ts=ts, text=new_text, blocks=blocks)
+                client.pins_remove(channel=channel_id, timestamp=ts)
+            except SlackApiError as e:
+                logger.warning("Failed to clean up ended announcement %s: %s", ts, e.response.get("error"))
+
+
+def reconcile(client, channel, tz, retract, now=None):
+    """scan() a StudyChannel, then clean_up() its ended pins; return (restored, ended).
+
+    `retract(text)` returns the (text, blocks) an ended announcement is edited to.
+    """
+    if not _should_reconcile(channel):
+        return [], []
+    restored, ended = scan(client, channel, tz, now)
+    clean_up(client, channel.channel_id, ended, retract)
+    return restored, ended
+
+
+async def scan_async(client, channel, tz, now=None):
+    """scan() for an AsyncWebClient."""
+    start = time.perf_counter()
+    now = time.time() if now is None else now
+    identity = await client.auth_test()
+    pinned = _pinned_messages(await client.pins_list(channel=channel.channel_id))
+    messages = dict(pinned)
+    cursor = None
+    while True:
+        page = await client.conversations_history(
+            channel=channel.channel_id,
+            oldest=str(now - RECONCILE_LOOKBACK_HOURS * 3600),
+            limit=_HISTORY_PAGE_SIZE,
+            cursor=cursor,
+        )
+        for message in page.get("messages") or []:
+            messages.setdefault(message["ts"], message)
+        cursor = (page.get("response_metadata") or {}).get("next_cursor")
+        if not page.get("has_more") or not cursor:
+            break
+    restored, ended = _apply(channel, messages, pinned, identity, tz, now)
+    _log(channel, messages, pinned, restored, ended, start)
+    return restored, ended
+
+
+async def clean_up_async(client, channel_id, ended, retract):
+    """clean_up() for an AsyncWebClient; each batch's calls run concurrently."""
+
+    async def retract_one(ts, text):
+        new_text, blocks = retract(text)
+        try:
+            await client.chat_update(channel=channel_id, ts=ts, text=new_text, blocks=blocks)
+            await client.pins_remove(channel=channel_id, timestamp=ts)
+        except SlackApiError as e:
+            logger.warning("Failed to clean up ended announcement %s: %s", ts, e.response.get("error"))
+
+    pause = _batch_pause(client)
+    for i in range(0, len(ended), _CLEANUP_BATCH_SIZE):
+        if i:
+            await asyncio.sleep(pause)
+        await asyncio.gather(*(retract_one(ts, text) for ts, text in ended[i:i + _CLEANUP_BATCH_SIZE]))
+
+
+async def reconcile_async(client, channel, tz, retract, now=None):
+    """reconcile() for an AsyncWebClient."""
+    if not _should_reconcile(channel):
+        return [], []
+    restored, ended = await scan_async(client, channel, tz, now)
+    await clean_up_async(client, channel.channel_id, ended, retract)
+    return restored, ended
+
+
+def _batch_pause(client):
+    """Seconds between cleanup batches to keep within _CLEANUP_SHARE of pins.remove's budget (the client's, if it paces calls)."""
+    per_minute = getattr(client, "tier_limits", TIER_LIMITS)["tier2"] * _CLEANUP_SHARE
+    return _CLEANUP_BATCH_SIZE * 60 / per_minute
+
+
+def _log(channel, messages, pinned, restored, ended, start):
+    logger.info(
+        "Reconciled %s in %.0f ms: %d messages (%d pinned), restored %d session(s), cleaning up %d ended pin(s)",
+        channel.channel_id, (time.perf_counter() - start) * 1000, len(messages), len(pinned), len(restored), len(ended),
+    )
@@ -0,0 +1,174 @@
+"""Sessions booked ahead of time, plus an interval index over every session for overlap and range queries."""
+import heapq
+import threading
+import time
+
+from features.intervals import IntervalTree
+
+# A start this close to now (the modal prefills the current minute) counts as starting now
+START_GRACE_SECONDS = 60
+
+SCHEDULED = "scheduled"
+STARTED = "started"
+
+
+class SessionSchedule:
+    """Upcoming sessions waiting for their start_ts, on top of a SessionStore of active ones.
+
+    Keeps an IntervalTree of [start_ts, end_ts) per location and per user
+    covering both upcoming and active sessions (it follows the store through
+    change_listeners). reserve() adds a session unless it overlaps one of the
+    user's others, into the store if it starts now or the schedule otherwise.
+    pop_due() moves sessions whose start has come into the store; it and
+    next_start() are also exposed as pop_expired/next_expiry so an
+    ExpiryScheduler can drive starts exactly as it drives expiry.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.expiry_listener = None
+        self.change_listeners = []
+        # Re-entrant: reserve() and pop_due() add to the store, whose change listener lands back here
+        self._lock = threading.RLock()
+        self._sessions = {}
+        self._start_heap = []
+        self._by_location = {}
+        self._by_user = {}
+        store.change_listeners.append(self._on_store_change)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return session_id in self._sessions
+
+    def get(self, session_id):
+        return self._sessions.get(session_id)
+
+    def reserve(self, session_id, session, now=None):
+        """Store a session unless it overlaps another of the user's; return SCHEDULED, STARTED or None."""
+        now = time.time() if now is None else now
+        start = session.get("start_ts") or now
+        started = start <= now + START_GRACE_SECONDS
+        if started:
+            session["start_ts"] = min(start, now)
+        with self._lock:
+            user = self._by_user.get(session["user_id"])
+            if user is not None and user.overlaps(max(start, now), session["end_ts"]):
+                return None
+            if started:
+                return STARTED if self.store.add_unless_active(session_id, session, now) else None
+            self._sessions[session_id] = session
+            heapq.heappush(self._start_heap, (start, session_id))
+            self._index(session_id, session)
+            if self.store.persistence:
+                self.store.persistence.upsert(session_id, session)
+        if self.expiry_listener:
+            self.expiry_listener(start)
+        self._notify_change(session_id, session)
+        return SCHEDULED
+
+    def cancel(self, session_id):
+        """Remove and return an upcoming session, or None if it isn't scheduled (e.g. already started)."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return None
+            self._unindex(session_id, session)
+            if self.store.persistence:
+                self.store.persistence.delete(session_id)
+        self._notify_change(session_id, session)
+        return session
+
+    def restore(self, sessions):
+        """Bulk-load upcoming [(session_id, session)] read back from persistence."""
+        with self._lock:
+            for session_id, session in sessions:
+                self._sessions[session_id] = session
+                self._start_heap.append((session["start_ts"], session_id))
+                self._index(session_id, session)
+            heapq.heapify(self._start_heap)
+        next_ts = self.next_start()
+        if next_ts is not None and self.expiry_listener:
+            self.expiry_listener(next_ts)
+
+    def next_start(self):
+        """Earliest start_ts among upcoming sessions, or None."""
+        with self._lock:
+            heap = self._start_heap
+            while heap:
+                start, session_id = heap[0]
+                session = self._sessions.get(session_id)
+                if session is not None and session["start_ts"] == start:
+                    return start
+                heapq.heappop(heap)
+        return None
+
+    def pop_due(self, now=None):
+        """Move every session with start_ts <= now into the store; return them as [(session_id, session)]."""
+        now = time.time() if now is None else now
+        started = []
+        with self._lock:
+            heap = self._start_heap
+            while heap and heap[0][0] <= now:
+                start, session_id = heapq.heappop(heap)
+                session = self._sessions.get(session_id)
+                if session is None or session["start_ts"] != start:
+                    continue
+                del self._sessions[session_id]
+                self.store.add(session_id, session)
+                started.append((session_id, session))
+        return started
+
+    # ExpiryScheduler's names, so it can run the start timer
+    next_expiry = next_start
+    pop_expired = pop_due
+
+    def overlapping(self, start, end, location=None):
+        """Return [(session_id, session)] for upcoming or active sessions overlapping [start, end).
+
+        Limited to one location (by base location) if given, ordered by start.
+        """
+        with self._lock:
+            trees = [self._by_location.get(location)] if location is not None else list(self._by_location.values())
+            found = []
+            for tree in trees:
+                if tree is not None:
+                    found.extend(tree.overlapping(start, end))
+        found.sort(key=lambda match: match[1])
+        return [(session_id, session) for session_id, _, _, session in found]
+
+    def _on_store_change(self, session_id, session):
+        # Called for adds and removals alike; the store says which one it was
+        with self._lock:
+            if session_id in self.store:
+                self._index(session_id, session)
+            elif session_id not in self._sessions:
+                self._unindex(session_id, session)
+
+    def _index(self, session_id, session):
+        start, end = _interval(session)
+        self._by_location.setdefault(_location_key(session), IntervalTree()).add(session_id, start, end, session)
+        self._by_user.setdefault(session["user_id"], IntervalTree()).add(session_id, start, end)
+
+    def _unindex(self, session_id, session):
+        for index, key in ((self._by_location, _location_key(session)), (self._by_user, session["user_id"])):
+            tree = index.get(key)
+            if tree is not None:
+                tree.remove(session_id)
+                if not len(tree):
+                    del index[key]
+
+    def _notify_change(self, session_id, session):
+        for listener in self.change_listeners:
+            listener(session_id, session)
+
+
+def _interval(session):
+    # Sessions saved before start_ts existed started whenever they were created
+    start = session.get("start_ts")
+    return (float("-inf") if start is None else start), session["end_ts"]
+
+
+def _location_key(session):
+    return session.get("base_location") or session["location"]
@@ -0,0 +1,263 @@
+"""In-memory store for active study sessions, indexed by user, location and expiry."""
+import heapq
+import threading
+import time
+import zlib
+
+
+class _Shard:
+    """One lock's worth of sessions with its own indexes. Callers hold `lock`."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.by_user = {}
+        self.by_location = {}
+        self.expiry_heap = []
+
+    def add(self, session_id, session):
+        if session_id in self.sessions:
+            self.unindex(session_id, self.sessions[session_id])
+        self.sessions[session_id] = session
+        self.by_user[session["user_id"]] = session_id
+        self.by_location.setdefault(_location_key(session), set()).add(session_id)
+        heapq.heappush(self.expiry_heap, (session["end_ts"], session_id))
+
+    def pop(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.unindex(session_id, session)
+            self.maybe_compact()
+        return session
+
+    def user_session(self, user_id, now):
+        session_id = self.by_user.get(user_id)
+        if session_id is None:
+            return None, None
+        session = self.sessions[session_id]
+        if session["end_ts"] <= now:
+            return None, None
+        return session_id, session
+
+    def next_expiry(self):
+        heap = self.expiry_heap
+        while heap:
+            end_ts, session_id = heap[0]
+            session = self.sessions.get(session_id)
+            if session is not None and session["end_ts"] == end_ts:
+                return end_ts
+            heapq.heappop(heap)
+        return None
+
+    def pop_expired(self, now):
+        expired = []
+        heap = self.expiry_heap
+        while heap and heap[0][0] < now:
+            end_ts, session_id = heapq.heappop(heap)
+            session = self.sessions.get(session_id)
+            if session is None or session["end_ts"] != end_ts:
+                continue
+            del self.sessions[session_id]
+            self.unindex(session_id, session)
+            expired.append((session_id, session))
+        return expired
+
+    def unindex(self, session_id, session):
+        if self.by_user.get(session["user_id"]) == session_id:
+            del self.by_user[session["user_id"]]
+        key = _location_key(session)
+        sids = self.by_location.get(key)
+        if sids is not None:
+            sids.discard(session_id)
+            if not sids:
+                del self.by_location[key]
+
+    def maybe_compact(self):
+        # Cancelled sessions leave stale heap entries; rebuild once they dominate.
+        if len(self.expiry_heap) > 64 and len(self.expiry_heap) > 2 * len(self.sessions):
+            self.rebuild_heap()
+
+    def rebuild_heap(self):
+        self.expiry_heap = [(s["end_ts"], sid) for sid, s in self.sessions.items()]
+        heapq.heapify(self.expiry_heap)
+
+
+class SessionStore:
+    """Active sessions keyed by session_id, safe to share between threads.
+
+    Sessions are sharded by user_id, each shard with its own lock, a user_id ->
+    session_id index for O(1) lookup, a location -> session_ids index, and a
+    min-heap of (end_ts, session_id) so expiry only touches sessions that are
+    due. Listener threads working on different users rarely share a lock.
+    Heap entries for removed sessions are skipped lazily and compacted once
+    they outnumber live ones.
+
+    If `persistence` is set (see features.persistence.WriteBehind), every
+    add/update/pop is forwarded to it so sessions survive a restart. If
+    `expiry_listener` is set (see features.expiry), it is called with each new
+    end_ts so a sleeping expiry timer can wake early. Callables in
+    `change_listeners` get (session_id, session) whenever a session is added
+    or removed (see features.board and features.listing).
+    """
+
+    def __init__(self, persistence=None, shards=32):
+        self._shards = [_Shard() for _ in range(shards)]
+        # session_id -> shard, so pop(session_id) doesn't need the user_id
+        self._shard_of = {}
+        self.persistence = persistence
+        self.expiry_listener = None
+        self.change_listeners = []
+
+    def __len__(self):
+        return sum(len(shard.sessions) for shard in self._shards)
+
+    def __contains__(self, session_id):
+        return session_id in self._shard_of
+
+    def _user_shard(self, user_id):
+        return self._shards[zlib.crc32(user_id.encode()) % len(self._shards)]
+
+    def get(self, session_id):
+        shard = self._shard_of.get(session_id)
+        return shard.sessions.get(session_id) if shard is not None else None
+
+    def add(self, session_id, session):
+        """Store a session; it becomes the one returned by get_user_session for its user."""
+        shard = self._user_shard(session["user_id"])
+        with shard.lock:
+            self._add_locked(shard, session_id, session)
+        self._notify_expiry(session["end_ts"])
+        self._notify_change(session_id, session)
+
+    def add_unless_active(self, session_id, session, now=None):
+        """Atomically store a session only if its user has no unexpired one. Returns True if stored."""
+        now = time.time() if now is None else now
+        shard = self._user_shard(session["user_id"])
+        with shard.lock:
+            if shard.user_session(session["user_id"], now)[0] is not None:
+                return False
+            self._add_locked(shard, session_id, session)
+        self._notify_expiry(session["end_ts"])
+        self._notify_change(session_id, session)
+        return True
+
+    def update(self, session_id, **fields):
+        """Set non-indexed fields (e.g. channel_id, message_ts) on a stored session."""
+        shard = self._shard_of.get(session_id)
+        if shard is None:
+            return None
+        with shard.lock:
+            session = shard.sessions.get(session_id)
+            if session is None:
+                return None
+            session.update(fields)
+            if self.persistence:
+                self.persistence.upsert(session_id, session)
+        return session
+
+    def pop(self, session_id):
+        """Atomically remove and return a session, or None if it isn't stored (or already popped)."""
+        shard = self._shard_of.get(session_id)
+        if shard is None:
+            return None
+        with shard.lock:
+            session = shard.pop(session_id)
+            if session is None:
+                return None
+            self._shard_of.pop(session_id, None)
+            if self.persistence:
+                self.persistence.delete(session_id)
+        self._notify_change(session_id, session)
+        return session
+
+    def restore(self, sessions):
+        """Bulk-load [(session_id, session)] read back from persistence, without re-persisting."""
+        sessions = list(sessions)
+        touched = set()
+        for session_id, session in sessions:
+            shard = self._user_shard(session["user_id"])
+            with shard.lock:
+                shard.sessions[session_id] = session
+                shard.by_user[session["user_id"]] = session_id
+                shard.by_location.setdefault(_location_key(session), set()).add(session_id)
+                self._shard_of[session_id] = shard
+            touched.add(id(shard))
+        for shard in self._shards:
+            if id(shard) in touched:
+                with shard.lock:
+                    shard.rebuild_heap()
+        next_ts = self.next_expiry()
+        if next_ts is not None:
+            self._notify_expiry(next_ts)
+        for session_id, session in sessions:
+            self._notify_change(session_id, session)
+
+    def get_user_session(self, user_id, now=None):
+        """Return (session_id, session) for the user's unexpired session, or (None, None)."""
+        shard = self._user_shard(user_id)
+        with shard.lock:
+            return shard.user_session(user_id, time.time() if now is None else now)
+
+    def in_location(self, location):
+        """Return [(session_id, session)] for sessions at a location."""
+        found = []
+        for shard in self._shards:
+            with shard.lock:
+                found.extend((sid, shard.sessions[sid]) for sid in shard.by_location.get(location, ()))
+        return found
+
+    def locations(self):
+        """Every location key that currently has a session."""
+        found = set()
+        for shard in self._shards:
+            with shard.lock:
+                found.update(shard.by_location)
+        return found
+
+    def next_expiry(self):
+        """Earliest end_ts among stored sessions, or None if there are none."""
+        earliest = None
+        for shard in self._shards:
+            with shard.lock:
+                end_ts = shard.next_expiry()
+            if end_ts is not None and (earliest is None or end_ts < earliest):
+                earliest = end_ts
+        return earliest
+
+    def pop_expired(self, now=None):
+        """Remove and return [(session_id, session)] for every session with end_ts < now."""
+        now = time.time() if now is None else now
+        expired = []
+        for shard in self._shards:
+            with shard.lock:
+                due = shard.pop_expired(now)
+                for session_id, _ in due:
+                    self._shard_of.pop(session_id, None)
+                    if self.persistence:
+                        self.persistence.delete(session_id)
+            expired.extend(due)
+        for session_id, session in expired:
+            self._notify_change(session_id, session)
+        return expired
+
+    def _add_locked(self, shard, session_id, session):
+        other = self._shard_of.get(session_id)
+        if other is not None and other is not shard:
+            raise ValueError(f"session {session_id} is already stored for another user")
+        shard.add(session_id, session)
+        self._shard_of[session_id] = shard
+        if self.persistence:
+            self.persistence.upsert(session_id, session)
+
+    def _notify_change(self, session_id, session):
+        for listener in self.change_listeners:
+            listener(session_id, session)
+
+    def _notify_expiry(self, end_ts):
+        # Called outside shard locks: the expiry timer takes its own lock, then ours.
+        if self.expiry_listener:
+            self.expiry_listener(end_ts)
+
+
+def _location_key(session):
+    return session.get("base_location") or session["location"]
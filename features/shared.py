@@ -0,0 +1,294 @@
+"""Session store shared by several app.py replicas, plus a lease so only one runs expiry.
+
+Both use one SQLite database on storage every replica can lock (the same host
+or a shared volume with working POSIX locks); see SHARED_SESSION_DB in the README.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+
+from features.persistence import SESSION_COLUMNS, _UPSERT_SQL, _row_to_session, _session_to_row, connect
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ", ".join(SESSION_COLUMNS)
+_LOCATION_KEY = "COALESCE(NULLIF(base_location, ''), location)"
+# Change-log rows older than this are pruned; a replica that falls further behind only misses invalidations
+_CHANGE_RETENTION_SECONDS = 300
+
+
+class SharedSessionStore:
+    """SessionStore backed directly by a SQLite database that several processes share.
+
+    Every method is one short transaction, so a cancel handled by any replica
+    sees sessions created by the others, and pop/pop_expired/add_unless_active
+    are atomic across processes (BEGIN IMMEDIATE takes the database write lock).
+    Adds and removals are also appended to a change log; start_change_feed()
+    polls it and replays other replicas' changes to `change_listeners` and
+    `expiry_listener`, so per-process caches (the board, /study list) and a
+    sleeping expiry timer stay current.
+    """
+
+    def __init__(self, path, poll_interval=1.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.persistence = None
+        self.expiry_listener = None
+        self.change_listeners = []
+        self._origin = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_user ON sessions (user_id, end_ts)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS sessions_location ON sessions ({_LOCATION_KEY})")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_changes ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " session_id TEXT NOT NULL,"
+            " location TEXT NOT NULL,"
+            " end_ts REAL,"
+            " origin TEXT NOT NULL,"
+            " changed_at REAL NOT NULL)"
+        )
+        self._seen_seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM session_changes").fetchone()[0]
+        self._feed = None
+
+    def __len__(self):
+        return self._query_one("SELECT COUNT(*) FROM sessions")[0]
+
+    def __contains__(self, session_id):
+        return self._query_one("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)) is not None
+
+    def get(self, session_id):
+        row = self._query_one(f"SELECT session_id, {_COLUMNS}, extra FROM sessions WHERE session_id = ?", (session_id,))
+        return _row_to_session(row)[1] if row else None
+
+    def add(self, session_id, session):
+        with self._write() as conn:
+            conn.execute(_UPSERT_SQL, _session_to_row(session_id, session))
+            self._log_change(conn, session_id, session, session["end_ts"])
+        self._notify(session_id, session, session["end_ts"])
+
+    def add_unless_active(self, session_id, session, now=None):
+        """Atomically store a session only if its user has no unexpired one, on any replica."""
+        now = time.time() if now is None else now
+        with self._write() as conn:
+            active = conn.execute(
+                "SELECT 1 FROM sessions WHERE user_id = ? AND end_ts > ? LIMIT 1", (session["user_id"], now)
+            ).fetchone()
+            if active is not None:
+                return False
+            conn.execute(_UPSERT_SQL, _session_to_row(session_id, session))
+            self._log_change(conn, session_id, session, session["end_ts"])
+        self._notify(session_id, session, session["end_ts"])
+        return True
+
+    def update(self, session_id, **fields):
+        with self._write() as conn:
+            row = conn.execute(f"SELECT session_id, {_COLUMNS}, extra FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            session = _row_to_session(row)[1]
+            session.update(fields)
+            conn.execute(_UPSERT_SQL, _session_to_row(session_id, session))
+        return session
+
+    def pop(self, session_id):
+        """Atomically remove and return a session; exactly one replica gets it back."""
+        with self._write() as conn:
+            row = conn.execute(
+                f"DELETE FROM sessions WHERE session_id = ? RETURNING session_id, {_COLUMNS}, extra", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            session = _row_to_session(row)[1]
+            self._log_change(conn, session_id, session, None)
+        self._notify(session_id, session, None)
+        return session
+
+    def restore(self, sessions):
+        for session_id, session in sessions:
+            self.add(session_id, session)
+
+    def get_user_session(self, user_id, now=None):
+        row = self._query_one(
+            f"SELECT session_id, {_COLUMNS}, extra FROM sessions WHERE user_id = ? AND end_ts > ? ORDER BY end_ts DESC LIMIT 1",
+            (user_id, time.time() if now is None else now),
+        )
+        return _row_to_session(row) if row else (None, None)
+
+    def in_location(self, location):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT session_id, {_COLUMNS}, extra FROM sessions WHERE {_LOCATION_KEY} = ?", (location,)
+            ).fetchall()
+        return [_row_to_session(row) for row in rows]
+
+    def locations(self):
+        with self._lock:
+            return {row[0] for row in self._conn.execute(f"SELECT DISTINCT {_LOCATION_KEY} FROM sessions")}
+
+    def next_expiry(self):
+        return self._query_one("SELECT MIN(end_ts) FROM sessions")[0]
+
+    def pop_expired(self, now=None):
+        """Remove and return every session with end_ts < now; concurrent callers never share a session."""
+        now = time.time() if now is None else now
+        with self._write() as conn:
+            rows = conn.execute(
+                f"DELETE FROM sessions WHERE end_ts < ? RETURNING session_id, {_COLUMNS}, extra", (now,)
+            ).fetchall()
+            expired = [_row_to_session(row) for row in rows]
+            for session_id, session in expired:
+                self._log_change(conn, session_id, session, None)
+        for session_id, session in expired:
+            self._notify_change(session_id, session)
+        return expired
+
+    def get_meta(self, key):
+        row = self._query_one("SELECT value FROM meta WHERE key = ?", (key,))
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._write() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def start_change_feed(self):
+        """Poll the change log on a daemon thread, replaying other replicas' changes locally."""
+        if self._feed is None:
+            self._feed = threading.Thread(target=self._run_feed, name="session-change-feed", daemon=True)
+            self._feed.start()
+
+    def poll_changes(self):
+        """Replay changes made by other replicas since the last poll; returns how many."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, session_id, location, end_ts, origin FROM session_changes WHERE seq > ? ORDER BY seq",
+                (self._seen_seq,),
+            ).fetchall()
+        if rows:
+            self._seen_seq = rows[-1][0]
+        remote = [row for row in rows if row[4] != self._origin]
+        for _, session_id, location, end_ts, _ in remote:
+            self._notify(session_id, {"location": location, "end_ts": end_ts}, end_ts)
+        return len(remote)
+
+    def prune_changes(self, now=None):
+        now = time.time() if now is None else now
+        with self._write() as conn:
+            conn.execute("DELETE FROM session_changes WHERE changed_at < ?", (now - _CHANGE_RETENTION_SECONDS,))
+
+    def _run_feed(self):
+        polls = 0
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll_changes()
+                polls += 1
+                if polls % 60 == 0:
+                    self.prune_changes()
+            except Exception:
+                logger.exception("Failed to poll the shared session change log")
+
+    def _log_change(self, conn, session_id, session, end_ts):
+        conn.execute(
+            "INSERT INTO session_changes (session_id, location, end_ts, origin, changed_at) VALUES (?, ?, ?, ?, ?)",
+            (session_id, session.get("base_location") or session["location"], end_ts, self._origin, time.time()),
+        )
+
+    def _notify(self, session_id, session, end_ts):
+        if end_ts is not None and self.expiry_listener:
+            self.expiry_listener(end_ts)
+        self._notify_change(session_id, session)
+
+    def _notify_change(self, session_id, session):
+        for listener in self.change_listeners:
+            listener(session_id, session)
+
+    def _query_one(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _write(self):
+        return _WriteTransaction(self._conn, self._lock)
+
+
+class _WriteTransaction:
+    """`with` block holding the process lock and an IMMEDIATE (write-locked) transaction."""
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+        return False
+
+
+class Lease:
+    """Time-limited, renewable claim on a name in the shared database (leader election).
+
+    acquire() takes the lease if it is free or expired, or renews it if this
+    process already holds it; call it at least every ttl/3 seconds. held()
+    answers from local state, so it is cheap enough to check before each
+    expiry batch or board update. The lease is released at interpreter exit.
+    """
+
+    def __init__(self, path, name, ttl=10.0, holder=None):
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self._expires_at = 0.0
+        atexit.register(self.release)
+
+    def acquire(self):
+        """Take or renew the lease; returns True if this process holds it now."""
+        now = time.time()
+        try:
+            with _WriteTransaction(self._conn, self._lock) as conn:
+                row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (self.name,)).fetchone()
+                if row is not None and row[0] != self.holder and row[1] > now:
+                    self._expires_at = 0.0
+                    return False
+                conn.execute(
+                    "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                    (self.name, self.holder, now + self.ttl),
+                )
+        except Exception:
+            logger.exception("Failed to acquire lease %s", self.name)
+            self._expires_at = 0.0
+            return False
+        if self._expires_at == 0.0:
+            logger.info("Acquired lease %s as %s", self.name, self.holder)
+        self._expires_at = now + self.ttl
+        return True
+
+    def held(self):
+        return time.time() < self._expires_at
+
+    def release(self):
+        if not self._expires_at:
+            return
+        self._expires_at = 0.0
+        try:
+            with _WriteTransaction(self._conn, self._lock) as conn:
+                conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+        except Exception:
+            logger.exception("Failed to release lease %s", self.name)
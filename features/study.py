@@ -1,21 +1,31 @@
 """Study location bot: share where you're studying, tag others, cancel, list who's studying."""
+import inspect
+import logging
 import os
 import threading
 import time
 import uuid
-from datetime import datetime, timedelta, timezone
+from functools import lru_cache, partial
 
-from slack_sdk import WebClient
-import pytz
+from features import metrics, tracing
+from features.channels import ChannelDirectory, StudyChannel, channel_path, load_channel_configs
+from features.clock import LABELS, TIMEZONE, clock_for, clock_minute
+from features.outbox import async_outbox, outbox
+from features.persistence import WriteBehind, open_backend
+from features.reconcile import RECONCILE_ON_START, reconcile
+from features.schedule import SCHEDULED, START_GRACE_SECONDS
+from features.welcome import WELCOME_DB_PATH, WelcomeLog, Welcomer
 
-# Channel where announcements are posted
-# Use TEST_CHANNEL_ID if ENV is "development", otherwise use the hardcoded channel
+logger = logging.getLogger(__name__)
 
-STUDY_CHANNEL_ID = "C0ACQP6P3T2"
+# Channel where announcements are posted; empty means DM-only mode.
+# STUDY_CHANNELS (a JSON file, see features.channels) configures several channels instead.
+STUDY_CHANNEL_ID = os.environ.get("STUDY_CHANNEL_ID", "C0ACQP6P3T2")
 
-# Set your timezone here (e.g., 'America/Los_Angeles', 'America/New_York', 'America/Chicago')
-TIMEZONE = pytz.timezone(os.environ.get("TZ", "America/Los_Angeles"))
+# Wall clock in TIMEZONE (set with TZ, see features.clock) for the modal, labels and study windows
+clock = clock_for(TIMEZONE)
 
+# Locations for STUDY_CHANNEL_ID, and for configured channels that don't list their own
 UCI_LOCATIONS = [
     "Langson Library",
     "Science Library",
@@ -28,76 +38,205 @@ UCI_LOCATIONS = [
     "Other",
 ]
 
-# session_id -> { user_id, user_name, location, end_ts }
-active_sessions = {}
+# One pinned, periodically edited summary per channel instead of a message and pin per session
+BOARD_MODE = os.environ.get("STUDY_BOARD", "").lower() in ("1", "true", "yes")
+BOARD_UPDATE_INTERVAL = float(os.environ.get("BOARD_UPDATE_INTERVAL", "3"))
 
+# SQLite file shared by every replica of app.py; when set, sessions live there instead of in memory
+# (one file per channel when several are configured: shared.db -> shared.<channel>.db)
+SHARED_SESSION_DB = os.environ.get("SHARED_SESSION_DB", "")
+LEADER_LEASE_TTL = float(os.environ.get("LEADER_LEASE_TTL", "10"))
+
+# Finished sessions, for /study stats; HISTORY_DIR="" turns it off (a subdirectory per channel when
+# several are configured). Each replica records what it removes, so with SHARED_SESSION_DB give every
+# replica its own dir.
+HISTORY_DIR = os.environ.get("HISTORY_DIR", "history")
+
+
+def _list_query(command_text, subcommand="list"):
+    """Return the rest of command_text if it is `<subcommand> [...]` (`list [location]`), else None."""
+    args = (command_text or "").split(None, 1)
+    if not args or args[0].lower() != subcommand:
+        return None
+    return args[1] if len(args) > 1 else ""
+
+
+def _study_stats_response(channel, query, user_id):
+    """(text, blocks) for `/study stats [period]` in a channel, answered in the ack like `/study list`."""
+    if channel.history_stats is None:
+        text = "Study history is turned off on this bot."
+        return text, [{"type": "section", "text": {"type": "mrkdwn", "text": text}}]
+    return channel.history_stats.response(query, user_id)
+
+
+def _unpin_expired(client, expired):
+    """Queue unpinning the announcements of [(session_id, session)] that have ended."""
+    for sid, s in expired:
+        if s.get("channel_id") and s.get("message_ts"):
+            outbox.submit(s["message_ts"], client.pins_remove, channel=s["channel_id"], timestamp=s["message_ts"])
 
-def _clean_expired_sessions(client=None):
-    """Remove expired sessions and unpin their messages if client is provided."""
-    now = time.time()
-    expired = [sid for sid, s in active_sessions.items() if s["end_ts"] < now]
-    for sid in expired:
-        s = active_sessions[sid]
-        if client and s.get("channel_id") and s.get("message_ts"):
-            try:
-                client.pins_remove(channel=s["channel_id"], timestamp=s["message_ts"])
-            except Exception:
-                pass
-        del active_sessions[sid]
-
-
-def _get_user_session(user_id):
-    """Return (session_id, session) for user's current active session, or (None, None)."""
-    now = time.time()
-    for sid, s in active_sessions.items():
-        if s["user_id"] == user_id and s["end_ts"] > now:
-            return sid, s
-    return None, None
 
+def _attach_persistence():
+    """Reload sessions saved by the last run and persist changes from now on.
 
-def _expiry_cleanup_loop():
-    """Background loop: every 60s, unpin and remove expired sessions."""
-    token = os.environ.get("SLACK_BOT_TOKEN")
-    if not token:
+    Sessions that ended while the bot was down are restored too, so the expiry
+    scheduler unpins their announcements as soon as it starts. Every channel
+    saves to the one SESSION_DB_PATH and gets back the sessions carrying its
+    channel_id (the default channel takes the rest). A shared store is
+    already durable; it just starts following the other replicas' changes.
+    """
+    if SHARED_SESSION_DB:
+        for channel in channels:
+            channel.store.start_change_feed()
         return
-    client = WebClient(token=token)
-    while True:
-        time.sleep(60)
-        try:
-            _clean_expired_sessions(client)
-        except Exception:
-            pass
+    if channels.default.store.persistence is not None:
+        return
+    backend = open_backend(os.environ.get("SESSION_DB_PATH", "sessions.db"))
+    if backend is None:
+        return
+    now = time.time()
+    active, expired = backend.load(now)
+    by_channel = {}
+    for sid, s in active + expired:
+        by_channel.setdefault(channels.route(s.get("channel_id")), []).append((sid, s))
+    write_behind = WriteBehind(backend)
+    for channel in channels:
+        channel.restore(by_channel.get(channel, []), now)
+        channel.store.persistence = write_behind
+
+
+def _board_line(session):
+    """One board/list row: who, the specific spot if any, and until when (from when, if it hasn't started)."""
+    location = session["location"]
+    base = session.get("base_location")
+    if base and location.startswith(base + " — "):
+        spot = location[len(base) + 3:]
+    elif location == base:
+        spot = ""
+    else:
+        spot = location
+    end_str = clock.label(session["end_ts"])
+    start_ts = session.get("start_ts")
+    if start_ts and start_ts > time.time():
+        when = f"{clock.label(start_ts)} – {end_str}"
+    else:
+        when = f"until {end_str}"
+    return f"• <@{session['user_id']}>{f' — {spot}' if spot else ''} {when}"
+
+
+def _attach_board():
+    """Create each announcing channel's live board in BOARD_MODE; return the boards.
+
+    Call after _attach_persistence so the board message ts is reloaded too.
+    """
+    if not BOARD_MODE:
+        return []
+    boards = []
+    for channel in channels:
+        if not channel.channel_id:
+            continue
+        if SHARED_SESSION_DB:
+            meta = channel.store
+        else:
+            persistence = channel.store.persistence
+            meta = persistence.backend if persistence is not None else None
+        boards.append(channel.attach_board(BOARD_UPDATE_INTERVAL, meta, default=channel is channels.default))
+    return boards
+
+
+def _open_channels():
+    configs = load_channel_configs(os.environ.get("STUDY_CHANNELS", ""), STUDY_CHANNEL_ID, UCI_LOCATIONS)
+    sharded = len(configs) > 1
+    return ChannelDirectory(
+        StudyChannel(
+            config,
+            _board_line,
+            TIMEZONE,
+            shared_db=channel_path(SHARED_SESSION_DB, config.channel_id, sharded),
+            lease_ttl=LEADER_LEASE_TTL,
+            history_dir=channel_path(HISTORY_DIR, config.channel_id, sharded),
+        )
+        for config in configs
+    )
 
 
-def _build_study_modal_blocks(other_location_value=None):
-    location_options = [
-        {"text": {"type": "plain_text", "text": loc}, "value": loc}
-        for loc in UCI_LOCATIONS
-    ]
-    hour_options = [{"text": {"type": "plain_text", "text": str(h)}, "value": str(h)} for h in range(1, 13)]
-    minute_options = [
-        {"text": {"type": "plain_text", "text": f"{m:02d}"}, "value": str(m)}
-        for m in range(60)
-    ]
-    ampm_options = [
-        {"text": {"type": "plain_text", "text": "AM"}, "value": "AM"},
-        {"text": {"type": "plain_text", "text": "PM"}, "value": "PM"},
-    ]
-    # Prefill start time with current time; end time with next full hour
-    now = datetime.now(TIMEZONE)
-    start_hour_12 = now.hour % 12 or 12
-    start_minute = now.minute
-    start_ampm = "AM" if now.hour < 12 else "PM"
-    start_hour_initial = {"text": {"type": "plain_text", "text": str(start_hour_12)}, "value": str(start_hour_12)}
-    start_minute_initial = {"text": {"type": "plain_text", "text": f"{start_minute:02d}"}, "value": str(start_minute)}
-    start_ampm_initial = {"text": {"type": "plain_text", "text": start_ampm}, "value": start_ampm}
-    next_hour_24 = (now.hour + 1) % 24
-    end_hour_12 = next_hour_24 % 12 or 12
-    end_ampm = "AM" if next_hour_24 < 12 else "PM"
-    end_hour_initial = {"text": {"type": "plain_text", "text": str(end_hour_12)}, "value": str(end_hour_12)}
-    end_minute_initial = {"text": {"type": "plain_text", "text": "00"}, "value": "0"}
-    end_ampm_initial = {"text": {"type": "plain_text", "text": end_ampm}, "value": end_ampm}
-    blocks = [
+# Configured channels, each with its own sessions, timers, `/study list` cache, history and board
+channels = _open_channels()
+
+
+def _board_confirmation_text(submission):
+    return f"📍 You're on the study board at *{submission['location']}* *{submission['time_range']}*."
+
+
+def _plain_option(text, value):
+    return {"text": {"type": "plain_text", "text": text}, "value": value}
+
+
+@lru_cache(maxsize=None)
+def _time_actions_block(prefix, hour_24, minute):
+    """Start/end time selects preset to hour_24:minute; cached, so treat as read-only."""
+    return {
+        "type": "actions",
+        "block_id": f"{prefix}_time_actions",
+        "elements": [
+            {
+                "type": "static_select",
+                "action_id": f"{prefix}_hour_input",
+                "placeholder": {"type": "plain_text", "text": "Hour"},
+                "options": _HOUR_OPTIONS,
+                "initial_option": _HOUR_OPTIONS[(hour_24 % 12 or 12) - 1],
+            },
+            {
+                "type": "static_select",
+                "action_id": f"{prefix}_minute_input",
+                "placeholder": {"type": "plain_text", "text": "Min"},
+                "options": _MINUTE_OPTIONS,
+                "initial_option": _MINUTE_OPTIONS[minute],
+            },
+            {
+                "type": "static_select",
+                "action_id": f"{prefix}_ampm_input",
+                "placeholder": {"type": "plain_text", "text": "AM/PM"},
+                "options": _AMPM_OPTIONS,
+                "initial_option": _AMPM_OPTIONS[hour_24 >= 12],
+            },
+        ],
+    }
+
+
+def _other_location_block(other_location_value):
+    return {
+        "type": "input",
+        "block_id": "other_location_block",
+        "optional": True,
+        "element": {
+            "type": "plain_text_input",
+            "action_id": "other_location_input",
+            "placeholder": {"type": "plain_text", "text": "e.g. 4th floor Langson"},
+            "initial_value": other_location_value or "",
+        },
+        "label": {"type": "plain_text", "text": "Specific spot"},
+    }
+
+
+_HOUR_OPTIONS = tuple(_plain_option(str(h), str(h)) for h in range(1, 13))
+_MINUTE_OPTIONS = tuple(_plain_option(f"{m:02d}", str(m)) for m in range(60))
+_AMPM_OPTIONS = (_plain_option("AM", "AM"), _plain_option("PM", "PM"))
+_EMPTY_OTHER_LOCATION_BLOCK = _other_location_block(None)
+_OTHER_LOCATION_INDEX = 1
+_START_TIME_INDEX = 6
+_END_TIME_INDEX = 8
+
+
+@lru_cache(maxsize=None)
+def _study_modal_template(locations):
+    """Study modal blocks for a tuple of locations, built once per channel's list.
+
+    Option lists are tuples and every block is shared between requests, so
+    treat all of it as read-only; the specific spot and start/end time blocks
+    are swapped in by _build_study_modal_blocks.
+    """
+    return (
         {
             "type": "input",
             "block_id": "location_block",
@@ -105,22 +244,11 @@ def _build_study_modal_blocks(other_location_value=None):
                 "type": "static_select",
                 "action_id": "location_select",
                 "placeholder": {"type": "plain_text", "text": "Where are you studying?"},
-                "options": location_options,
+                "options": tuple(_plain_option(loc, loc) for loc in locations),
             },
             "label": {"type": "plain_text", "text": "Location"},
         },
-        {
-            "type": "input",
-            "block_id": "other_location_block",
-            "optional": True,
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "other_location_input",
-                "placeholder": {"type": "plain_text", "text": "e.g. 4th floor Langson"},
-                "initial_value": other_location_value or "",
-            },
-            "label": {"type": "plain_text", "text": "Specific spot"},
-        },
+        _EMPTY_OTHER_LOCATION_BLOCK,
         {
             "type": "input",
             "block_id": "studying_with_block",
@@ -156,118 +284,372 @@ def _build_study_modal_blocks(other_location_value=None):
             "label": {"type": "plain_text", "text": "Share a photo to show your study spot"},
         },
         {"type": "header", "block_id": "start_time_header", "text": {"type": "plain_text", "text": "Start time", "emoji": True}},
-        {
-            "type": "actions",
-            "block_id": "start_time_actions",
-            "elements": [
-                {
-                    "type": "static_select",
-                    "action_id": "start_hour_input",
-                    "placeholder": {"type": "plain_text", "text": "Hour"},
-                    "options": hour_options,
-                    "initial_option": start_hour_initial,
-                },
-                {
-                    "type": "static_select",
-                    "action_id": "start_minute_input",
-                    "placeholder": {"type": "plain_text", "text": "Min"},
-                    "options": minute_options,
-                    "initial_option": start_minute_initial,
-                },
-                {
-                    "type": "static_select",
-                    "action_id": "start_ampm_input",
-                    "placeholder": {"type": "plain_text", "text": "AM/PM"},
-                    "options": ampm_options,
-                    "initial_option": start_ampm_initial,
+        None,  # start_time_actions
+        {"type": "header", "block_id": "end_time_header", "text": {"type": "plain_text", "text": "End time", "emoji": True}},
+        None,  # end_time_actions
+    )
+
+
+def _build_study_modal_blocks(other_location_value=None, locations=tuple(UCI_LOCATIONS)):
+    # Prefill start time with current time; end time with next full hour
+    now = clock.now()
+    next_hour_24 = (now.hour + 1) % 24
+    blocks = list(_study_modal_template(tuple(locations)))
+    if other_location_value:
+        blocks[_OTHER_LOCATION_INDEX] = _other_location_block(other_location_value)
+    blocks[_START_TIME_INDEX] = _time_actions_block("start", now.hour, now.minute)
+    blocks[_END_TIME_INDEX] = _time_actions_block("end", next_hour_24, 0)
+    return blocks
+
+
+@tracing.traced("blocks.study_modal")
+def _study_modal_view(channel):
+    """The study modal for a channel: its locations, and its id to route the submission back."""
+    return {
+        "type": "modal",
+        "callback_id": "study_modal",
+        "title": {"type": "plain_text", "text": "Share study location"},
+        "submit": {"type": "plain_text", "text": "Announce"},
+        "private_metadata": channel.channel_id,
+        "blocks": _build_study_modal_blocks(locations=channel.locations),
+    }
+
+
+@tracing.traced("blocks.already_studying")
+def _already_studying_view(session_id, session):
+    """Modal prompting the user to cancel their existing session."""
+    end_str = clock.label(session["end_ts"])
+    location = session["location"]
+    return {
+        "type": "modal",
+        "callback_id": "study_already_modal",
+        "title": {"type": "plain_text", "text": "Already studying"},
+        "close": {"type": "plain_text", "text": "Keep it"},
+        "submit": {"type": "plain_text", "text": "Cancel & create new"},
+        "private_metadata": session_id,
+        "blocks": [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"You're already listed as studying at *{location}* (until ~{end_str}).\n\nCancel that announcement first, then you can share a new location.",
                 },
-            ],
+            },
+        ],
+    }
+
+
+@tracing.traced("parse_submission")
+def _parse_study_submission(body, view):
+    """Pull everything the announcement needs out of a study_modal view_submission."""
+    values = view["state"]["values"]
+    user_id = body["user"]["id"]
+    user_name = body["user"].get("name", "Someone")
+
+    location_block = values["location_block"]
+    location = location_block["location_select"]["selected_option"]["value"]
+    base_location = location
+
+    other_block = values["other_location_block"]
+    other_raw = (other_block.get("other_location_input") or {}).get("value") or ""
+    other = other_raw.strip() if isinstance(other_raw, str) else ""
+    if location == "Other":
+        location = other or "Somewhere on campus"
+    elif other:
+        location = f"{location} — {other}"
+
+    studying_with_block = values.get("studying_with_block") or {}
+    studying_with_obj = studying_with_block.get("studying_with_input") or {}
+    selected_user_ids = studying_with_obj.get("selected_users") or []
+    with_suffix = ""
+    if selected_user_ids:
+        with_suffix = " with " + " ".join(f"<@{uid}>" for uid in selected_user_ids) + " "
+
+    description_block = values.get("description_block") or {}
+    description_raw = (description_block.get("description_input") or {}).get("value") or ""
+    description = description_raw.strip() if isinstance(description_raw, str) else ""
+
+    # Handle image upload
+    image_block = values.get("image_block") or {}
+    image_obj = image_block.get("image_input") or {}
+    image_files = image_obj.get("files") or []
+    image_url = None
+    if image_files and len(image_files) > 0:
+        file_data = image_files[0]
+        # The file data from modal already contains permalink_public and url_private
+        permalink_public = file_data.get("permalink_public")
+        url_private = file_data.get("url_private")
+        if permalink_public and url_private:
+            # Extract the pub_secret from permalink_public and construct direct URL
+            # permalink_public format: https://slack-files.com/TEAM-FILE-PUBSECRET
+            # We need to use the url_private with ?pub_secret=PUBSECRET
+            pub_secret = permalink_public.split("-")[-1] if "-" in permalink_public else None
+            if pub_secret:
+                image_url = f"{url_private}?pub_secret={pub_secret}"
+        logger.debug("Study spot image_url: %s", image_url)
+
+    def _get_select(block_id, action_id, default=None):
+        obj = (values.get(block_id) or {}).get(action_id) or {}
+        opt = obj.get("selected_option")
+        return opt.get("value") if opt else default
+
+    start = clock_minute(
+        int(_get_select("start_time_actions", "start_hour_input") or 9),
+        int(_get_select("start_time_actions", "start_minute_input") or 0),
+        _get_select("start_time_actions", "start_ampm_input") or "AM",
+    )
+    end = clock_minute(
+        int(_get_select("end_time_actions", "end_hour_input") or 5),
+        int(_get_select("end_time_actions", "end_minute_input") or 0),
+        _get_select("end_time_actions", "end_ampm_input") or "PM",
+    )
+    # In TIMEZONE; e.g. 1–3 AM picked at 11 PM is tomorrow night, not a session that already ended
+    start_ts, end_ts = clock.window(start, end)
+
+    return {
+        "user_id": user_id,
+        "user_name": user_name,
+        "location": location,
+        "base_location": base_location,
+        "with_suffix": with_suffix,
+        "description": description,
+        "image_url": image_url,
+        "time_range": f"{LABELS[start]} – {LABELS[end]}",
+        "start_ts": start_ts,
+        "end_ts": end_ts,
+    }
+
+
+def _new_session(submission):
+    session = {
+        "user_id": submission["user_id"],
+        "user_name": submission["user_name"],
+        "location": submission["location"],
+        "base_location": submission["base_location"],
+        "start_ts": submission["start_ts"],
+        "end_ts": submission["end_ts"],
+        "image_url": submission["image_url"],
+    }
+    if submission["start_ts"] > time.time() + START_GRACE_SECONDS:
+        # Everything else _announcement_message needs, for when the session starts
+        session.update(
+            with_suffix=submission["with_suffix"],
+            description=submission["description"],
+            time_range=submission["time_range"],
+        )
+    return session
+
+
+def _scheduled_confirmation_text(submission):
+    return (
+        f"🗓️ You're scheduled to study at *{submission['location']}* *{submission['time_range']}*. "
+        "I'll announce it when it starts."
+    )
+
+
+def _dm_confirmation_text(submission):
+    msg = (
+        f"✅ You're now listed as studying at *{submission['location']}* *{submission['time_range']}*. "
+        "Set `STUDY_CHANNEL_ID` in your app config to announce to a channel."
+    )
+    if submission["description"]:
+        msg += f"\n_{submission['description']}_"
+    return msg
+
+
+@tracing.traced("blocks.announcement")
+def _announcement_message(submission):
+    """Return (text, blocks) for the channel announcement."""
+    description = submission["description"]
+    image_url = submission["image_url"]
+    msg = (
+        f"📍 <@{submission['user_id']}> is studying at *{submission['location']}*{submission['with_suffix']} *{submission['time_range']}*."
+    )
+    blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": msg}}]
+    if description:
+        blocks.append({
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": f"_{description}_"},
+        })
+    if image_url:
+        blocks.append({"type": "divider"})
+        blocks.append({
+            "type": "image",
+            "image_url": image_url,
+            "alt_text": f"Study spot photo from {submission['user_name']}",
+            "block_id": "study_image_block",
+        })
+    full_text = f"{msg}\n_{description}_" if description else msg
+    if image_url:
+        full_text += f"\nPhoto attached"
+    return full_text, blocks
+
+
+def _announce(client, channel, session_id, submission):
+    """Post a session's announcement in its channel, record it on the session and queue the pin; return its ts.
+
+    A session cancelled (or ended) while this waited in the outbox isn't
+    announced; if that happens while the post is in flight, the post is
+    struck through instead of pinned. Either way it returns None.
+    """
+    if session_id not in channel.store:
+        return None
+    full_text, blocks = _announcement_message(submission)
+    result = client.chat_postMessage(channel=channel.channel_id, text=full_text, blocks=blocks)
+    if channel.store.update(session_id, channel_id=channel.channel_id, message_ts=result["ts"], message_text=full_text) is None:
+        gone_text, gone_blocks = _retracted_message(full_text, submission)
+        outbox.submit(result["ts"], client.chat_update, channel=channel.channel_id, ts=result["ts"], text=gone_text, blocks=gone_blocks)
+        return None
+    outbox.submit(result["ts"], client.pins_add, channel=channel.channel_id, timestamp=result["ts"])
+    return result["ts"]
+
+
+def _announce_started(client, channel, started):
+    """Queue announcements for a channel's scheduled [(session_id, session)] whose start has come.
+
+    One attempt each (bar 429s): a post that timed out may still have gone through, and a retry would announce twice.
+    """
+    if BOARD_MODE or not channel.channel_id:
+        return  # the board picks them up from the store; DM-only mode has nothing to post
+    for session_id, session in started:
+        outbox.submit_once(session_id, _announce, client, channel, session_id, session)
+
+
+@tracing.traced("blocks.cancel_prompt")
+def _cancel_prompt_blocks(session_id):
+    # Ephemeral message: only the author sees the Cancel button
+    return [
+        {
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": "Cancel your study announcement?"},
         },
-        {"type": "header", "block_id": "end_time_header", "text": {"type": "plain_text", "text": "End time", "emoji": True}},
         {
             "type": "actions",
-            "block_id": "end_time_actions",
+            "block_id": "study_cancel_ephemeral_actions",
             "elements": [
                 {
-                    "type": "static_select",
-                    "action_id": "end_hour_input",
-                    "placeholder": {"type": "plain_text", "text": "Hour"},
-                    "options": hour_options,
-                    "initial_option": end_hour_initial,
-                },
-                {
-                    "type": "static_select",
-                    "action_id": "end_minute_input",
-                    "placeholder": {"type": "plain_text", "text": "Min"},
-                    "options": minute_options,
-                    "initial_option": end_minute_initial,
-                },
-                {
-                    "type": "static_select",
-                    "action_id": "end_ampm_input",
-                    "placeholder": {"type": "plain_text", "text": "AM/PM"},
-                    "options": ampm_options,
-                    "initial_option": end_ampm_initial,
+                    "type": "button",
+                    "text": {"type": "plain_text", "text": "Cancel announcement"},
+                    "action_id": "study_cancel",
+                    "value": session_id,
                 },
             ],
         },
     ]
-    return blocks
+
+
+@tracing.traced("blocks.cancelled")
+def _cancelled_message(original_text, status="Cancelled"):
+    """Return (text, blocks) for an announcement that has been cancelled (or has ended, for status="Ended")."""
+    # Use proper Slack markdown for strikethrough: ~text~
+    # Split the text and apply strikethrough to each line
+    lines = original_text.split('\n')
+    strikethrough_lines = [f"~{line}~" for line in lines]
+    cancelled_text = "\n".join(strikethrough_lines) + f" — {status}"
+    return cancelled_text, [
+        {
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": cancelled_text},
+        },
+    ]
+
+
+CANCELLED_TEXT = "Cancelled. Use `/study` again to share a new location."
+
+ALREADY_STUDYING_ERRORS = {
+    "location_block": "This overlaps another of your study sessions. Cancel that one first or pick other times.",
+}
+
+MODAL_SELECT_ACTION_IDS = (
+    "start_hour_input",
+    "start_minute_input",
+    "start_ampm_input",
+    "end_hour_input",
+    "end_minute_input",
+    "end_ampm_input",
+)
+
+WELCOME_TEXT = """👋 Welcome to Study Sessions!
+
+        Here's how to use this channel:
+
+        *Commands:*
+        • `/study` — Share where you're studying and for how long
+        • `/study list [location] [time range]` — See who's studying now, or e.g. `/study list langson 2-4pm`
+        • `/study stats [week|month|year|all]` — Busiest spots, busiest hours and study streaks
+        • Check the pinned message for the current study sessions
+
+        Happy studying! 📚"""
+
+# Rendered once (without the source indentation) and sent by the welcome queue for every new member;
+# who was welcomed is kept in memory until _attach_welcome_log opens WELCOME_DB_PATH
+welcomer = Welcomer(inspect.cleandoc(WELCOME_TEXT), WelcomeLog())
+
+
+def _attach_welcome_log():
+    """Remember welcomed members in WELCOME_DB_PATH (if set) from now on; call before the welcomer starts."""
+    if WELCOME_DB_PATH and not welcomer.log.path:
+        welcomer.log = WelcomeLog(WELCOME_DB_PATH)
+
+
+def _ended_message(original_text):
+    return _cancelled_message(original_text, "Ended")
+
+
+def _retracted_message(original_text, session):
+    """The struck-through announcement for a session that is gone: ended if its time is up, else cancelled."""
+    return _ended_message(original_text) if session["end_ts"] <= time.time() else _cancelled_message(original_text)
+
+
+def _reconcile_channels(client):
+    """Rebuild sessions from each channel's announcements and clean up pins left by earlier runs."""
+    for channel in channels:
+        try:
+            reconcile(client, channel, TIMEZONE, _ended_message)
+        except Exception:
+            logger.exception("Failed to reconcile pins in %s", channel.channel_id)
+
+
+def _register_gauges():
+    metrics.gauge("ctc_active_sessions", "Study sessions currently stored.", lambda: channels.count("store"))
+    metrics.gauge("ctc_outbox_pending", "Side-effect Web API calls waiting in the outbox.", lambda: outbox.pending() + async_outbox.pending())
+    metrics.gauge("ctc_welcome_backlog", "New members waiting for their welcome message.", welcomer.backlog)
+    if not SHARED_SESSION_DB:
+        metrics.gauge("ctc_scheduled_sessions", "Study sessions booked to start later.", lambda: channels.count("schedule"))
 
 
 def register_study_handlers(app):
     """Register /study, study_modal, and study_cancel with the Bolt app."""
 
-    def _open_already_studying_modal(trigger_id, session_id, session, client):
-        """Open modal prompting user to cancel their existing session."""
-        end_dt = datetime.fromtimestamp(session["end_ts"])
-        end_str = end_dt.strftime("%-I:%M %p") if os.name != "nt" else end_dt.strftime("%I:%M %p")
-        location = session["location"]
-        client.views_open(
-            trigger_id=trigger_id,
-            view={
-                "type": "modal",
-                "callback_id": "study_already_modal",
-                "title": {"type": "plain_text", "text": "Already studying"},
-                "close": {"type": "plain_text", "text": "Keep it"},
-                "submit": {"type": "plain_text", "text": "Cancel & create new"},
-                "private_metadata": session_id,
-                "blocks": [
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"You're already listed as studying at *{location}* (until ~{end_str}).\n\nCancel that announcement first, then you can share a new location.",
-                        },
-                    },
-                ],
-            },
-        )
-
     @app.command("/study")
+    @metrics.timed("cmd_study")
+    @tracing.traced("cmd_study", root=True)
     def cmd_study(ack, body, client, logger):
         try:
+            channel = channels.route(body.get("channel_id"), body.get("team_id"))
+            list_query = _list_query(body.get("text"))
+            if list_query is not None:
+                # Sent in the command's ack, so no Web API call
+                text, blocks = channel.session_list.response(list_query)
+                ack(text=text, blocks=blocks)
+                return
+            stats_query = _list_query(body.get("text"), "stats")
+            if stats_query is not None:
+                text, blocks = _study_stats_response(channel, stats_query, body["user_id"])
+                ack(text=text, blocks=blocks)
+                return
             ack()
             trigger_id = body.get("trigger_id")
             if not trigger_id:
                 logger.error("Missing trigger_id in /study payload")
                 return
             user_id = body["user_id"]
-            _clean_expired_sessions(client)
-            existing_sid, existing_session = _get_user_session(user_id)
+            channel.expiry_scheduler.expire_due()
+            existing_sid, existing_session = channel.get_user_session(user_id)
             if existing_sid is not None:
-                _open_already_studying_modal(trigger_id, existing_sid, existing_session, client)
+                client.views_open(trigger_id=trigger_id, view=_already_studying_view(existing_sid, existing_session))
                 return
-            result = client.views_open(
-                trigger_id=trigger_id,
-                view={
-                    "type": "modal",
-                    "callback_id": "study_modal",
-                    "title": {"type": "plain_text", "text": "Share study location"},
-                    "submit": {"type": "plain_text", "text": "Announce"},
-                    "blocks": _build_study_modal_blocks(),
-                },
-            )
+            result = client.views_open(trigger_id=trigger_id, view=_study_modal_view(channel))
             logger.info("Modal opened: %s", result)
         except Exception as e:
             logger.exception("Failed to open /study modal: %s", e)
@@ -277,284 +659,169 @@ def register_study_handlers(app):
     def _ack_modal_select(ack):
         ack()
 
-    for action_id in (
-        "start_hour_input",
-        "start_minute_input",
-        "start_ampm_input",
-        "end_hour_input",
-        "end_minute_input",
-        "end_ampm_input",
-    ):
+    for action_id in MODAL_SELECT_ACTION_IDS:
         app.action(action_id)(_ack_modal_select)
 
     @app.view("study_modal")
+    @metrics.timed("handle_study_modal_submit")
+    @tracing.traced("handle_study_modal_submit", root=True)
     def handle_study_modal_submit(ack, body, client, view):
-        ack()
-        _clean_expired_sessions(client)
-        user_id = body["user"]["id"]
-        user_name = body["user"].get("name", "Someone")
-
-        location_block = view["state"]["values"]["location_block"]
-        location = location_block["location_select"]["selected_option"]["value"]
-
-        other_block = view["state"]["values"]["other_location_block"]
-        other_raw = (other_block.get("other_location_input") or {}).get("value") or ""
-        other = other_raw.strip() if isinstance(other_raw, str) else ""
-        if location == "Other":
-            location = other or "Somewhere on campus"
-        elif other:
-            location = f"{location} — {other}"
-
-        studying_with_block = view["state"]["values"].get("studying_with_block") or {}
-        studying_with_obj = studying_with_block.get("studying_with_input") or {}
-        selected_user_ids = studying_with_obj.get("selected_users") or []
-        with_suffix = ""
-        if selected_user_ids:
-            with_suffix = " with " + " ".join(f"<@{uid}>" for uid in selected_user_ids) + " "
-
-        description_block = view["state"]["values"].get("description_block") or {}
-        description_raw = (description_block.get("description_input") or {}).get("value") or ""
-        description = description_raw.strip() if isinstance(description_raw, str) else ""
-
-        # Handle image upload
-        image_block = view["state"]["values"].get("image_block") or {}
-        image_obj = image_block.get("image_input") or {}
-        image_files = image_obj.get("files") or []
-        image_url = None
-        if image_files and len(image_files) > 0:
-            file_data = image_files[0]
-            # The file data from modal already contains permalink_public and url_private
-            permalink_public = file_data.get("permalink_public")
-            url_private = file_data.get("url_private")
-            if permalink_public and url_private:
-                # Extract the pub_secret from permalink_public and construct direct URL
-                # permalink_public format: https://slack-files.com/TEAM-FILE-PUBSECRET
-                # We need to use the url_private with ?pub_secret=PUBSECRET
-                pub_secret = permalink_public.split("-")[-1] if "-" in permalink_public else None
-                if pub_secret:
-                    image_url = f"{url_private}?pub_secret={pub_secret}"
-            print(f"[DEBUG] final image_url: {image_url}")
-
-        def _get_select(block_id, action_id, default=None):
-            obj = (view["state"]["values"].get(block_id) or {}).get(action_id) or {}
-            opt = obj.get("selected_option")
-            return opt.get("value") if opt else default
-
-        start_h = int(_get_select("start_time_actions", "start_hour_input") or 9)
-        start_m = int(_get_select("start_time_actions", "start_minute_input") or 0)
-        start_ampm = _get_select("start_time_actions", "start_ampm_input") or "AM"
-        end_h = int(_get_select("end_time_actions", "end_hour_input") or 5)
-        end_m = int(_get_select("end_time_actions", "end_minute_input") or 0)
-        end_ampm = _get_select("end_time_actions", "end_ampm_input") or "PM"
-
-        def _to_24(h, ampm):
-            if ampm == "AM":
-                return 0 if h == 12 else h
-            return 12 if h == 12 else h + 12
-
-        today = datetime.now().date()
-        start_dt = datetime.combine(
-            today,
-            datetime.strptime(f"{_to_24(start_h, start_ampm):02d}:{start_m:02d}", "%H:%M").time(),
-        )
-        end_dt = datetime.combine(
-            today,
-            datetime.strptime(f"{_to_24(end_h, end_ampm):02d}:{end_m:02d}", "%H:%M").time(),
-        )
-        if end_dt <= start_dt:
-            end_dt += timedelta(days=1)
-        end_ts = end_dt.timestamp()
-
+        submission = _parse_study_submission(body, view)
+        user_id = submission["user_id"]
         session_id = str(uuid.uuid4())
-        channel_id = STUDY_CHANNEL_ID
-        start_str = start_dt.strftime("%-I:%M %p") if os.name != "nt" else start_dt.strftime("%I:%M %p")
-        end_str = end_dt.strftime("%-I:%M %p") if os.name != "nt" else end_dt.strftime("%I:%M %p")
-        time_range = f"{start_str} – {end_str}"
-
-        active_sessions[session_id] = {
-            "user_id": user_id,
-            "user_name": user_name,
-            "location": location,
-            "end_ts": end_ts,
-            "image_url": image_url,
-        }
+        channel = channels.route(view.get("private_metadata"), (body.get("team") or {}).get("id"))
+        channel_id = channel.channel_id
+        session = _new_session(submission)
+        if channel_id:
+            session["channel_id"] = channel_id
+        # Atomic, so a double submit (or two open modals) can't announce twice
+        state = channel.reserve(session_id, session)
+        if state is None:
+            ack(response_action="errors", errors=ALREADY_STUDYING_ERRORS)
+            return
+        ack()
+        channel.expiry_scheduler.expire_due()
 
         if not channel_id:
             channel_id = client.conversations_open(users=[user_id])["channel"]["id"]
-            msg = (
-                f"✅ You're now listed as studying at *{location}* *{time_range}*. "
-                "Set `STUDY_CHANNEL_ID` in your app config to announce to a channel."
-            )
-            if description:
-                msg += f"\n_{description}_"
-            client.chat_postMessage(channel=channel_id, text=msg)
-        else:
-            msg = (
-                f"📍 <@{user_id}> is studying at *{location}*{with_suffix} *{time_range}*."
+            text = _scheduled_confirmation_text(submission) if state == SCHEDULED else _dm_confirmation_text(submission)
+            client.chat_postMessage(channel=channel_id, text=text)
+        elif state == SCHEDULED:
+            # Announced by _announce_started at start_ts; the Cancel button works until then too
+            outbox.submit(
+                user_id,
+                client.chat_postEphemeral,
+                channel=channel_id,
+                user=user_id,
+                text=_scheduled_confirmation_text(submission),
+                blocks=_cancel_prompt_blocks(session_id),
             )
-            blocks = [{"type": "section", "text": {"type": "mrkdwn", "text": msg}}]
-            if description:
-                blocks.append({
-                    "type": "section",
-                    "text": {"type": "mrkdwn", "text": f"_{description}_"},
-                })
-            if image_url:
-                blocks.append({"type": "divider"})
-                blocks.append({
-                    "type": "image",
-                    "image_url": image_url,
-                    "alt_text": f"Study spot photo from {user_name}",
-                    "block_id": "study_image_block",
-                })
-            full_text = f"{msg}\n_{description}_" if description else msg
-            if image_url:
-                full_text += f"\nPhoto attached"
-            result = client.chat_postMessage(
+        elif BOARD_MODE:
+            # The board picks the session up on its next update; just give the author a Cancel button
+            outbox.submit(
+                user_id,
+                client.chat_postEphemeral,
                 channel=channel_id,
-                text=full_text,
-                blocks=blocks,
+                user=user_id,
+                text=_board_confirmation_text(submission),
+                blocks=_cancel_prompt_blocks(session_id),
             )
-            active_sessions[session_id]["channel_id"] = channel_id
-            active_sessions[session_id]["message_ts"] = result["ts"]
-            active_sessions[session_id]["message_text"] = full_text
-            try:
-                client.pins_add(channel=channel_id, timestamp=result["ts"])
-            except Exception:
-                pass
-            # Ephemeral message: only the author sees the Cancel button
-            client.chat_postEphemeral(
+        else:
+            message_ts = _announce(client, channel, session_id, submission)
+            if message_ts is None:
+                return  # cancelled already, from another open modal
+            outbox.submit(
+                message_ts,
+                client.chat_postEphemeral,
                 channel=channel_id,
                 user=user_id,
                 text="Cancel your study announcement",
-                blocks=[
-                    {
-                        "type": "section",
-                        "text": {"type": "mrkdwn", "text": "Cancel your study announcement?"},
-                    },
-                    {
-                        "type": "actions",
-                        "block_id": "study_cancel_ephemeral_actions",
-                        "elements": [
-                            {
-                                "type": "button",
-                                "text": {"type": "plain_text", "text": "Cancel announcement"},
-                                "action_id": "study_cancel",
-                                "value": session_id,
-                            },
-                        ],
-                    },
-                ],
+                blocks=_cancel_prompt_blocks(session_id),
             )
 
-    def _update_message_cancelled(client, channel_id, message_ts, original_text):
-        # Use proper Slack markdown for strikethrough: ~text~
-        # Split the text and apply strikethrough to each line
-        lines = original_text.split('\n')
-        strikethrough_lines = [f"~{line}~" for line in lines]
-        cancelled_text = "\n".join(strikethrough_lines) + " — Cancelled"
-        client.chat_update(
+    def _retract_announcement(client, channel_id, message_ts, original_text):
+        """Queue the strikethrough edit, then the unpin, for a cancelled announcement."""
+        cancelled_text, blocks = _cancelled_message(original_text)
+        outbox.submit(
+            message_ts,
+            client.chat_update,
             channel=channel_id,
             ts=message_ts,
             text=cancelled_text,
-            blocks=[
-                {
-                    "type": "section",
-                    "text": {"type": "mrkdwn", "text": cancelled_text},
-                },
-            ],
+            blocks=blocks,
         )
+        outbox.submit(message_ts, client.pins_remove, channel=channel_id, timestamp=message_ts)
 
     @app.view("study_already_modal")
+    @metrics.timed("handle_study_already_submit")
+    @tracing.traced("handle_study_already_submit", root=True)
     def handle_study_already_submit(ack, body, client, view):
         ack()
         session_id = view.get("private_metadata")
-        if not session_id or session_id not in active_sessions:
+        channel = channels.for_session(session_id) if session_id else None
+        session = channel.pop_session(session_id) if channel is not None else None
+        if session is None:
             return
-        session = active_sessions[session_id]
         channel_id = session.get("channel_id")
         message_ts = session.get("message_ts")
         message_text = session.get("message_text", "")
         user_id = session["user_id"]
-        del active_sessions[session_id]
         if channel_id and message_ts:
-            _update_message_cancelled(client, channel_id, message_ts, message_text)
-            try:
-                client.pins_remove(channel=channel_id, timestamp=message_ts)
-            except Exception:
-                pass
+            _retract_announcement(client, channel_id, message_ts, message_text)
         channel_for_ephemeral = channel_id or body.get("container", {}).get("channel_id")
         if channel_for_ephemeral:
-            client.chat_postEphemeral(
+            outbox.submit(
+                message_ts or user_id,
+                client.chat_postEphemeral,
                 channel=channel_for_ephemeral,
                 user=user_id,
-                text="Cancelled. Use `/study` again to share a new location.",
+                text=CANCELLED_TEXT,
             )
         else:
             dm_channel = client.conversations_open(users=[user_id])["channel"]["id"]
             client.chat_postMessage(
                 channel=dm_channel,
-                text="Cancelled. Use `/study` again to share a new location.",
+                text=CANCELLED_TEXT,
             )
 
     @app.action("study_cancel")
+    @metrics.timed("handle_study_cancel")
+    @tracing.traced("handle_study_cancel", root=True)
     def handle_study_cancel(ack, body, client):
         ack()
         session_id = body["actions"][0]["value"]
         # Button may be on ephemeral message; use session to find the channel announcement
-        if session_id in active_sessions:
-            session = active_sessions[session_id]
+        channel = channels.for_session(session_id)
+        session = channel.pop_session(session_id) if channel is not None else None
+        if session is not None:
             channel_id = session.get("channel_id")
             message_ts = session.get("message_ts")
             message_text = session.get("message_text", "")
-            del active_sessions[session_id]
             if channel_id and message_ts:
-                _update_message_cancelled(client, channel_id, message_ts, message_text)
-                try:
-                    client.pins_remove(channel=channel_id, timestamp=message_ts)
-                except Exception:
-                    pass
+                _retract_announcement(client, channel_id, message_ts, message_text)
             # Confirm to the user (they see this in the ephemeral thread)
             user_id = session.get("user_id")
             if user_id and body.get("channel", {}).get("id"):
-                client.chat_postEphemeral(
+                outbox.submit(
+                    message_ts or user_id,
+                    client.chat_postEphemeral,
                     channel=body["channel"]["id"],
                     user=user_id,
-                    text="Cancelled. Use `/study` again to share a new location.",
+                    text=CANCELLED_TEXT,
                 )
 
     @app.event("member_joined_channel")
-    def handle_member_joined_channel(event, client, logger):
-        """Send instructions to users when they join the study channel."""
-        # Only send in the study channel
-        if event.get("channel") != STUDY_CHANNEL_ID:
+    @metrics.timed("handle_member_joined_channel")
+    @tracing.traced("handle_member_joined_channel", root=True)
+    def handle_member_joined_channel(event):
+        """Queue instructions for users joining a study channel; sent by the welcomer in the background."""
+        channel_id = event.get("channel")
+        if not channel_id or channels.get(channel_id) is None:
             return
-        
-        user_id = event.get("user")
-        
-        instructions = """👋 Welcome to Study Sessions!
-
-        Here's how to use this channel:
-
-        *Commands:*
-        • `/study` — Share where you're studying and for how long
-        • Check the pinned message for the current study sessions
-
-        Happy studying! 📚"""
-        
-        try:
-            client.chat_postEphemeral(
-                channel=STUDY_CHANNEL_ID,
-                user=user_id,
-                text=instructions,
-            )
-        except Exception as e:
-            logger.error(f"Failed to send welcome message: {e}")
+        welcomer.enqueue(channel_id, event.get("user"))
 
     @app.event("app_mention")
     def handle_app_mention(event, client):
         """Handle when the bot is mentioned."""
         pass
 
-    # Start background thread to unpin expired sessions every 60s
-    t = threading.Thread(target=_expiry_cleanup_loop, daemon=True)
-    t.start()
+    outbox.start()
+    for channel in channels:
+        channel.open_history()
+    _attach_persistence()
+    _attach_welcome_log()
+    welcomer.start(app.client)
+    _register_gauges()
+    for board in _attach_board():
+        board.start(app.client)
+    if RECONCILE_ON_START:
+        # A few paginated reads per channel; the cleanup it queues is paced by the client's rate limits
+        threading.Thread(target=_reconcile_channels, args=(app.client,), name="pin-reconcile", daemon=True).start()
+
+    # Per channel: unpin sessions as they expire, announce scheduled ones as they start
+    for channel in channels:
+        channel.expiry_scheduler.on_expired = lambda expired: _unpin_expired(app.client, expired)
+        channel.expiry_scheduler.start()
+        if channel.start_scheduler is not None:
+            channel.start_scheduler.on_expired = partial(_announce_started, app.client, channel)
+            channel.start_scheduler.start()
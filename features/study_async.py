@@ -0,0 +1,298 @@
+"""Asyncio port of the study handlers, for running under AsyncApp (see ASYNC_MODE in app.py)."""
+import asyncio
+import logging
+import uuid
+
+from features import metrics, tracing
+from features.expiry import AsyncExpiryScheduler
+from features.outbox import async_outbox
+from features.study import (
+    ALREADY_STUDYING_ERRORS,
+    BOARD_MODE,
+    SCHEDULED,
+    CANCELLED_TEXT,
+    SHARED_SESSION_DB,
+    MODAL_SELECT_ACTION_IDS,
+    _already_studying_view,
+    _announcement_message,
+    _attach_board,
+    _attach_persistence,
+    _attach_welcome_log,
+    _board_confirmation_text,
+    _register_gauges,
+    _cancel_prompt_blocks,
+    _cancelled_message,
+    _dm_confirmation_text,
+    _ended_message,
+    _list_query,
+    _new_session,
+    _parse_study_submission,
+    _retracted_message,
+    _scheduled_confirmation_text,
+    _study_stats_response,
+    _study_modal_view,
+    TIMEZONE,
+    channels,
+    welcomer,
+)
+from features.reconcile import RECONCILE_ON_START, reconcile_async
+
+logger = logging.getLogger(__name__)
+
+
+async def _store_call(fn, *args, **kwargs):
+    """Call a session-store method from a handler without holding up the event loop.
+
+    With SHARED_SESSION_DB every call is a SQLite query that may wait out
+    another replica's write lock, so it runs on a worker thread. The
+    in-memory store answers under a shard lock (WriteBehind only queues its
+    writes), which isn't worth the thread hop.
+    """
+    if SHARED_SESSION_DB:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+async def _reconcile_channels(client):
+    for channel in channels:
+        try:
+            await reconcile_async(client, channel, TIMEZONE, _ended_message)
+        except Exception:
+            logger.exception("Failed to reconcile pins in %s", channel.channel_id)
+
+
+async def _unpin_expired(client, expired):
+    """Queue unpins for the announcements of [(session_id, session)] that have ended."""
+    for _, s in expired:
+        if s.get("channel_id") and s.get("message_ts"):
+            async_outbox.submit(s["message_ts"], client.pins_remove, channel=s["channel_id"], timestamp=s["message_ts"])
+
+
+async def _announce(client, channel, session_id, submission):
+    """Post a session's announcement in its channel, record it on the session and queue the pin; return its ts.
+
+    Like features.study._announce, a session that's gone by the time this
+    runs isn't announced, or is struck through if it went while posting.
+    """
+    if await _store_call(channel.store.get, session_id) is None:
+        return None
+    full_text, blocks = _announcement_message(submission)
+    result = await client.chat_postMessage(channel=channel.channel_id, text=full_text, blocks=blocks)
+    updated = await _store_call(
+        channel.store.update, session_id, channel_id=channel.channel_id, message_ts=result["ts"], message_text=full_text
+    )
+    if updated is None:
+        gone_text, gone_blocks = _retracted_message(full_text, submission)
+        async_outbox.submit(result["ts"], client.chat_update, channel=channel.channel_id, ts=result["ts"], text=gone_text, blocks=gone_blocks)
+        return None
+    async_outbox.submit(result["ts"], client.pins_add, channel=channel.channel_id, timestamp=result["ts"])
+    return result["ts"]
+
+
+async def _announce_started(client, channel, started):
+    """Queue announcements for a channel's scheduled [(session_id, session)] whose start has come.
+
+    One attempt each (bar 429s): a post that timed out may still have gone through, and a retry would announce twice.
+    """
+    if BOARD_MODE or not channel.channel_id:
+        return
+    for session_id, session in started:
+        async_outbox.submit_once(session_id, _announce, client, channel, session_id, session)
+
+
+# channel_id -> AsyncExpiryScheduler, set by start_expiry_task
+expiry_schedulers = {}
+start_schedulers = {}
+# The loop only keeps weak references to tasks
+_background_tasks = set()
+
+
+async def _clean_expired_sessions(channel):
+    scheduler = expiry_schedulers.get(channel.channel_id)
+    if scheduler is not None:
+        await scheduler.expire_due()
+
+
+def start_expiry_task(client):
+    """Start every channel's timers (and live boards in BOARD_MODE) on the running loop; return the expiry tasks."""
+    for channel in channels:
+        channel.open_history()
+    _attach_persistence()
+    _attach_welcome_log()
+    _register_gauges()
+    _background_tasks.add(welcomer.start_async(client))
+    for board in _attach_board():
+        board.start_async(client)
+    if RECONCILE_ON_START:
+        _background_tasks.add(asyncio.get_running_loop().create_task(_reconcile_channels(client)))
+
+    async def on_expired(expired):
+        await _unpin_expired(client, expired)
+
+    tasks = []
+    for channel in channels:
+        if channel.schedule is not None:
+            async def on_started(started, channel=channel):
+                await _announce_started(client, channel, started)
+
+            start_schedulers[channel.channel_id] = AsyncExpiryScheduler(channel.schedule, on_started, observe=None)
+            start_schedulers[channel.channel_id].start()
+        expiry_schedulers[channel.channel_id] = AsyncExpiryScheduler(channel.store, on_expired, lease=channel.lease)
+        tasks.append(expiry_schedulers[channel.channel_id].start())
+    return tasks
+
+
+def register_async_study_handlers(app):
+    """Register /study, study_modal, and study_cancel with an AsyncApp.
+
+    Call start_expiry_task(app.client) once the event loop is running.
+    """
+
+    @app.command("/study")
+    @metrics.timed("cmd_study")
+    @tracing.traced("cmd_study", root=True)
+    async def cmd_study(ack, body, client, logger):
+        try:
+            channel = channels.route(body.get("channel_id"), body.get("team_id"))
+            list_query = _list_query(body.get("text"))
+            if list_query is not None:
+                text, blocks = await _store_call(channel.session_list.response, list_query)
+                await ack(text=text, blocks=blocks)
+                return
+            stats_query = _list_query(body.get("text"), "stats")
+            if stats_query is not None:
+                text, blocks = _study_stats_response(channel, stats_query, body["user_id"])
+                await ack(text=text, blocks=blocks)
+                return
+            await ack()
+            trigger_id = body.get("trigger_id")
+            if not trigger_id:
+                logger.error("Missing trigger_id in /study payload")
+                return
+            user_id = body["user_id"]
+            await _clean_expired_sessions(channel)
+            existing_sid, existing_session = await _store_call(channel.get_user_session, user_id)
+            if existing_sid is not None:
+                await client.views_open(trigger_id=trigger_id, view=_already_studying_view(existing_sid, existing_session))
+                return
+            result = await client.views_open(trigger_id=trigger_id, view=_study_modal_view(channel))
+            logger.info("Modal opened: %s", result)
+        except Exception as e:
+            logger.exception("Failed to open /study modal: %s", e)
+            raise
+
+    async def _ack_modal_select(ack):
+        await ack()
+
+    for action_id in MODAL_SELECT_ACTION_IDS:
+        app.action(action_id)(_ack_modal_select)
+
+    @app.view("study_modal")
+    @metrics.timed("handle_study_modal_submit")
+    @tracing.traced("handle_study_modal_submit", root=True)
+    async def handle_study_modal_submit(ack, body, client, view):
+        submission = _parse_study_submission(body, view)
+        user_id = submission["user_id"]
+        session_id = str(uuid.uuid4())
+        channel = channels.route(view.get("private_metadata"), (body.get("team") or {}).get("id"))
+        channel_id = channel.channel_id
+        session = _new_session(submission)
+        if channel_id:
+            session["channel_id"] = channel_id
+        state = await _store_call(channel.reserve, session_id, session)
+        if state is None:
+            await ack(response_action="errors", errors=ALREADY_STUDYING_ERRORS)
+            return
+        await ack()
+        await _clean_expired_sessions(channel)
+
+        if not channel_id:
+            channel_id = (await client.conversations_open(users=[user_id]))["channel"]["id"]
+            text = _scheduled_confirmation_text(submission) if state == SCHEDULED else _dm_confirmation_text(submission)
+            await client.chat_postMessage(channel=channel_id, text=text)
+            return
+        if state == SCHEDULED:
+            await client.chat_postEphemeral(
+                channel=channel_id,
+                user=user_id,
+                text=_scheduled_confirmation_text(submission),
+                blocks=_cancel_prompt_blocks(session_id),
+            )
+            return
+        if BOARD_MODE:
+            await client.chat_postEphemeral(
+                channel=channel_id,
+                user=user_id,
+                text=_board_confirmation_text(submission),
+                blocks=_cancel_prompt_blocks(session_id),
+            )
+            return
+
+        # The pin is queued by _announce and doesn't hold up the author's Cancel prompt
+        if await _announce(client, channel, session_id, submission) is None:
+            return  # cancelled already, from another open modal
+        await client.chat_postEphemeral(
+            channel=channel_id,
+            user=user_id,
+            text="Cancel your study announcement",
+            blocks=_cancel_prompt_blocks(session_id),
+        )
+
+    def _retract_announcement(client, session):
+        """Queue the strikethrough edit, then the unpin, for the session's announcement (after its pin)."""
+        channel_id = session.get("channel_id")
+        message_ts = session.get("message_ts")
+        if not (channel_id and message_ts):
+            return
+        cancelled_text, blocks = _cancelled_message(session.get("message_text", ""))
+        async_outbox.submit(message_ts, client.chat_update, channel=channel_id, ts=message_ts, text=cancelled_text, blocks=blocks)
+        async_outbox.submit(message_ts, client.pins_remove, channel=channel_id, timestamp=message_ts)
+
+    @app.view("study_already_modal")
+    @metrics.timed("handle_study_already_submit")
+    @tracing.traced("handle_study_already_submit", root=True)
+    async def handle_study_already_submit(ack, body, client, view):
+        await ack()
+        session_id = view.get("private_metadata")
+        channel = await _store_call(channels.for_session, session_id) if session_id else None
+        session = await _store_call(channel.pop_session, session_id) if channel is not None else None
+        if session is None:
+            return
+        user_id = session["user_id"]
+        _retract_announcement(client, session)
+        channel_for_ephemeral = session.get("channel_id") or body.get("container", {}).get("channel_id")
+        if channel_for_ephemeral:
+            await client.chat_postEphemeral(channel=channel_for_ephemeral, user=user_id, text=CANCELLED_TEXT)
+        else:
+            dm_channel = (await client.conversations_open(users=[user_id]))["channel"]["id"]
+            await client.chat_postMessage(channel=dm_channel, text=CANCELLED_TEXT)
+
+    @app.action("study_cancel")
+    @metrics.timed("handle_study_cancel")
+    @tracing.traced("handle_study_cancel", root=True)
+    async def handle_study_cancel(ack, body, client):
+        await ack()
+        session_id = body["actions"][0]["value"]
+        channel = await _store_call(channels.for_session, session_id)
+        session = await _store_call(channel.pop_session, session_id) if channel is not None else None
+        if session is None:
+            return
+        _retract_announcement(client, session)
+        user_id = session.get("user_id")
+        if user_id and body.get("channel", {}).get("id"):
+            await client.chat_postEphemeral(channel=body["channel"]["id"], user=user_id, text=CANCELLED_TEXT)
+
+    @app.event("member_joined_channel")
+    @metrics.timed("handle_member_joined_channel")
+    @tracing.traced("handle_member_joined_channel", root=True)
+    async def handle_member_joined_channel(event):
+        """Queue instructions for users joining a study channel; sent by the welcomer in the background."""
+        channel_id = event.get("channel")
+        if not channel_id or channels.get(channel_id) is None:
+            return
+        welcomer.enqueue(channel_id, event.get("user"))
+
+    @app.event("app_mention")
+    async def handle_app_mention(event, client):
+        """Handle when the bot is mentioned."""
+        pass
@@ -0,0 +1,236 @@
+"""Opt-in per-request trace spans, written as JSON lines to a rotating local file.
+
+Enabled by setting TRACE_PATH. Each listener run is a trace: its root span
+and one child per store lookup, modal/block build and Web API call made on
+its behalf (outbox calls included, whenever they run). Every finished span
+is one line, {"trace", "span", "parent", "name", "start", "ms", "thread",
+...attributes}, so a slow request's tree is a `grep <trace id>` away.
+When disabled, traced() returns the function unchanged and span() returns
+a shared no-op after one flag check.
+"""
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+enabled = bool(os.environ.get("TRACE_PATH"))
+
+# Fraction of listener runs traced; the rest cost one random() call
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "1"))
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", str(20 * 2**20)))
+TRACE_BACKUPS = int(os.environ.get("TRACE_BACKUPS", "5"))
+
+# The innermost open span of the current thread or task; _UNSAMPLED under a root that wasn't sampled
+_current = contextvars.ContextVar("trace_span", default=None)
+_UNSAMPLED = object()
+
+logger = logging.getLogger(__name__)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Unsampled(_NullSpan):
+    """Marks a root that wasn't sampled, so the spans under it are skipped too."""
+
+    def __enter__(self):
+        self._token = _current.set(_UNSAMPLED)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+
+class Span:
+    """A timed operation; entering makes it the parent of spans opened in the same thread or task."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "start", "_t0", "_token")
+
+    def __init__(self, name, parent, attrs):
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(64):016x}"
+        self.span_id = f"{random.getrandbits(32):08x}"
+        self.parent_id = parent.span_id if parent is not None else None
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._t0
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _emit(self, elapsed)
+        return False
+
+
+def span(name, root=False, **attrs):
+    """Context manager timing `name` as a child of the current span.
+
+    Outside a trace it does nothing, unless root=True starts one (subject
+    to TRACE_SAMPLE_RATE), so shared code called from timers isn't traced.
+    """
+    if not enabled:
+        return _NULL_SPAN
+    parent = _current.get()
+    if parent is _UNSAMPLED:
+        return _NULL_SPAN
+    if parent is None:
+        if not root:
+            return _NULL_SPAN
+        if TRACE_SAMPLE_RATE < 1 and random.random() >= TRACE_SAMPLE_RATE:
+            return _Unsampled()
+    return Span(name, parent, attrs)
+
+
+def traced(name, root=False):
+    """Decorator running a function (or coroutine function) inside span(name); a no-op when tracing is disabled."""
+
+    def decorator(fn):
+        if not enabled:
+            return fn
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, root=root):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, root=root):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def current_context():
+    """The caller's context if it's inside a trace, for running deferred work (outbox calls) under the same parent."""
+    if enabled and _current.get() not in (None, _UNSAMPLED):
+        return contextvars.copy_context()
+    return None
+
+
+def _emit(s, elapsed):
+    # Serialized on the writer thread; the request thread only builds the dict
+    record = {
+        "trace": s.trace_id,
+        "span": s.span_id,
+        "parent": s.parent_id,
+        "name": s.name,
+        "start": round(s.start, 6),
+        "ms": round(elapsed * 1000, 3),
+        "thread": threading.current_thread().name,
+    }
+    record.update(s.attrs)
+    _writer.records.put(record)
+
+
+class _SpanWriter:
+    """Drains finished spans to TRACE_PATH, rotating it to .1 ... .TRACE_BACKUPS past TRACE_MAX_BYTES."""
+
+    def __init__(self, path, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.records = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._file = None
+        self._thread = None
+        # Never set; waiting on it rather than time.sleep() lets the profiler see the thread as idle
+        self._pause = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Write every span queued so far, on the calling thread."""
+        with self._lock:
+            self._drain()
+            if self._file is not None:
+                self._file.flush()
+
+    def _drain(self, first=None):
+        lines = [] if first is None else [json.dumps(first, default=str)]
+        while True:
+            try:
+                lines.append(json.dumps(self.records.get_nowait(), default=str))
+            except queue.Empty:
+                break
+        if not lines:
+            return
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write("\n".join(lines) + "\n")
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _run(self):
+        while True:
+            # Block for the first span, then write whatever else has queued up with it
+            first = self.records.get()
+            with self._lock:
+                try:
+                    self._drain(first)
+                    if self._file is not None:
+                        self._file.flush()
+                except Exception:
+                    logger.exception("Failed to write trace spans to %s", self.path)
+            self._pause.wait(0.2)
+
+
+_writer = _SpanWriter(os.environ.get("TRACE_PATH", ""))
+
+
+def flush():
+    """Write out every span recorded so far (tests, benchmarks and exit)."""
+    if enabled:
+        _writer.flush()
+
+
+if enabled:
+    _writer.start()
+    atexit.register(flush)
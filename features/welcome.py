@@ -0,0 +1,234 @@
+"""Welcome messages for new channel members, deduplicated and drained at a fixed pace.
+
+When a cohort is invited, hundreds of member_joined_channel events arrive
+within seconds. The handler only enqueues the join; a background worker
+posts the pre-rendered ephemeral at WELCOME_RATE per minute, by default
+WELCOME_SHARE of chat.postEphemeral's own budget, so the rest stays free for
+the confirmations and Cancel prompts /study sends with it. Users already
+welcomed to a channel (remembered in WELCOME_DB_PATH, most recent
+WELCOME_MAX_USERS) or already queued are skipped, and joins beyond
+WELCOME_MAX_PENDING are dropped and counted.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+from features import metrics
+from features.ratelimit import DEFAULT_TIER, METHOD_TIERS, TIER_LIMITS
+
+logger = logging.getLogger(__name__)
+
+# SQLite file remembering who has been welcomed (default: the session database; empty keeps it in memory)
+WELCOME_DB_PATH = os.environ.get("WELCOME_DB_PATH", os.environ.get("SESSION_DB_PATH", "sessions.db"))
+WELCOME_MAX_USERS = int(os.environ.get("WELCOME_MAX_USERS", "50000"))
+WELCOME_MAX_PENDING = int(os.environ.get("WELCOME_MAX_PENDING", "2000"))
+# Welcomes per minute; unset, WELCOME_SHARE of chat.postEphemeral's per-method budget (the client's, if it paces calls)
+WELCOME_RATE = float(os.environ.get("WELCOME_RATE") or 0)
+WELCOME_SHARE = float(os.environ.get("WELCOME_SHARE", "0.3"))
+# Joins taken off the queue per pass; the record of who was welcomed is written once per batch
+_BATCH_SIZE = 20
+
+
+class WelcomeLog:
+    """Bounded record of (channel_id, user_id) pairs already welcomed, oldest forgotten first.
+
+    Kept in memory for lookups and, with a path, in a `welcomed` table of
+    that SQLite file so restarts don't welcome anyone twice.
+    """
+
+    def __init__(self, path="", max_users=WELCOME_MAX_USERS):
+        self.path = path
+        self.max_users = max_users
+        self._welcomed = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS welcomed ("
+                " channel_id TEXT NOT NULL, user_id TEXT NOT NULL, welcomed_at REAL NOT NULL,"
+                " PRIMARY KEY (channel_id, user_id))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS welcomed_at ON welcomed (welcomed_at)")
+            rows = self._conn.execute(
+                "SELECT channel_id, user_id FROM welcomed ORDER BY welcomed_at DESC LIMIT ?", (max_users,)
+            ).fetchall()
+            for channel_id, user_id in reversed(rows):
+                self._welcomed[(channel_id, user_id)] = None
+
+    def __len__(self):
+        return len(self._welcomed)
+
+    def __contains__(self, key):
+        return key in self._welcomed
+
+    def add_many(self, keys, now=None):
+        """Record [(channel_id, user_id)] as welcomed, in one transaction, and forget the oldest past max_users."""
+        now = time.time() if now is None else now
+        with self._lock:
+            for key in keys:
+                self._welcomed[key] = None
+                self._welcomed.move_to_end(key)
+            overflow = max(0, len(self._welcomed) - self.max_users)
+            for _ in range(overflow):
+                self._welcomed.popitem(last=False)
+            if self._conn is None:
+                return
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO welcomed (channel_id, user_id, welcomed_at) VALUES (?, ?, ?)",
+                    [(c, u, now) for c, u in keys],
+                )
+                if overflow:
+                    self._conn.execute(
+                        "DELETE FROM welcomed WHERE rowid IN (SELECT rowid FROM welcomed ORDER BY welcomed_at LIMIT ?)",
+                        (overflow,),
+                    )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                logger.exception("Failed to record %d welcome(s)", len(keys))
+
+
+class Welcomer:
+    """Queue of joins to welcome, drained by start() (a thread) or start_async() (a task) at `rate` per minute.
+
+    Without a rate, it's WELCOME_SHARE of chat.postEphemeral's budget on the client it's started with.
+    """
+
+    def __init__(self, text, log, rate=WELCOME_RATE, max_pending=WELCOME_MAX_PENDING):
+        self.text = text
+        self.log = log
+        self.rate = rate
+        self.max_pending = max_pending
+        self.sent = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.failed = 0
+        self._pending = deque()
+        self._queued = set()
+        self._cond = threading.Condition()
+        self._wake = None
+        self._started = False
+
+    def backlog(self):
+        return len(self._pending)
+
+    def stats(self):
+        return {
+            "backlog": len(self._pending),
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def enqueue(self, channel_id, user_id):
+        """Queue a welcome unless the user was already welcomed to or queued for the channel; False if not queued."""
+        key = (channel_id, user_id)
+        with self._cond:
+            if key in self.log or key in self._queued:
+                self.skipped += 1
+                metrics.observe_welcome("skipped")
+                return False
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                metrics.observe_welcome("dropped")
+                logger.warning("Welcome queue full (%d); not welcoming %s", self.max_pending, user_id)
+                return False
+            self._pending.append(key)
+            self._queued.add(key)
+            self._cond.notify()
+        if self._wake is not None:
+            self._wake()
+        return True
+
+    def _interval(self, client):
+        """Seconds between welcomes, read once per batch so it follows the client's current limits."""
+        if self.rate:
+            return 60.0 / self.rate
+        limits = getattr(client, "tier_limits", TIER_LIMITS)
+        return 60.0 / (limits[METHOD_TIERS.get("chat.postEphemeral", DEFAULT_TIER)] * WELCOME_SHARE)
+
+    def start(self, client):
+        """Drain the queue on a background thread through a WebClient."""
+        if not self._started:
+            self._started = True
+            threading.Thread(target=self._run, args=(client,), name="welcome", daemon=True).start()
+
+    def start_async(self, client):
+        """Drain the queue on a task of the running loop through an AsyncWebClient; returns the task."""
+        self._started = True
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        self._wake = lambda: loop.call_soon_threadsafe(event.set)
+        return asyncio.create_task(self._run_async(client, event))
+
+    def _take_batch(self):
+        with self._cond:
+            return [self._pending.popleft() for _ in range(min(_BATCH_SIZE, len(self._pending)))]
+
+    def _finish(self, batch, welcomed):
+        self.log.add_many(welcomed)
+        with self._cond:
+            self._queued.difference_update(batch)
+
+    def _outcome(self, user_id, error):
+        """Count a send; True if it went out and the user should be recorded as welcomed."""
+        if error is None:
+            self.sent += 1
+            metrics.observe_welcome("sent")
+            return True
+        self.failed += 1
+        metrics.observe_welcome("failed")
+        logger.error("Failed to send welcome message to %s: %s", user_id, error)
+        # Not recorded, so the user is welcomed if they join again
+        return False
+
+    def _run(self, client):
+        next_at = time.monotonic()
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+            batch = self._take_batch()
+            interval = self._interval(client)
+            welcomed = []
+            for channel_id, user_id in batch:
+                time.sleep(max(0.0, next_at - time.monotonic()))
+                next_at = max(next_at, time.monotonic()) + interval
+                try:
+                    client.chat_postEphemeral(channel=channel_id, user=user_id, text=self.text)
+                    error = None
+                except Exception as e:
+                    error = e
+                if self._outcome(user_id, error):
+                    welcomed.append((channel_id, user_id))
+            self._finish(batch, welcomed)
+
+    async def _run_async(self, client, event):
+        next_at = time.monotonic()
+        while True:
+            if not self._pending:
+                event.clear()
+                await event.wait()
+                continue
+            batch = self._take_batch()
+            interval = self._interval(client)
+            welcomed = []
+            for channel_id, user_id in batch:
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+                next_at = max(next_at, time.monotonic()) + interval
+                try:
+                    await client.chat_postEphemeral(channel=channel_id, user=user_id, text=self.text)
+                    error = None
+                except Exception as e:
+                    error = e
+                if self._outcome(user_id, error):
+                    welcomed.append((channel_id, user_id))
+            self._finish(batch, welcomed)
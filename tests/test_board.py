@@ -0,0 +1,145 @@
+"""The pinned board: sections re-rendered only where something changed, and updates coalesced."""
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+from features.board import StudyBoard, location_section
+from features.persistence import SQLiteSessionBackend
+from features.sessions import SessionStore
+
+LOCATIONS = ["Langson Library", "Science Library", "Other"]
+
+
+class _Client:
+    def __init__(self):
+        self.calls = []
+        self.fail_update = None
+        self._lock = threading.Lock()
+
+    def _record(self, method, **kwargs):
+        with self._lock:
+            self.calls.append((method, kwargs))
+
+    def chat_postMessage(self, **kwargs):
+        self._record("chat.postMessage", **kwargs)
+        return {"ts": f"{len(self.calls)}.0"}
+
+    def chat_update(self, **kwargs):
+        self._record("chat.update", **kwargs)
+        if self.fail_update:
+            response = SlackResponse(
+                client=None, http_verb="POST", api_url="", req_args={}, data={"ok": False, "error": self.fail_update},
+                headers={}, status_code=200,
+            )
+            raise SlackApiError("failed", response)
+
+    def pins_add(self, **kwargs):
+        self._record("pins.add", **kwargs)
+
+    def methods(self):
+        with self._lock:
+            return [method for method, _ in self.calls]
+
+
+def _session(user_id, location, end_ts=2e9):
+    return {"user_id": user_id, "location": location, "base_location": location, "end_ts": end_ts}
+
+
+def _board(store, **kwargs):
+    board = StudyBoard(store, LOCATIONS, lambda s: f"• {s['user_id']}", "C1", **kwargs)
+    store.change_listeners.append(board.on_change)
+    return board
+
+
+def _text(call):
+    return " ".join(block["text"]["text"] for block in call[1]["blocks"] if block["type"] == "section")
+
+
+def test_section_lists_soonest_ending_first_and_truncates():
+    sessions = [_session(f"U{i}", "Langson Library", end_ts=100 - i) for i in range(5)]
+    count, block = location_section("Langson Library", sessions, lambda s: s["user_id"], max_lines=3)
+    assert count == 5
+    assert block["text"]["text"] == "*Langson Library* (5)\nU4\nU3\nU2\n…and 2 more"
+    assert location_section("Langson Library", [], str, 3) is None
+
+
+def test_first_publish_posts_and_pins_then_updates_in_place(tmp_path):
+    meta = SQLiteSessionBackend(str(tmp_path / "sessions.db"))
+    store = SessionStore()
+    client = _Client()
+    board = _board(store, meta=meta)
+    store.add("s1", _session("U1", "Langson Library"))
+    board.publish(client)
+    assert client.methods() == ["chat.postMessage", "pins.add"]
+    assert meta.get_meta("board_message_ts") == board.message_ts == "1.0"
+
+    board.publish(client)  # nothing changed
+    store.add("s2", _session("U2", "Science Library"))
+    board.publish(client)
+    assert client.methods() == ["chat.postMessage", "pins.add", "chat.update"]
+    assert "U1" in _text(client.calls[-1]) and "U2" in _text(client.calls[-1])
+    # A restart keeps editing the same message
+    assert _board(SessionStore(), meta=meta).message_ts == "1.0"
+
+
+def test_only_dirty_locations_are_re_rendered():
+    store = SessionStore()
+    client = _Client()
+    board = _board(store)
+    store.add("s1", _session("U1", "Langson Library"))
+    board.publish(client)
+    # Changed behind the board's back: the cached section stands until the location is marked dirty
+    store.change_listeners.remove(board.on_change)
+    store.add("s2", _session("U2", "Langson Library"))
+    store.change_listeners.append(board.on_change)
+    store.add("s3", _session("U3", "Science Library"))
+    board.publish(client)
+    assert "U2" not in _text(client.calls[-1]) and "U3" in _text(client.calls[-1])
+    board.mark_dirty("Langson Library")
+    board.publish(client)
+    assert "U2" in _text(client.calls[-1])
+
+
+def test_unknown_locations_are_listed_under_the_last_one():
+    store = SessionStore()
+    client = _Client()
+    board = _board(store)
+    store.add("s1", _session("U1", "Anteater Recreation Center"))
+    board.publish(client)
+    assert "*Other* (1)" in _text(client.calls[0])
+
+
+def test_a_deleted_board_is_posted_again_and_other_failures_retry():
+    store = SessionStore()
+    client = _Client()
+    board = _board(store)
+    store.add("s1", _session("U1", "Langson Library"))
+    board.publish(client)
+    client.fail_update = "ratelimited"
+    store.add("s2", _session("U2", "Science Library"))
+    board.publish(client)
+    assert client.methods()[-1] == "chat.update"
+    # The failed render's locations are still dirty, so the next publish retries them
+    client.fail_update = "message_not_found"
+    board.publish(client)
+    assert client.methods()[-3:] == ["chat.update", "chat.postMessage", "pins.add"]
+    assert "U2" in _text(client.calls[-2])
+
+
+def test_a_burst_of_changes_is_one_update_per_interval():
+    store = SessionStore()
+    client = _Client()
+    board = _board(store, interval=0.3)
+    board.start(client)
+    deadline = time.monotonic() + 5
+    while client.methods() != ["chat.postMessage", "pins.add"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    for i in range(200):
+        store.add(f"s{i}", _session(f"U{i}", LOCATIONS[i % 2]))
+    time.sleep(1.0)
+    updates = client.methods().count("chat.update")
+    assert 1 <= updates <= 2
+    assert "(100)" in _text(client.calls[-1])
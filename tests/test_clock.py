@@ -0,0 +1,145 @@
+"""Property tests for features.clock against strptime/strftime and pytz."""
+import bisect
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+import pytz
+
+from features.clock import LABELS, TO_24, LocalClock, clock_minute, parse_label
+
+# Northern and southern DST, a 30-minute DST shift, and a zone without DST at a :45 offset
+TIMEZONES = ["America/Los_Angeles", "Australia/Sydney", "Australia/Lord_Howe", "Asia/Kathmandu"]
+YEAR = 365 * 86400
+# Fixed, so a failure reproduces
+NOW = datetime(2026, 6, 1, tzinfo=pytz.utc).timestamp()
+
+
+def _strftime_label(dt):
+    return dt.strftime("%I:%M %p").lstrip("0")
+
+
+def _reference_at(tz, day, minute):
+    naive = datetime.strptime(f"{day} {minute // 60:02d}:{minute % 60:02d}", "%Y-%m-%d %H:%M")
+    try:
+        return tz.localize(naive, is_dst=None).timestamp()
+    except pytz.AmbiguousTimeError:
+        return tz.localize(naive, is_dst=True).timestamp()
+    except pytz.NonExistentTimeError:
+        return tz.localize(naive, is_dst=False).timestamp()
+
+
+def _reference_window(tz, start, end, now):
+    today = datetime.fromtimestamp(now, tz).date()
+    end_day = today if end > start else today + timedelta(days=1)
+    start_ts, end_ts = _reference_at(tz, today, start), _reference_at(tz, end_day, end)
+    if end_ts <= now:
+        start_ts = _reference_at(tz, today + timedelta(days=1), start)
+        end_ts = _reference_at(tz, end_day + timedelta(days=1), end)
+    return start_ts, end_ts
+
+
+def _sample_times(tz, rng, n=1500):
+    """Random times over four years, every few minutes around each DST change, and around local midnights."""
+    times = [NOW + rng.uniform(-2 * YEAR, 2 * YEAR) for _ in range(n)]
+    transitions = getattr(tz, "_utc_transition_times", [])
+    lo = bisect.bisect(transitions, datetime.fromtimestamp(NOW - 2 * YEAR, timezone.utc).replace(tzinfo=None))
+    hi = bisect.bisect(transitions, datetime.fromtimestamp(NOW + 2 * YEAR, timezone.utc).replace(tzinfo=None))
+    for change in transitions[lo:hi]:
+        at = (change - datetime(1970, 1, 1)).total_seconds()
+        times.extend(at + minute * 60 + rng.uniform(0, 60) for minute in range(-150, 150, 7))
+    for _ in range(n // 10):
+        day = datetime.fromtimestamp(NOW + rng.uniform(-2 * YEAR, 2 * YEAR), tz).date()
+        times.append(_reference_at(tz, day, 0) + rng.uniform(-180, 180))
+    rng.shuffle(times)
+    return times
+
+
+def test_labels_match_strftime():
+    for minute, label in enumerate(LABELS):
+        dt = datetime(2000, 1, 1, minute // 60, minute % 60)
+        assert label == _strftime_label(dt)
+        assert parse_label(label) == minute
+        assert parse_label(dt.strftime("%I:%M %p")) == minute
+
+
+def test_clock_minute_matches_strptime():
+    for (hour, ampm), hour_24 in TO_24.items():
+        assert hour_24 == datetime.strptime(f"{hour} {ampm}", "%I %p").hour
+        for minute in range(60):
+            parsed = datetime.strptime(f"{hour}:{minute:02d} {ampm}", "%I:%M %p")
+            assert clock_minute(hour, minute, ampm) == parsed.hour * 60 + parsed.minute
+
+
+@pytest.mark.parametrize("bad", [(0, 0, "AM"), (13, 0, "PM"), (12, 60, "PM"), (12, 0, "pm"), ("12", 0, "AM")])
+def test_clock_minute_rejects_non_clock_times(bad):
+    with pytest.raises(ValueError):
+        clock_minute(*bad)
+
+
+@pytest.mark.parametrize("bad", ["13:00 PM", "12:60 AM", "2:00", "2:00 pm", " 2:00 PM", ""])
+def test_parse_label_rejects_non_labels(bad):
+    with pytest.raises(ValueError):
+        parse_label(bad)
+
+
+@pytest.mark.parametrize("zone", TIMEZONES)
+def test_now_and_labels_match_pytz(zone):
+    tz = pytz.timezone(zone)
+    clock = LocalClock(tz)
+    for ts in _sample_times(tz, random.Random(zone)):
+        expected = datetime.fromtimestamp(ts, tz)
+        got = clock.now(ts)
+        assert got == expected and got.utcoffset() == expected.utcoffset() and got.date() == expected.date(), ts
+        assert clock.label(ts) == _strftime_label(expected), ts
+
+
+@pytest.mark.parametrize("zone", TIMEZONES)
+def test_window_matches_pytz(zone):
+    tz = pytz.timezone(zone)
+    clock = LocalClock(tz)
+    rng = random.Random(zone)
+    for ts in _sample_times(tz, rng):
+        start, end = rng.randrange(1440), rng.randrange(1440)
+        if rng.random() < 0.2:
+            # Picked right around now, where "already over" flips to tomorrow
+            local = datetime.fromtimestamp(ts, tz)
+            start = (local.hour * 60 + local.minute + rng.randint(-3, 3)) % 1440
+        assert clock.window(start, end, ts) == _reference_window(tz, start, end, ts), (ts, LABELS[start], LABELS[end])
+
+
+def _la(*args, **kwargs):
+    return pytz.timezone("America/Los_Angeles").localize(datetime(*args), **kwargs).timestamp()
+
+
+def test_skipped_time_counts_as_before_the_change():
+    clock = LocalClock(pytz.timezone("America/Los_Angeles"))
+    # 2026-03-08: 2:00 AM PST jumps to 3:00 AM PDT, so 2:30 AM is 3:30 AM PDT
+    assert clock.at(date(2026, 3, 8), 150) == _la(2026, 3, 8, 3, 30)
+    start, end = clock.window(60, 240, now=_la(2026, 3, 8, 0, 30))
+    assert end - start == 2 * 3600
+
+
+def test_repeated_time_is_its_first_occurrence():
+    clock = LocalClock(pytz.timezone("America/Los_Angeles"))
+    # 2026-11-01: 1:00–2:00 AM happens twice; 1:30 AM is the PDT one
+    assert clock.at(date(2026, 11, 1), 90) == _la(2026, 11, 1, 1, 30, is_dst=True)
+    start, end = clock.window(0, 180, now=_la(2026, 10, 31, 23, 0))
+    assert end - start == 4 * 3600
+
+
+@pytest.mark.parametrize("picked_at, start, end, expected", [
+    # 11 PM–1 AM at 11:30 PM: already running, ends after midnight
+    ((2026, 1, 15, 23, 30), 23 * 60, 60, ((2026, 1, 15, 23, 0), (2026, 1, 16, 1, 0))),
+    # 1–3 AM at 11 PM: tonight, not a session that already ended
+    ((2026, 1, 15, 23, 0), 60, 180, ((2026, 1, 16, 1, 0), (2026, 1, 16, 3, 0))),
+    # 9 AM–5 PM at noon: today
+    ((2026, 1, 15, 12, 0), 9 * 60, 17 * 60, ((2026, 1, 15, 9, 0), (2026, 1, 15, 17, 0))),
+    # Ending exactly now counts as over
+    ((2026, 1, 15, 17, 0), 9 * 60, 17 * 60, ((2026, 1, 16, 9, 0), (2026, 1, 16, 17, 0))),
+    # Same start and end: a full day
+    ((2026, 1, 15, 8, 0), 10 * 60, 10 * 60, ((2026, 1, 15, 10, 0), (2026, 1, 16, 10, 0))),
+])
+def test_midnight_rollover(picked_at, start, end, expected):
+    clock = LocalClock(pytz.timezone("America/Los_Angeles"))
+    assert clock.window(start, end, now=_la(*picked_at)) == (_la(*expected[0]), _la(*expected[1]))
@@ -0,0 +1,133 @@
+"""Dropping redelivered and double-submitted requests, and letting a rejected modal be submitted again."""
+import asyncio
+
+import pytest
+from slack_bolt import App, BoltRequest
+from slack_bolt.app.async_app import AsyncApp
+from slack_bolt.authorization import AuthorizeResult
+from slack_bolt.request.async_request import AsyncBoltRequest
+
+from features.dedupe import TTLCache, dedupe_requests, request_key
+
+
+def _authorization():
+    return AuthorizeResult(enterprise_id=None, team_id="T1", bot_token="xoxb-test", bot_user_id="UB", bot_id="B1")
+
+
+def _submission(values):
+    return {
+        "type": "view_submission",
+        "team": {"id": "T1"},
+        "user": {"id": "U1"},
+        "api_app_id": "A1",
+        "view": {"id": "V1", "type": "modal", "callback_id": "study_modal", "state": {"values": values}},
+    }
+
+
+def _event(event_id):
+    return {
+        "type": "event_callback",
+        "team_id": "T1",
+        "api_app_id": "A1",
+        "event_id": event_id,
+        "event": {"type": "app_mention", "user": "U1", "text": "hi", "channel": "C1", "ts": "1.1"},
+    }
+
+
+def test_ttl_cache_expires_and_bounds_keys():
+    cache = TTLCache(max_keys=3, ttl=10)
+    assert not cache.seen("a", now=0)
+    assert cache.seen("a", now=9.9)
+    assert not cache.seen("a", now=10)  # expired, recorded again until 20
+    assert cache.seen("a", now=19)
+    for i, key in enumerate("bcd"):
+        assert not cache.seen(key, now=11 + i)
+    # Over max_keys the oldest goes first, even before it expires
+    assert len(cache) == 3 and not cache.seen("a", now=14)
+    cache.forget("b")
+    assert not cache.seen("b", now=15)
+    # Keys past their ttl are dropped as new ones come in
+    assert not cache.seen("e", now=100) and len(cache) == 1
+
+
+def test_request_keys():
+    assert request_key(_event("Ev1")) == "event:Ev1"
+    a, b = request_key(_submission({"x": {"v": 1}})), request_key(_submission({"x": {"v": 2}}))
+    assert a.startswith("view:V1:") and a != b
+    assert request_key({"command": "/study", "trigger_id": "t1"}) == "command:t1"
+    click = {
+        "type": "block_actions",
+        "user": {"id": "U1"},
+        "container": {"message_ts": "1.2"},
+        "actions": [{"action_id": "study_cancel", "value": "s1", "action_ts": "9.9"}],
+    }
+    assert request_key(click) == "action:U1:1.2:study_cancel:s1"
+    assert request_key({"type": "block_actions", "actions": [{"action_id": "x"}]}) is None
+
+
+def _sync_app(answers):
+    app = App(signing_secret="s", authorize=lambda **kwargs: _authorization(), request_verification_enabled=False)
+    dedupe_requests(app, TTLCache())
+    calls = []
+
+    @app.view("study_modal")
+    def submit(ack):
+        calls.append("view")
+        ack(**answers.pop(0))
+
+    @app.event("app_mention")
+    def mention():
+        calls.append("event")
+
+    return app, calls
+
+
+def test_sync_middleware_drops_duplicates_but_not_resubmits_after_errors():
+    errors = {"response_action": "errors", "errors": {"location_block": "You're already studying."}}
+    app, calls = _sync_app([errors, {}, {}])
+    dispatch = lambda body: app.dispatch(BoltRequest(body=body, mode="socket_mode"))
+
+    assert dispatch(_event("Ev1")).status == 200
+    assert dispatch(_event("Ev1")).body == ""
+    submission = _submission({"location_block": {"location": {"value": "Langson"}}})
+    assert "errors" in dispatch(submission).body
+    # Same values again after the error: a new attempt, which succeeds
+    assert dispatch(submission).status == 200
+    # ...and a double click on that one is dropped
+    assert dispatch(submission).body == ""
+    assert calls == ["event", "view", "view"]
+
+
+def test_async_middleware_drops_duplicates_but_not_resubmits_after_errors():
+    async def authorize(**kwargs):
+        return _authorization()
+
+    app = AsyncApp(signing_secret="s", authorize=authorize, request_verification_enabled=False)
+    dedupe_requests(app, TTLCache())
+    answers = [{"response_action": "errors", "errors": {"b": "Pick a time."}}, {}]
+    calls = []
+
+    @app.view("study_modal")
+    async def submit(ack):
+        calls.append("view")
+        await ack(**answers.pop(0))
+
+    async def run():
+        submission = _submission({"b": {"t": {"value": "2pm"}}})
+        dispatch = lambda: app.async_dispatch(AsyncBoltRequest(body=submission, mode="socket_mode"))
+        assert "errors" in (await dispatch()).body
+        assert (await dispatch()).status == 200
+        assert (await dispatch()).body == ""
+
+    asyncio.run(run())
+    assert calls == ["view", "view"]
+
+
+@pytest.mark.parametrize("whole_response", [True, False])
+def test_errors_in_the_whole_response_form_count_too(whole_response):
+    errors = {"response_action": "errors", "errors": {"b": "Pick a time."}}
+    app, calls = _sync_app([errors if not whole_response else {"text": errors}, {}])
+    submission = _submission({"b": {"t": {"value": "2pm"}}})
+    for _ in range(2):
+        app.dispatch(BoltRequest(body=submission, mode="socket_mode"))
+    assert calls == ["view", "view"]
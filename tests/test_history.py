@@ -0,0 +1,69 @@
+"""HistoryStats' local-time buckets against pytz, DST changes included."""
+import random
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import pytest
+import pytz
+
+from features.channels import ChannelConfig, StudyChannel
+from features.history import EXPIRED, HistoryArchive, HistoryStats
+
+TIMEZONES = ["America/Los_Angeles", "Australia/Sydney", "Australia/Lord_Howe", "Asia/Kathmandu"]
+
+
+def _around_changes(tz, rng):
+    """Session starts every few minutes for two days around each DST change in 2026, plus random ones that year."""
+    start = datetime(2026, 1, 1, tzinfo=pytz.utc).timestamp()
+    end = datetime(2027, 1, 1, tzinfo=pytz.utc).timestamp()
+    starts = [rng.uniform(start, end) for _ in range(500)]
+    for change in getattr(tz, "_utc_transition_times", []):
+        at = pytz.utc.localize(change).timestamp()
+        if start <= at < end:
+            starts.extend(at + minute * 60 + rng.uniform(0, 60) for minute in range(-24 * 60, 24 * 60, 11))
+    return starts
+
+
+@pytest.mark.parametrize("zone", TIMEZONES)
+def test_heatmap_and_weeks_use_local_time(tmp_path, zone):
+    tz = pytz.timezone(zone)
+    rng = random.Random(zone)
+    archive = HistoryArchive(str(tmp_path))
+    heatmap = np.zeros((7, 24))
+    weeks = Counter()
+    starts = []
+    for begin in _around_changes(tz, rng):
+        end = begin + rng.uniform(1, 20) * 60
+        local, local_end = datetime.fromtimestamp(begin, tz), datetime.fromtimestamp(end, tz)
+        if (local.date(), local.hour) != (local_end.date(), local_end.hour):
+            continue  # keep to sessions inside one local hour, so each fills one heatmap cell
+        archive.append({"user_id": "U1", "location": "Langson Library", "start_ts": begin, "end_ts": end}, EXPIRED, end)
+        starts.append(begin)
+        heatmap[local.weekday(), local.hour] += 1
+        weeks[local_end.date().isocalendar()[:2]] += 1
+    archive.flush()
+
+    stats = HistoryStats(archive, tz)
+    until = max(starts) + 3600
+    result = stats.compute(until=until)
+    assert result["sessions"] == len(starts)
+    assert (result["heatmap"] == heatmap).all()
+
+    # Each local week's count: a session ending late Sunday belongs to that week, not the next
+    for (year, week), count in sorted(weeks.items()):
+        monday = tz.localize(datetime.fromisocalendar(year, week, 1)).timestamp()
+        sunday_night = tz.localize(datetime.fromisocalendar(year, week, 7).replace(hour=23, minute=59)).timestamp()
+        assert stats.compute(since=monday, until=sunday_night)["sessions"] == count, (year, week)
+
+
+def test_channel_opens_its_archive_only_when_started(tmp_path):
+    path = tmp_path / "history"
+    channel = StudyChannel(ChannelConfig("C1", ["Langson Library"]), str, pytz.utc, history_dir=str(path))
+    assert not path.exists() and channel.history_stats is None
+    archive = channel.open_history()
+    assert path.is_dir() and channel.open_history() is archive
+    channel.store.add("s1", {"user_id": "U1", "location": "Langson Library", "start_ts": 0.0, "end_ts": 60.0})
+    channel.store.pop("s1")
+    archive.flush()
+    assert channel.history_stats.compute(until=120.0)["sessions"] == 1
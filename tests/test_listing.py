@@ -0,0 +1,138 @@
+"""`/study list`: cached per-location sections, location queries and time ranges (from the schedule or a shared store)."""
+from datetime import datetime
+
+import pytest
+import pytz
+
+from features.clock import clock_for
+from features.listing import SessionListCache, parse_time_range
+from features.schedule import SessionSchedule
+from features.sessions import SessionStore
+from features.shared import SharedSessionStore
+
+TZ = pytz.timezone("America/Los_Angeles")
+LOCATIONS = ["Langson Library", "Science Library", "Other"]
+# 10 AM local, so "2-4pm" means this afternoon
+NOW = TZ.localize(datetime(2026, 3, 10, 10)).timestamp()
+HOUR = 3600
+
+
+def _at(hour):
+    return TZ.localize(datetime(2026, 3, 10, hour)).timestamp()
+
+
+def _session(user_id, start_hour, end_hour, location="Langson Library"):
+    return {"user_id": user_id, "location": location, "base_location": location,
+            "start_ts": _at(start_hour), "end_ts": _at(end_hour)}
+
+
+def _listing(kind, tmp_path):
+    if kind == "shared":
+        store = SharedSessionStore(str(tmp_path / "shared.db"))
+        schedule = None
+    else:
+        store = SessionStore()
+        schedule = SessionSchedule(store)
+    listing = SessionListCache(store, LOCATIONS, lambda s: s["user_id"], schedule=schedule, clock=clock_for(TZ))
+    add = store.add if schedule is None else (lambda sid, s: schedule.reserve(sid, s, now=NOW))
+    return listing, add
+
+
+@pytest.mark.parametrize("kind", ["schedule", "shared"])
+def test_time_range_lists_overlapping_sessions(kind, tmp_path):
+    listing, add = _listing(kind, tmp_path)
+    add("now", _session("U1", 9, 15))
+    add("later", _session("U2", 17, 18))
+    add("science", _session("U3", 15, 17, "Science Library"))
+    add("before", _session("U4", 12, 14))
+
+    text, blocks = listing.response("2-4pm", now=NOW)
+    assert text == "2 studying between 2:00 PM and 4:00 PM"
+    rendered = " ".join(block["text"]["text"] for block in blocks)
+    assert "U1" in rendered and "U3" in rendered and "U2" not in rendered and "U4" not in rendered
+
+    text, _ = listing.response("langson 2-4pm", now=NOW)
+    assert text == "1 studying at *Langson Library* between 2:00 PM and 4:00 PM"
+    text, _ = listing.response("science 6-8pm", now=NOW)
+    assert text == "Nobody is studying at *Science Library* between 6:00 PM and 8:00 PM."
+
+
+class _CountingStore(SessionStore):
+    def __init__(self):
+        super().__init__()
+        self.lookups = 0
+
+    def in_location(self, location):
+        self.lookups += 1
+        return super().in_location(location)
+
+
+def _cached_listing():
+    store = _CountingStore()
+    listing = SessionListCache(store, LOCATIONS, lambda s: s["user_id"], clock=clock_for(TZ))
+    store.change_listeners.append(listing.on_change)
+    return store, listing
+
+
+def test_sections_are_cached_until_their_location_changes():
+    store, listing = _cached_listing()
+    store.add("a", _session("U1", 9, 15))
+    store.add("b", _session("U2", 9, 15, "Science Library"))
+    assert listing.response(now=NOW)[0] == "2 studying now"
+    lookups = store.lookups
+    assert listing.response(now=NOW)[0] == "2 studying now"
+    assert store.lookups == lookups
+
+    store.pop("b")
+    text, blocks = listing.response(now=NOW)
+    assert text == "1 studying now" and len(blocks) == 1
+    # Only the changed location was read again
+    assert store.lookups == lookups + 1
+
+
+def test_a_render_racing_a_change_is_not_cached():
+    store, listing = _cached_listing()
+    store.add("a", _session("U1", 9, 15))
+    in_location = store.in_location
+
+    def change_while_reading(location):
+        found = in_location(location)
+        store.add("b", _session("U2", 9, 15))
+        return found
+
+    store.in_location = change_while_reading
+    assert listing.section("Langson Library")[0] == 1
+    store.in_location = in_location
+    assert listing.section("Langson Library")[0] == 2
+
+
+def test_location_queries():
+    _, listing = _cached_listing()
+    assert listing.match_location("science library") == "Science Library"
+    assert listing.match_location("lang") == "Langson Library"
+    assert listing.match_location("library") == "Langson Library"
+    assert listing.match_location("") is None
+    assert listing.response("langson", now=NOW)[0] == "Nobody is studying at *Langson Library* right now."
+    assert listing.response("gym", now=NOW)[0].startswith("I don't know a location called \"gym\"")
+    assert listing.response(now=NOW)[0] == "Nobody is studying right now. Use `/study` to share where you are."
+
+
+@pytest.mark.parametrize("query, rest, start, end", [
+    ("2-4pm", "", (14, 0), (16, 0)),
+    ("langson 11-1pm", "langson", (11, 0), (13, 0)),
+    ("between 14:00 and 16:30", "", (14, 0), (16, 30)),
+    ("science 2pm to 4pm", "science", (14, 0), (16, 0)),
+    ("9:15am-10", "", (9, 15), (10, 0)),
+    ("11pm-1am", "", (23, 0), (25, 0)),
+])
+def test_parse_time_range(query, rest, start, end):
+    found, (start_ts, end_ts, _) = parse_time_range(query, clock_for(TZ), NOW - HOUR)
+    assert found == rest
+    day = datetime(2026, 3, 10)
+    assert start_ts == TZ.localize(day.replace(hour=start[0], minute=start[1])).timestamp()
+    assert end_ts == TZ.localize(day.replace(hour=end[0] % 24, minute=end[1])).timestamp() + (86400 if end[0] >= 24 else 0)
+
+
+def test_text_without_a_valid_range_is_left_alone():
+    for query in ("langson", "13pm-2pm", "2:75-3", "2-25"):
+        assert parse_time_range(query, clock_for(TZ), NOW) == (query, None)
@@ -0,0 +1,111 @@
+"""Prometheus text output and the recorders behind it."""
+import asyncio
+import urllib.error
+import urllib.request
+
+import pytest
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+from features import metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("t_seconds", "Test.", "listener", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe("a", value)
+    histogram.observe("b", 0.2)
+    assert histogram.render() == [
+        "# HELP t_seconds Test.",
+        "# TYPE t_seconds histogram",
+        't_seconds_bucket{listener="a",le="0.1"} 2',
+        't_seconds_bucket{listener="a",le="1.0"} 3',
+        't_seconds_bucket{listener="a",le="+Inf"} 4',
+        't_seconds_sum{listener="a"} 3.65',
+        't_seconds_count{listener="a"} 4',
+        't_seconds_bucket{listener="b",le="0.1"} 0',
+        't_seconds_bucket{listener="b",le="1.0"} 1',
+        't_seconds_bucket{listener="b",le="+Inf"} 1',
+        't_seconds_sum{listener="b"} 0.2',
+        't_seconds_count{listener="b"} 1',
+    ]
+
+
+def test_counter_and_gauges_render():
+    counter = metrics.Counter("t_total", "Test.", ("method", "error"))
+    counter.inc("chat.update", "ratelimited")
+    counter.inc("chat.update", "ratelimited", amount=2)
+    assert counter.render()[2:] == ['t_total{method="chat.update",error="ratelimited"} 3']
+    assert metrics.Gauge("t_now", "Test.", lambda: 7).render()[2:] == ["t_now 7"]
+    labelled = metrics.Gauge("t_by", "Test.", lambda: {"b": 2, "a": 1}, label="bucket")
+    assert labelled.render()[2:] == ['t_by{bucket="a"} 1', 't_by{bucket="b"} 2']
+
+
+def test_a_failing_gauge_read_keeps_the_scrape_going():
+    def broken():
+        raise RuntimeError("store closed")
+
+    gauge = metrics.Gauge("t_broken", "Test.", broken)
+    gauge.set(4)
+    assert gauge.render()[2:] == ["t_broken 4"]
+
+
+def test_timed_records_sync_and_async_listeners_even_when_they_raise(enabled):
+    @metrics.timed("t_sync")
+    def sync_listener():
+        raise ValueError("boom")
+
+    @metrics.timed("t_async")
+    async def async_listener():
+        await asyncio.sleep(0)
+        return "done"
+
+    with pytest.raises(ValueError):
+        sync_listener()
+    assert asyncio.run(async_listener()) == "done"
+    rendered = metrics.render()
+    assert 'ctc_listener_duration_seconds_count{listener="t_sync"} 1' in rendered
+    assert 'ctc_listener_duration_seconds_count{listener="t_async"} 1' in rendered
+
+
+def test_timed_is_a_no_op_when_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+
+    def listener():
+        pass
+
+    assert metrics.timed("t_off")(listener) is listener
+
+
+def test_api_errors_are_labelled_by_slack_error(enabled):
+    response = SlackResponse(
+        client=None, http_verb="POST", api_url="", req_args={}, data={"ok": False, "error": "not_in_channel"},
+        headers={}, status_code=200,
+    )
+    error = SlackApiError("failed", response)
+    assert metrics.error_label(error) == "not_in_channel"
+    assert metrics.error_label(TimeoutError()) == "TimeoutError"
+    metrics.observe_api_call("t.method", 0.01, metrics.error_label(error))
+    assert 'ctc_slack_api_errors_total{method="t.method",error="not_in_channel"} 1' in metrics.render()
+
+
+def test_serves_metrics_on_localhost(enabled, monkeypatch):
+    monkeypatch.setenv("METRICS_PORT", "0")
+    monkeypatch.setattr(metrics, "_server", None)
+    metrics.gauge("t_served", "Test.", lambda: 1)
+    server = metrics.serve()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(url + "/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "t_served 1" in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/other")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,131 @@
+"""Outbox ordering, retries and backpressure, without a Slack connection."""
+import asyncio
+import threading
+import time
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+
+from features.outbox import AsyncOutbox, Outbox
+
+
+def test_calls_with_one_key_run_in_order_on_a_worker():
+    box = Outbox(workers=3)
+    box.start()
+    seen = []
+    for i in range(50):
+        box.submit("ts-1", seen.append, i)
+    box.join()
+    assert seen == list(range(50))
+
+
+def test_submit_before_start_queues_instead_of_running_inline():
+    box = Outbox(workers=1)
+    ran = []
+    box.submit("k", lambda: ran.append(threading.current_thread().name))
+    assert ran == []
+    box.start()
+    box.join()
+    assert ran == ["outbox-0"]
+
+
+def test_full_queue_drops_instead_of_blocking_the_caller():
+    box = Outbox(workers=1, max_pending=2, max_retries=5, base_delay=10.0, put_timeout=0.05)
+    release = threading.Event()
+    box.start()
+    box.submit("k", release.wait)
+    time.sleep(0.05)  # the worker is now stuck in that call
+    box.submit("k", lambda: None)
+    box.submit("k", lambda: None)
+    ran = []
+    start = time.monotonic()
+    box.submit("k", ran.append, "dropped")
+    assert time.monotonic() - start < 1.0
+    assert box.dropped == 1
+    release.set()
+    box.join()
+    assert ran == []
+
+
+def test_failed_calls_are_retried_then_given_up():
+    box = Outbox(workers=1, max_retries=2, base_delay=0.001)
+    box.start()
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) < 2:
+            raise ConnectionError("reset")
+
+    def broken():
+        attempts.append(None)
+        raise ConnectionError("reset")
+
+    box.submit("k", flaky)
+    box.join()
+    assert len(attempts) == 2
+    attempts.clear()
+    box.submit("k", broken)
+    box.join()
+    assert len(attempts) == 3
+
+
+def _slack_error(status, headers=None):
+    return SlackApiError("failed", SlackResponse(
+        client=None, http_verb="POST", api_url="https://slack.test/api/chat.postMessage", req_args={},
+        data={"ok": False, "error": "ratelimited" if status == 429 else "internal_error"},
+        headers=headers or {}, status_code=status,
+    ))
+
+
+def test_submit_once_is_retried_only_on_429():
+    box = Outbox(workers=1, max_retries=3, base_delay=0.001)
+    box.start()
+    posts = []
+
+    def post(error):
+        posts.append(error)
+        if len(posts) == 1:
+            raise error
+
+    box.submit_once("k", post, _slack_error(429, {"Retry-After": "0"}))
+    box.join()
+    assert len(posts) == 2
+    posts.clear()
+    box.submit_once("k", post, _slack_error(503))
+    box.join()
+    assert len(posts) == 1
+    posts.clear()
+    box.submit_once("k", post, TimeoutError("read timed out"))
+    box.join()
+    assert len(posts) == 1
+
+
+def test_async_submit_once_is_retried_only_on_429():
+    async def run():
+        box = AsyncOutbox(max_retries=3, base_delay=0.001)
+        posts = []
+
+        async def post(error):
+            posts.append(error)
+            if len(posts) == 1:
+                raise error
+
+        box.submit_once("k", post, _slack_error(429, {"Retry-After": "0"}))
+        await box.join()
+        assert len(posts) == 2
+
+        async def always_fails():
+            posts.append(None)
+            raise TimeoutError("read timed out")
+
+        posts.clear()
+        box.submit_once("k", always_fails)
+        await box.join()
+        assert len(posts) == 1
+        posts.clear()
+        box.submit("k", always_fails)
+        await box.join()
+        assert len(posts) == 4
+
+    asyncio.run(run())
@@ -0,0 +1,122 @@
+"""Per-method token buckets: waiting for budget, giving up in time, and backing off on Retry-After."""
+import asyncio
+import time
+
+import pytest
+from slack_sdk.errors import SlackApiError
+
+from benchmarks.fake_slack import FakeSlackServer
+from features import metrics
+from features.ratelimit import AsyncRateLimitedWebClient, RateLimitedWebClient, RateLimitWaitTimeout, TokenBucket
+
+
+@pytest.fixture
+def server():
+    server = FakeSlackServer(seed=1).start()
+    yield server
+    server.stop()
+
+
+def _empty_bucket(rate_per_minute):
+    bucket = TokenBucket(rate_per_minute)
+    bucket.tokens = 0.0
+    return bucket
+
+
+def test_bucket_waits_for_a_token_or_gives_up_in_time():
+    bucket = _empty_bucket(600)  # one token every 0.1s
+    assert not bucket.acquire(timeout=0.01)
+    assert (bucket.timed_out, bucket.waiting) == (1, 0)
+    start = time.monotonic()
+    assert bucket.acquire()
+    assert 0.05 <= time.monotonic() - start < 0.5
+    assert (bucket.throttled, bucket.waiting) == (1, 0)
+
+
+def test_pause_holds_every_token_then_allows_one_probe():
+    bucket = TokenBucket(6000)
+    bucket.pause(0.2)
+    start = time.monotonic()
+    assert bucket.acquire()
+    assert time.monotonic() - start >= 0.19
+    # Only the probe was free; the next token comes at the bucket's rate
+    assert not bucket.acquire(timeout=0)
+
+
+def test_async_waits_share_the_loop_and_cancelling_one_stops_counting_it():
+    bucket = _empty_bucket(600)
+
+    async def run():
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        waiters = [asyncio.create_task(bucket.acquire_async()) for _ in range(3)]
+        await ticker()
+        # The loop kept running while all three waited
+        assert len(ticks) == 5 and bucket.waiting == 3
+        waiters[2].cancel()
+        assert await asyncio.gather(*waiters[:2]) == [True, True]
+        with pytest.raises(asyncio.CancelledError):
+            await waiters[2]
+        assert bucket.waiting == 0
+        assert not await bucket.acquire_async(timeout=0.01)
+
+    asyncio.run(run())
+
+
+def test_views_open_fails_fast_instead_of_outliving_its_trigger(server):
+    client = RateLimitedWebClient(token="xoxb-test", base_url=server.url, tier_limits={"tier4": 1})
+    client.views_open(trigger_id="t1", view={"type": "modal"})
+    start = time.monotonic()
+    with pytest.raises(RateLimitWaitTimeout):
+        client.views_open(trigger_id="t2", view={"type": "modal"})
+    assert time.monotonic() - start < 0.5
+    assert client.rate_limit_stats()["buckets"]["views.open"]["timed_out"] == 1
+
+
+def test_429_pauses_the_method_for_retry_after_then_gives_up(server):
+    server.rate_limit_rate, server.retry_after = 1.0, 0.2
+    client = RateLimitedWebClient(token="xoxb-test", base_url=server.url, max_rate_limit_retries=2)
+    start = time.monotonic()
+    with pytest.raises(SlackApiError) as error:
+        client.pins_add(channel="C1", timestamp="1.1")
+    assert error.value.response.status_code == 429
+    assert time.monotonic() - start >= 0.39
+    assert server.calls["pins.add"] == 3 and client.rate_limited == 2
+    # Other methods have their own buckets
+    server.rate_limit_rate = 0.0
+    start = time.monotonic()
+    client.chat_update(channel="C1", ts="1.1", text="x")
+    assert time.monotonic() - start < 0.15
+
+
+def test_async_client_retries_after_429(server):
+    server.rate_limit_rate, server.retry_after = 0.5, 0.05
+
+    async def run():
+        client = AsyncRateLimitedWebClient(token="xoxb-test", base_url=server.url, max_rate_limit_retries=20)
+        for i in range(5):
+            assert (await client.chat_postMessage(channel=f"C{i}", text="hi"))["ok"]
+        return client
+
+    client = asyncio.run(run())
+    assert server.calls["chat.postMessage"] == 5 + client.rate_limited
+    assert client.rate_limited > 0
+    # chat.postMessage is paced per channel
+    assert sorted(client.rate_limit_stats()["buckets"]) == [f"chat.postMessage:C{i}" for i in range(5)]
+
+
+def test_bucket_counts_are_exported_as_gauges(server):
+    client = RateLimitedWebClient(token="xoxb-test", base_url=server.url)
+    metrics.watch_rate_limits(client)
+    client.pins_add(channel="C1", timestamp="1.1")
+    client._bucket("pins.add").throttled = 4
+    rendered = metrics.render()
+    assert 'ctc_rate_limit_throttled{bucket="pins.add"} 4' in rendered
+    assert 'ctc_rate_limit_waiting{bucket="pins.add"} 0' in rendered
+    assert 'ctc_rate_limit_timed_out{bucket="pins.add"} 0' in rendered
+    assert "ctc_rate_limited 0" in rendered
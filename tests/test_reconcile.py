@@ -0,0 +1,112 @@
+"""Rebuilding sessions from the bot's announcements, and unpinning the ones that have ended."""
+import asyncio
+from datetime import datetime
+
+import pytest
+import pytz
+from slack_sdk.web.async_client import AsyncWebClient
+
+from benchmarks.fake_slack import FakeSlackServer
+from features.channels import ChannelConfig, StudyChannel
+from features.clock import clock_for
+from features.ratelimit import TIER_LIMITS, RateLimitedWebClient
+from features.reconcile import parse_announcement, reconcile, reconcile_async
+from features.study import _announcement_message, _ended_message
+
+TZ = pytz.timezone("America/Los_Angeles")
+CLOCK = clock_for(TZ)
+LOCATIONS = ["Langson Library", "Science Library", "Other"]
+CHANNEL = "CREC"
+HOUR = 3600
+
+
+def _at(*args):
+    return TZ.localize(datetime(*args)).timestamp()
+
+
+def _text(user_id, start_ts, end_ts, location="Langson Library", with_suffix=""):
+    text, _ = _announcement_message({
+        "user_id": user_id, "location": location, "with_suffix": with_suffix, "description": "Midterm prep",
+        "image_url": None, "time_range": f"{CLOCK.label(start_ts)} – {CLOCK.label(end_ts)}",
+    })
+    return text
+
+
+@pytest.mark.parametrize("start, end, posted", [
+    (_at(2026, 4, 2, 14), _at(2026, 4, 2, 17), _at(2026, 4, 2, 14, 0, 3)),
+    # Posted at the scheduled start by the start timer, a moment early
+    (_at(2026, 4, 2, 9), _at(2026, 4, 2, 10, 30), _at(2026, 4, 2, 8, 59, 59)),
+    # Past midnight, and a session that started the evening before it was posted
+    (_at(2026, 4, 2, 23), _at(2026, 4, 3, 1), _at(2026, 4, 2, 23, 0, 1)),
+    (_at(2026, 4, 2, 23, 45), _at(2026, 4, 3, 2), _at(2026, 4, 3, 0, 10)),
+    # Across the spring-forward change
+    (_at(2026, 3, 8, 1), _at(2026, 3, 8, 4), _at(2026, 3, 8, 1, 0, 2)),
+])
+def test_announcements_parse_back_to_their_session(start, end, posted):
+    session = parse_announcement(_text("U1", start, end), posted, TZ, LOCATIONS)
+    assert (session["start_ts"], session["end_ts"]) == (start, end)
+    assert session["user_id"] == "U1" and session["base_location"] == "Langson Library"
+
+
+def test_locations_spots_and_other_text():
+    start, end = _at(2026, 4, 2, 14), _at(2026, 4, 2, 16)
+    spot = parse_announcement(
+        _text("U1", start, end, "Science Library — 2nd floor", " with <@U2>"), start, TZ, LOCATIONS
+    )
+    assert spot["location"] == "Science Library — 2nd floor" and spot["base_location"] == "Science Library"
+    unknown = parse_announcement(_text("U1", start, end, "Aldrich Park"), start, TZ, LOCATIONS)
+    assert unknown["base_location"] == "Other"
+    struck, _ = _ended_message(_text("U1", start, end))
+    assert parse_announcement(struck, start, TZ, LOCATIONS) is None
+    assert parse_announcement("anyone at langson?", start, TZ, LOCATIONS) is None
+    assert parse_announcement(None, start, TZ, LOCATIONS) is None
+
+
+def _seed(server, now):
+    bot = {"user": "U0BOT", "bot_id": "B0BOT"}
+    server.seed_messages(CHANNEL, [
+        dict(bot, ts=f"{now - HOUR:.6f}", text=_text("ULIVE", now - HOUR, now + HOUR), pinned=True),
+        dict(bot, ts=f"{now - 1800:.6f}", text=_text("UUNPINNED", now - 1800, now + HOUR)),
+        dict(bot, ts=f"{now - 5 * HOUR:.6f}", text=_text("UENDED", now - 5 * HOUR, now - 3 * HOUR), pinned=True),
+        {"ts": f"{now - 600:.6f}", "text": _text("UFAKE", now - 600, now + HOUR), "user": "UHUMAN"},
+    ])
+
+
+@pytest.fixture
+def server():
+    server = FakeSlackServer().start()
+    yield server
+    server.stop()
+
+
+def _check(server, channel, restored, ended, now):
+    assert sorted(s["user_id"] for _, s in restored) == ["ULIVE", "UUNPINNED"]
+    assert {s["message_ts"] for _, s in restored} == {f"{now - HOUR:.6f}", f"{now - 1800:.6f}"}
+    assert len(channel.store) == 2
+    ended_ts = f"{now - 5 * HOUR:.6f}"
+    assert [ts for ts, _ in ended] == [ended_ts]
+    message = server.message(CHANNEL, ended_ts)
+    assert not message["pinned"] and message["text"].startswith("~")
+
+
+def test_reconcile_restores_live_sessions_and_cleans_up_ended_pins(server):
+    now = _at(2026, 4, 2, 15)
+    _seed(server, now)
+    client = RateLimitedWebClient(token="xoxb-test", base_url=server.url, tier_limits={k: v * 1000 for k, v in TIER_LIMITS.items()})
+    channel = StudyChannel(ChannelConfig(CHANNEL, LOCATIONS), str, TZ)
+    restored, ended = reconcile(client, channel, TZ, _ended_message, now=now)
+    _check(server, channel, restored, ended, now)
+    # Running it again finds everything tracked or already cleaned up
+    assert reconcile(client, channel, TZ, _ended_message, now=now) == ([], [])
+
+
+def test_reconcile_async(server):
+    now = _at(2026, 4, 2, 15)
+    _seed(server, now)
+    channel = StudyChannel(ChannelConfig(CHANNEL, LOCATIONS), str, TZ)
+
+    async def run():
+        return await reconcile_async(AsyncWebClient(token="xoxb-test", base_url=server.url), channel, TZ, _ended_message, now=now)
+
+    restored, ended = asyncio.run(run())
+    _check(server, channel, restored, ended, now)
@@ -0,0 +1,152 @@
+"""Booking sessions ahead: the interval index, overlap checks, start timing, and restoring after a restart."""
+import random
+
+import pytest
+import pytz
+
+from features.channels import ChannelConfig, StudyChannel
+from features.intervals import IntervalTree
+from features.schedule import SCHEDULED, START_GRACE_SECONDS, STARTED, SessionSchedule
+from features.sessions import SessionStore
+
+NOW = 1_790_000_000.0
+HOUR = 3600
+LOCATIONS = ["Langson Library", "Science Library", "Gateway Study Center"]
+
+
+def _session(user_id, start, end, location="Langson Library", **fields):
+    return dict({"user_id": user_id, "location": location, "base_location": location, "start_ts": start, "end_ts": end}, **fields)
+
+
+def _schedule():
+    store = SessionStore()
+    return store, SessionSchedule(store)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_interval_tree_matches_brute_force(seed):
+    rng = random.Random(seed)
+    tree, intervals = IntervalTree(), {}
+    for step in range(3000):
+        roll = rng.random()
+        if roll < 0.5 or not intervals:
+            key = f"k{rng.randrange(400)}"
+            start = rng.choice((float("-inf"), rng.randrange(1000)))
+            end = (0 if start == float("-inf") else start) + rng.randrange(1, 100)
+            tree.add(key, start, end, step)
+            intervals[key] = (start, end, step)
+        elif roll < 0.7:
+            key = rng.choice(list(intervals)) if rng.random() < 0.9 else "missing"
+            assert tree.remove(key) == (intervals.pop(key)[2] if key in intervals else None)
+        else:
+            start = rng.randrange(-50, 1100)
+            end = start + rng.randrange(0, 150)
+            expected = sorted(
+                (key, s, e, value) for key, (s, e, value) in intervals.items() if s < end and e > start
+            )
+            found = tree.overlapping(start, end)
+            assert sorted(found) == expected
+            assert [m[1] for m in found] == sorted(m[1] for m in found)
+            assert tree.overlaps(start, end) == bool(expected)
+        assert len(tree) == len(intervals)
+
+
+def test_reserve_rejects_overlapping_sessions_of_one_user():
+    store, schedule = _schedule()
+    assert schedule.reserve("a", _session("U1", NOW + 2 * HOUR, NOW + 4 * HOUR), now=NOW) == SCHEDULED
+    # Upcoming vs. upcoming, either side and inside
+    assert schedule.reserve("b", _session("U1", NOW + 3 * HOUR, NOW + 5 * HOUR), now=NOW) is None
+    assert schedule.reserve("c", _session("U1", NOW + HOUR, NOW + 2 * HOUR + 1), now=NOW) is None
+    assert schedule.reserve("d", _session("U1", NOW + 2.5 * HOUR, NOW + 3 * HOUR), now=NOW) is None
+    # Back to back is fine, and other users aren't affected
+    assert schedule.reserve("e", _session("U1", NOW + 4 * HOUR, NOW + 5 * HOUR), now=NOW) == SCHEDULED
+    assert schedule.reserve("f", _session("U2", NOW + 2 * HOUR, NOW + 4 * HOUR), now=NOW) == SCHEDULED
+    # Active vs. upcoming: starting now until after "a" begins collides with it
+    assert schedule.reserve("g", _session("U1", NOW, NOW + 3 * HOUR), now=NOW) is None
+    assert schedule.reserve("h", _session("U1", NOW, NOW + HOUR), now=NOW) == STARTED
+    # Upcoming vs. active
+    assert schedule.reserve("i", _session("U1", NOW + 0.5 * HOUR, NOW + 1.5 * HOUR), now=NOW) is None
+    assert sorted(schedule._sessions) == ["a", "e", "f"]
+    assert "h" in store and len(store) == 1
+
+
+def test_overlapping_by_location_covers_upcoming_and_active():
+    store, schedule = _schedule()
+    schedule.reserve("now", _session("U1", NOW, NOW + HOUR), now=NOW)
+    schedule.reserve("later", _session("U2", NOW + 3 * HOUR, NOW + 4 * HOUR), now=NOW)
+    schedule.reserve("spot", _session("U3", NOW + 3 * HOUR, NOW + 4 * HOUR, "Langson Library — 4th floor",
+                                      base_location="Langson Library"), now=NOW)
+    schedule.reserve("elsewhere", _session("U4", NOW, NOW + 4 * HOUR, "Science Library"), now=NOW)
+
+    ids = lambda matches: [sid for sid, _ in matches]
+    found = ids(schedule.overlapping(NOW + 0.5 * HOUR, NOW + 3.5 * HOUR, "Langson Library"))
+    assert found[0] == "now" and sorted(found[1:]) == ["later", "spot"]
+    assert ids(schedule.overlapping(NOW + HOUR, NOW + 3 * HOUR, "Langson Library")) == []
+    assert ids(schedule.overlapping(NOW + HOUR, NOW + 3 * HOUR)) == ["elsewhere"]
+    assert ids(schedule.overlapping(NOW, NOW + HOUR, "Gateway Study Center")) == []
+    # Removal from the store drops it from the index too
+    store.pop("now")
+    assert ids(schedule.overlapping(NOW, NOW + HOUR, "Langson Library")) == []
+
+
+def test_a_start_within_the_grace_period_starts_now():
+    store, schedule = _schedule()
+    session = _session("U1", NOW + START_GRACE_SECONDS, NOW + HOUR)
+    assert schedule.reserve("soon", session, now=NOW) == STARTED
+    assert "soon" in store and session["start_ts"] == NOW
+    past = _session("U2", NOW - 600, NOW + HOUR)
+    assert schedule.reserve("past", past, now=NOW) == STARTED
+    assert past["start_ts"] == NOW - 600
+    assert schedule.reserve("later", _session("U3", NOW + START_GRACE_SECONDS + 1, NOW + HOUR), now=NOW) == SCHEDULED
+    assert "later" not in store and "later" in schedule
+
+
+def test_pop_due_moves_started_sessions_into_the_store_in_start_order():
+    store, schedule = _schedule()
+    for i, start in enumerate((3, 1, 2)):
+        schedule.reserve(f"s{start}", _session(f"U{i}", NOW + start * HOUR, NOW + 5 * HOUR), now=NOW)
+    assert schedule.next_start() == NOW + HOUR
+    assert schedule.pop_due(NOW + HOUR - 1) == []
+    assert [sid for sid, _ in schedule.pop_due(NOW + 2 * HOUR)] == ["s1", "s2"]
+    assert "s1" in store and "s2" in store and "s1" not in schedule
+    assert schedule.next_start() == NOW + 3 * HOUR
+    assert [sid for sid, _ in schedule.pop_due(NOW + 10 * HOUR)] == ["s3"]
+    assert schedule.next_start() is None and len(schedule) == 0
+
+
+def test_cancel_frees_the_slot_and_skips_the_start():
+    store, schedule = _schedule()
+    schedule.reserve("a", _session("U1", NOW + HOUR, NOW + 2 * HOUR), now=NOW)
+    assert schedule.cancel("a")["user_id"] == "U1"
+    assert schedule.cancel("a") is None
+    assert schedule.overlapping(NOW, NOW + 3 * HOUR) == []
+    assert schedule.pop_due(NOW + 3 * HOUR) == [] and "a" not in store
+    assert schedule.reserve("b", _session("U1", NOW + HOUR, NOW + 2 * HOUR), now=NOW) == SCHEDULED
+    # Once started it's the store's to cancel
+    schedule.pop_due(NOW + HOUR)
+    assert schedule.cancel("b") is None and "b" in store
+
+
+def test_restore_splits_started_upcoming_and_unannounced():
+    channel = StudyChannel(ChannelConfig("C1", LOCATIONS), lambda s: s["user_id"], pytz.timezone("America/Los_Angeles"))
+    scheduled_fields = {"time_range": "1:00 PM – 2:00 PM", "with_suffix": "", "description": "", "image_url": None}
+    channel.restore([
+        # Announced and running
+        ("running", _session("U1", NOW - HOUR, NOW + HOUR, message_ts="1.1", **scheduled_fields)),
+        # Started at submit time (no time_range kept)
+        ("plain", _session("U2", NOW - HOUR, NOW + HOUR)),
+        ("upcoming", _session("U3", NOW + HOUR, NOW + 2 * HOUR, **scheduled_fields)),
+        # Its start passed while the bot was down, so it was never announced
+        ("missed", _session("U4", NOW - 600, NOW + HOUR, **scheduled_fields)),
+        # Over before the bot came back: the expiry timer removes it
+        ("over", _session("U5", NOW - 2 * HOUR, NOW - HOUR, **scheduled_fields)),
+    ], NOW)
+    assert sorted(channel.schedule._sessions) == ["missed", "upcoming"]
+    assert {"running", "plain", "over"} <= set(channel.store._shard_of) and len(channel.store) == 3
+    # The start timer's first run announces the missed one; the upcoming one waits
+    assert [sid for sid, _ in channel.schedule.pop_due(NOW)] == ["missed"]
+    assert [sid for sid, _ in channel.store.pop_expired(NOW)] == ["over"]
+    assert "missed" in channel and "upcoming" in channel
+    # Restored sessions block overlapping bookings like new ones
+    assert channel.schedule.reserve("clash", _session("U3", NOW + 1.5 * HOUR, NOW + 3 * HOUR), now=NOW) is None
+    assert channel.schedule.reserve("clash", _session("U1", NOW + 0.5 * HOUR, NOW + 3 * HOUR), now=NOW) is None
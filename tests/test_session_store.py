@@ -0,0 +1,104 @@
+"""Many threads against one SessionStore: nothing lost, popped twice, or left out of an index."""
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+import pytest
+
+from features.persistence import SQLiteSessionBackend, WriteBehind
+from features.sessions import SessionStore
+
+LOCATIONS = ["Langson Library", "Science Library", "Gateway Study Center", "Student Center"]
+USERS = 40
+THREADS = 16
+OPS = 1500
+
+
+def _worker(store, ops, popped, created, errors, seed):
+    rng = random.Random(seed)
+    try:
+        for _ in range(ops):
+            user_id = f"U{rng.randrange(USERS)}"
+            roll = rng.random()
+            if roll < 0.35:
+                sid = str(uuid.uuid4())
+                session = {
+                    "user_id": user_id,
+                    "location": rng.choice(LOCATIONS),
+                    # Some sessions expire mid-run so pop_expired races the others
+                    "end_ts": time.time() + rng.choice((0.001, 0.05, 60)),
+                }
+                if store.add_unless_active(sid, session):
+                    created.append(sid)
+            elif roll < 0.65:
+                # Two cancel paths racing on the same session
+                sid, _ = store.get_user_session(user_id)
+                if sid is not None and store.pop(sid) is not None:
+                    popped.append(sid)
+            elif roll < 0.8:
+                popped.extend(sid for sid, _ in store.pop_expired())
+            elif roll < 0.95:
+                store.in_location(rng.choice(LOCATIONS))
+            else:
+                store.next_expiry()
+    except Exception as e:  # noqa: BLE001 - any exception is a failure here
+        errors.append(repr(e))
+
+
+def _hammer(store):
+    popped, created, errors = [], [], []
+    workers = [
+        threading.Thread(target=_worker, args=(store, OPS, popped, created, errors, seed))
+        for seed in range(THREADS)
+    ]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    assert errors == []
+    return created, popped
+
+
+def _check_invariants(store, created, popped):
+    assert [sid for sid, n in Counter(popped).items() if n > 1] == []
+    remaining = [sid for sid in created if sid in store]
+    assert set(popped) | set(remaining) == set(created)
+    assert len(popped) + len(remaining) == len(created)
+
+    now = time.time()
+    active = Counter(store.get(sid)["user_id"] for sid in remaining if store.get(sid)["end_ts"] > now)
+    assert all(n == 1 for n in active.values())
+
+    indexed = [sid for location in LOCATIONS for sid, _ in store.in_location(location)]
+    assert sorted(indexed) == sorted(remaining)
+    assert len(store) == len(remaining)
+    return remaining
+
+
+def test_concurrent_add_pop_and_expiry():
+    store = SessionStore()
+    created, popped = _hammer(store)
+    assert created and popped
+    remaining = _check_invariants(store, created, popped)
+
+    # Draining afterwards finds exactly what was left
+    expired = store.pop_expired(now=float("inf"))
+    assert sorted(sid for sid, _ in expired) == sorted(remaining)
+    assert len(store) == 0 and store.next_expiry() is None
+
+
+@pytest.mark.parametrize("shards", [1, 32])
+def test_concurrent_writes_persist_what_the_store_holds(tmp_path, shards):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"))
+    persistence = WriteBehind(backend, interval=0.01, batch_size=50)
+    store = SessionStore(persistence=persistence, shards=shards)
+    created, popped = _hammer(store)
+    remaining = _check_invariants(store, created, popped)
+
+    persistence.flush()
+    active, expired = backend.load(time.time())
+    stored = dict(active + expired)
+    assert sorted(stored) == sorted(remaining)
+    assert all(stored[sid]["end_ts"] == store.get(sid)["end_ts"] for sid in remaining)
@@ -0,0 +1,156 @@
+"""Several processes against one shared SQLite file, as app.py replicas would use SHARED_SESSION_DB."""
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from features.expiry import ExpiryScheduler
+from features.shared import Lease, SharedSessionStore
+
+PROCESSES = 4
+LEASE_TTL = 0.3
+SESSION_LEASE_TTL = 0.5
+LONG_USERS = 20
+MAX_SHORT_SECONDS = 0.3
+
+# Spawned, not forked: the pytest process may have other tests' threads running
+_mp = multiprocessing.get_context("spawn")
+
+
+def _run(target, tmp_path, seconds):
+    path = str(tmp_path / "shared.db")
+    SharedSessionStore(path)  # create the schema before the workers race to
+    crashed = _mp.Event()
+    workers = [_mp.Process(target=target, args=(i, path, str(tmp_path), seconds, crashed)) for i in range(PROCESSES)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(timeout=seconds + 30)
+        assert p.exitcode == 0
+    results = []
+    for i in range(PROCESSES):
+        with open(tmp_path / f"{i}.json") as f:
+            results.append(json.load(f))
+    return path, results
+
+
+def _leader_worker(index, path, out_dir, seconds, crashed):
+    rng = random.Random(index)
+    lease = Lease(path, "leader", ttl=LEASE_TTL)
+    # [start, end) spans during which lease.held() could have said True
+    windows = []
+
+    def dump(status):
+        with open(os.path.join(out_dir, f"{index}.json"), "w") as f:
+            json.dump({"status": status, "windows": windows}, f)
+
+    deadline = time.time() + seconds
+    crash_at = time.time() + seconds / 2
+    while time.time() < deadline:
+        if lease.acquire():
+            held_from = time.time()
+            if windows and windows[-1][1] >= held_from:
+                windows[-1][1] = lease._expires_at  # renewed before it lapsed
+            else:
+                windows.append([held_from, lease._expires_at])
+            if time.time() > crash_at and not crashed.is_set():
+                crashed.set()
+                dump("crashed while leader")
+                os._exit(0)  # no atexit: the lease is left to expire
+        elif windows and windows[-1][1] > time.time():
+            windows[-1][1] = time.time()  # another holder; held() now says False
+        # Renew every ttl/3 as ExpiryScheduler does, with the odd stall past the ttl
+        time.sleep(LEASE_TTL * 1.5 if rng.random() < 0.05 else rng.uniform(0, LEASE_TTL / 3))
+    lease.release()
+    dump("ok")
+
+
+def test_one_leader_at_a_time(tmp_path):
+    _, results = _run(_leader_worker, tmp_path, seconds=3.0)
+    windows = sorted((start, end, i) for i, r in enumerate(results) for start, end in r["windows"])
+    assert sum(r["status"] != "ok" for r in results) == 1
+    assert len({i for _, _, i in windows}) >= 2
+    for (_, end, i), (start, _, j) in zip(windows, windows[1:]):
+        assert i == j or end <= start, f"process {i} held the lease until {end}, process {j} took it at {start}"
+
+
+def _session_worker(index, path, out_dir, seconds, crashed):
+    rng = random.Random(index)
+    store = SharedSessionStore(path, poll_interval=0.1)
+    lease = Lease(path, "leader", ttl=SESSION_LEASE_TTL)
+    unpinned = []
+    recording = threading.Lock()
+    pop_expired = store.pop_expired
+
+    def pop_and_record(now=None):
+        # Under the lock the crash takes, so it can't land between popping a batch and recording it
+        with recording:
+            expired = pop_expired(now)
+            unpinned.extend(sid for sid, _ in expired)
+        return expired
+
+    store.pop_expired = pop_and_record
+    scheduler = ExpiryScheduler(store, lease=lease)
+    scheduler.start()
+    store.start_change_feed()
+    created, cancelled, missed = [], [], []
+
+    def dump(status):
+        with open(os.path.join(out_dir, f"{index}.json"), "w") as f:
+            json.dump({"status": status, "created": created, "cancelled": cancelled, "missed": missed,
+                       "unpinned": unpinned}, f)
+
+    deadline = time.time() + seconds
+    crash_at = time.time() + seconds / 2
+    while time.time() < deadline:
+        if time.time() > crash_at and lease.held() and not crashed.is_set():
+            with recording:
+                crashed.set()
+                dump("crashed while leader")
+                os._exit(0)  # no atexit: the lease is left to expire
+        roll = rng.random()
+        if roll < 0.4:
+            sid = str(uuid.uuid4())
+            session = {"user_id": f"S{index}-{sid[:8]}", "location": "Langson Library",
+                       "end_ts": time.time() + rng.uniform(0.01, MAX_SHORT_SECONDS)}
+            if store.add_unless_active(sid, session):
+                created.append(sid)
+        elif roll < 0.7:
+            sid = str(uuid.uuid4())
+            session = {"user_id": f"L{rng.randrange(LONG_USERS)}", "location": "Science Library",
+                       "end_ts": time.time() + 600}
+            if store.add_unless_active(sid, session):
+                created.append(sid)
+        else:
+            # A cancel for a session that may well have been created by another process
+            sid, _ = store.get_user_session(f"L{rng.randrange(LONG_USERS)}")
+            if sid is not None:
+                (cancelled if store.pop(sid) is not None else missed).append(sid)
+    # Stop creating and give the leader (or its successor) time to expire what's left
+    time.sleep(SESSION_LEASE_TTL * 2 + MAX_SHORT_SECONDS + 0.5)
+    dump("ok")
+
+
+def test_no_lost_or_duplicated_sessions_across_a_leader_crash(tmp_path):
+    path, results = _run(_session_worker, tmp_path, seconds=2.0)
+    store = SharedSessionStore(path)
+    created = [sid for r in results for sid in r["created"]]
+    unpinned = Counter(sid for r in results for sid in r["unpinned"])
+    cancelled = Counter(sid for r in results for sid in r["cancelled"])
+    remaining = {sid for sid in created if sid in store}
+
+    assert sum(r["status"] != "ok" for r in results) == 1
+    assert len(set(created)) == len(created)
+    assert unpinned and cancelled
+    assert [sid for sid, n in unpinned.items() if n > 1] == []
+    assert [sid for sid, n in cancelled.items() if n > 1] == []
+    assert set(unpinned) & set(cancelled) == set()
+    assert [sid for sid in created if sid not in unpinned and sid not in cancelled and sid not in remaining] == []
+    assert [sid for sid in remaining if store.get(sid)["end_ts"] < time.time()] == []
+    # A cancel that lost the race found a session somebody else removed, not one that vanished
+    missed = [sid for r in results for sid in r["missed"]]
+    assert [sid for sid in missed if sid not in cancelled and sid not in unpinned] == []
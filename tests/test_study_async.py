@@ -0,0 +1,47 @@
+"""ASYNC_MODE keeps blocking session-store calls off the event loop when the store is a shared SQLite file."""
+import asyncio
+import threading
+import time
+
+from features import study_async
+from features.expiry import AsyncExpiryScheduler
+from features.shared import Lease, SharedSessionStore
+
+
+def _calling_thread():
+    return threading.get_ident()
+
+
+def test_store_calls_leave_the_loop_only_for_a_shared_store(monkeypatch):
+    async def run():
+        return threading.get_ident(), await study_async._store_call(_calling_thread)
+
+    loop_thread, store_thread = asyncio.run(run())
+    assert store_thread == loop_thread
+    monkeypatch.setattr(study_async, "SHARED_SESSION_DB", "shared.db")
+    loop_thread, store_thread = asyncio.run(run())
+    assert store_thread != loop_thread
+
+
+def test_shared_store_expiry_runs_off_the_loop(tmp_path):
+    path = str(tmp_path / "shared.db")
+    store = SharedSessionStore(path)
+    store.add("s1", {"user_id": "U1", "location": "Langson Library", "end_ts": time.time() - 1})
+    threads = []
+    pop_expired = store.pop_expired
+
+    def recording_pop_expired(now=None):
+        threads.append(threading.get_ident())
+        return pop_expired(now)
+
+    store.pop_expired = recording_pop_expired
+    lease = Lease(path, "leader", ttl=5)
+    lease.acquire()
+
+    async def run():
+        scheduler = AsyncExpiryScheduler(store, lease=lease)
+        return threading.get_ident(), await scheduler.expire_due()
+
+    loop_thread, expired = asyncio.run(run())
+    assert [sid for sid, _ in expired] == ["s1"]
+    assert threads and loop_thread not in threads
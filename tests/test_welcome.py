@@ -0,0 +1,77 @@
+"""Welcoming new members: once per user and channel, across restarts, at a bounded pace."""
+import os
+import subprocess
+import sys
+import time
+
+from features.welcome import WelcomeLog, Welcomer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _Client:
+    def __init__(self, fail=()):
+        self.sent = []
+        self.fail = set(fail)
+
+    def chat_postEphemeral(self, channel, user, text):
+        if user in self.fail:
+            raise RuntimeError("user_not_in_channel")
+        self.sent.append((channel, user))
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_log_remembers_welcomes_across_restarts(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    log = WelcomeLog(path, max_users=3)
+    log.add_many([("C1", "U1"), ("C1", "U2")], now=1.0)
+    log.add_many([("C2", "U1"), ("C1", "U3")], now=2.0)
+    # Bounded: the oldest is forgotten, in memory and on disk
+    assert ("C1", "U1") not in log and len(log) == 3
+    reopened = WelcomeLog(path, max_users=3)
+    assert {("C1", "U2"), ("C2", "U1"), ("C1", "U3")} == {key for key in reopened._welcomed}
+    assert ("C1", "U1") not in reopened
+
+
+def test_enqueue_skips_welcomed_queued_and_overflow():
+    log = WelcomeLog()
+    log.add_many([("C1", "U1")])
+    welcomer = Welcomer("hi", log, rate=6000, max_pending=2)
+    assert not welcomer.enqueue("C1", "U1")
+    assert welcomer.enqueue("C2", "U1")
+    assert not welcomer.enqueue("C2", "U1")
+    assert welcomer.enqueue("C1", "U2")
+    assert not welcomer.enqueue("C1", "U3")
+    assert welcomer.stats() == {"backlog": 2, "sent": 0, "skipped": 2, "dropped": 1, "failed": 0}
+
+
+def test_sends_each_join_once_and_records_only_successes():
+    log = WelcomeLog()
+    welcomer = Welcomer("hi", log, rate=6000)
+    client = _Client(fail={"U2"})
+    welcomer.start(client)
+    for user in ("U1", "U2", "U3", "U1"):
+        welcomer.enqueue("C1", user)
+    _wait_for(lambda: welcomer.sent + welcomer.failed == 3 and welcomer.backlog() == 0)
+    _wait_for(lambda: ("C1", "U3") in log)
+    assert client.sent == [("C1", "U1"), ("C1", "U3")]
+    assert ("C1", "U2") not in log
+    # Welcomed users aren't welcomed again; the failed one is retried on their next join
+    assert not welcomer.enqueue("C1", "U1")
+    client.fail.clear()
+    assert welcomer.enqueue("C1", "U2")
+    _wait_for(lambda: ("C1", "U2") in log)
+    assert client.sent[-1] == ("C1", "U2")
+
+
+def test_importing_the_bot_creates_no_files(tmp_path):
+    env = {k: v for k, v in os.environ.items() if k not in ("SESSION_DB_PATH", "WELCOME_DB_PATH", "HISTORY_DIR")}
+    env["PYTHONPATH"] = ROOT
+    subprocess.run([sys.executable, "-c", "import features.study, features.study_async"], cwd=tmp_path, env=env, check=True)
+    assert os.listdir(tmp_path) == []